@@ -1,6 +1,9 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
+
+from Orders.log import stop_handlers
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orders.settings')
 
@@ -8,5 +11,12 @@ app = Celery('orders')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_process_shutdown.connect
+def flush_log_queues(**kwargs):
+    # дочерние процессы prefork завершаются через os._exit, минуя atexit
+    stop_handlers()
+
+
 # Экспортируем объект Celery
 __all__ = ('app',)
\ No newline at end of file
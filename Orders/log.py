@@ -0,0 +1,166 @@
+import atexit
+import copy
+import gzip
+import itertools
+import logging
+import os
+import queue
+import shutil
+import threading
+import weakref
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+
+# Открытые QueueFileHandler; хуки завершения процесса и fork регистрируются один раз на модуль
+_handlers = weakref.WeakSet()
+
+
+def stop_handlers():
+    """Дописывает очереди всех открытых обработчиков; вызывается при завершении процесса."""
+    for handler in list(_handlers):
+        handler.stop()
+
+
+def drain_handlers():
+    for handler in list(_handlers):
+        handler.drain()
+
+
+def restart_handlers():
+    for handler in list(_handlers):
+        handler.restart()
+
+
+atexit.register(stop_handlers)
+if hasattr(os, 'register_at_fork'):
+    # поток записи не переживает fork (celery prefork, gunicorn --preload): очередь дописывается
+    # до fork, чтобы ее записи не потерялись в дочернем процессе и не записались дважды
+    os.register_at_fork(before=drain_handlers, after_in_child=restart_handlers)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler, который сжимает ротированные файлы в gzip (load_data.log.1.gz)."""
+
+    def __init__(self, filename, compress=True, **kwargs):
+        super().__init__(filename, **kwargs)
+        if compress:
+            self.namer = self.gzip_name
+            self.rotator = self.gzip_rotate
+
+    @staticmethod
+    def gzip_name(name):
+        return f'{name}.gz'
+
+    @staticmethod
+    def gzip_rotate(source, dest):
+        with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+            shutil.copyfileobj(source_file, dest_file)
+        os.remove(source)
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    Обработчик, который только кладет запись в очередь; форматирование и
+    запись в файл с ротацией выполняет фоновый поток.
+
+    Поток забирает накопившиеся записи раз в flush_interval секунд, поэтому
+    запись в очередь не будит его на каждое сообщение. Очередь ограничена
+    queue_size записями: если поток не успевает, новые записи отбрасываются
+    (их число - в dropped), а запрос не ждет диска. Остаток очереди
+    дописывается при завершении процесса через atexit. Процессы, которые
+    выходят через os._exit (дочерние процессы celery prefork), atexit не
+    вызывают: для них остаток дописывает сигнал worker_process_shutdown
+    (Orders/celery.py).
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8', compress=True, queue_size=10000,
+                 flush_interval=0.1):
+        super().__init__(queue.SimpleQueue())
+        self.target = CompressingRotatingFileHandler(filename, compress=compress, maxBytes=maxBytes,
+                                                     backupCount=backupCount, encoding=encoding, delay=True)
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.writer = None
+        self.start()
+        _handlers.add(self)
+
+    def start(self):
+        self.stopped = threading.Event()
+        self.writer = threading.Thread(target=self.write, name='log-writer', daemon=True)
+        self.writer.start()
+
+    def stop(self):
+        if self.writer is not None:
+            self.stopped.set()
+            self.writer.join()
+            self.writer = None
+        self.drain()
+
+    def restart(self):
+        if self.writer is not None:
+            self.queue = queue.SimpleQueue()
+            self.start()
+
+    def write(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.drain()
+        self.drain()
+
+    def drain(self):
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.target.handle(record)
+
+    def setFormatter(self, fmt):
+        # формат применяется в фоновом потоке
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Копия записи для очереди. Сообщение собирается сразу, потому что
+        аргументы могут измениться до записи; остальное форматирование -
+        в фоновом потоке.
+        """
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+    def close(self):
+        _handlers.discard(self)
+        self.stop()
+        self.target.close()
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает одну из каждых round(1 / rate) записей ниже уровня level;
+    записи уровня level и выше (по умолчанию WARNING) проходят всегда.
+    rate=1 - без выборки, rate=0 - только записи от level.
+    """
+
+    def __init__(self, rate=1.0, level='WARNING', name=''):
+        super().__init__(name)
+        self.every = round(1 / rate) if rate > 0 else 0
+        self.level = level if isinstance(level, int) else logging.getLevelName(level)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.level or self.every == 1:
+            return True
+        if not self.every:
+            return False
+        with self.lock:
+            return next(self.counter) % self.every == 0
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
+import tempfile
 import rollbar
 import rollbar.contrib.django
 
@@ -84,7 +86,48 @@ THUMBNAIL_ALIASES = {
     },
 }
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
+# Для локальной работы без Redis: CELERY_BROKER_URL=memory:// или CELERY_TASK_ALWAYS_EAGER=True
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+
+# Параллельная запись прайс-листов: число процессов и разбиение товаров (category или hash)
+PRICE_LIST_IMPORT_WORKERS = int(os.getenv('PRICE_LIST_IMPORT_WORKERS', '1'))
+PRICE_LIST_IMPORT_PARTITION = os.getenv('PRICE_LIST_IMPORT_PARTITION', 'category')
+
+# Карточки товаров из таблицы CatalogEntry; перед включением заполнить ее командой rebuild_catalog
+CATALOG_READ_MODEL = os.getenv('CATALOG_READ_MODEL', 'False') == 'True'
+
+# Максимум id в одном запросе POST /api/v1/product_info/batch/
+PRODUCT_INFO_BATCH_MAX = int(os.getenv('PRODUCT_INFO_BATCH_MAX', '500'))
+
+# Общий кэш нужен, чтобы прогресс загрузок из воркера Celery был виден веб-процессу
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Пользователь токена в кэше. Удаление записи видят только процессы с тем же кэшем, поэтому по умолчанию
+# кэш токенов включен только с Redis; с локальным кэшем включить его нельзя (ошибка проверки при запуске)
+AUTH_TOKEN_CACHE = os.getenv('AUTH_TOKEN_CACHE', str(bool(os.getenv('REDIS_CACHE_URL')))) == 'True'
+
+# Время жизни пользователя токена в кэше, секунды. Удаление токена и изменение пользователя сбрасывают его сразу
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', '300'))
+
+# Кэш ответов каталога. Версии данных в кэше должны видеть все процессы, поэтому по умолчанию
+# он включен только с Redis; с локальным кэшем включить его нельзя (ошибка проверки при запуске)
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', str(bool(os.getenv('REDIS_CACHE_URL')))) == 'True'
+
+# Время жизни ответов каталога в кэше, секунды. Изменения данных сбрасывают кэш сразу
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -170,6 +213,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -186,11 +232,16 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON через orjson, если он установлен; иначе обычный JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'customers_suppliers.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 30,
     
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'customers_suppliers.authentication.CachedTokenAuthentication',
     ],
             'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.AnonRateThrottle',
@@ -202,6 +253,19 @@ REST_FRAMEWORK = {
     },
 }
 
+# Файл журнала и его ротация: при LOG_FILE_MAX_BYTES байт файл сжимается в .gz,
+# хранится LOG_FILE_BACKUP_COUNT старых файлов
+LOG_FILE = os.getenv('LOG_FILE', 'load_data.log')
+if sys.argv[1:2] == ['test']:
+    # тесты не пишут в журнал рабочего каталога
+    LOG_FILE = os.path.join(tempfile.gettempdir(), 'orders-test.log')
+LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_FILE_BACKUP_COUNT = int(os.getenv('LOG_FILE_BACKUP_COUNT', '5'))
+
+# Доля записей INFO проверок доступа (логгер products.permissions), попадающих в журнал;
+# предупреждения и ошибки пишутся всегда
+LOG_PERMISSIONS_SAMPLE_RATE = float(os.getenv('LOG_PERMISSIONS_SAMPLE_RATE', '0.01'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,  # Отключаем существующие логгеры
@@ -211,11 +275,20 @@ LOGGING = {
             'datefmt': '%Y-%m-%d %H:%M:%S',  # Формат времени
         },
     },
+    'filters': {
+        'permissions_sample': {
+            '()': 'Orders.log.SamplingFilter',
+            'rate': LOG_PERMISSIONS_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'load_data.log',
+            # Запрос только кладет запись в очередь, в файл пишет фоновый поток
+            'class': 'Orders.log.QueueFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
             'encoding': 'utf-8',  # Поддержка UTF-8
             'formatter': 'verbose',  # Используем форматтер
         },
@@ -237,6 +310,20 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,  # Не передаем сообщения выше по иерархии
         },
+
+        'products': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+
+        # Проверки доступа пишутся на каждый запрос, поэтому INFO - выборочно
+        'products.permissions': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'filters': ['permissions_sample'],
+            'propagate': False,
+        },
     },
 }
 
@@ -4,8 +4,6 @@ from products.models import ProductInfo
 import logging
 
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S', filename='load_data.log')
 logger = logging.getLogger('basket')
 
 
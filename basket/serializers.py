@@ -2,23 +2,26 @@ import logging
 from rest_framework import serializers
 
 from basket.models import Cart, CartProduct
+from customers_suppliers.mixins import DynamicFieldsMixin
 from customers_suppliers.models import Customer
-from products.serializers import ProductInfoSerializer
+from products.serializers import ProductCardShopSerializer, ProductInfoSerializer
 
 
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S', filename='load_data.log')
 logger = logging.getLogger('basket')
 
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     total_amount = serializers.SerializerMethodField()
     
     class Meta:
         model = Cart
         fields = ['id', 'customer', 'products', 'total_amount', 'cart_type', 'adress', 'created_at', 'updated_at']
+        expandable_fields = {
+            'customer': ('customers_suppliers.serializers.CustomerSerializers', {}),
+            'products': (ProductInfoSerializer, {'many': True}),
+        }
         
     def get_total_amount(self, obj):
         try:
@@ -35,8 +38,12 @@ class CartSerializer(serializers.ModelSerializer):
     
         
         
-class CartProductSerializer(serializers.ModelSerializer):
+class CartProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CartProduct
         fields = ['id', 'cart', 'product', 'quantity', 'supplier']
+        expandable_fields = {
+            'product': (ProductInfoSerializer, {}),
+            'supplier': (ProductCardShopSerializer, {}),
+        }
         
\ No newline at end of file
@@ -48,4 +48,29 @@ class CartTests(APITestCase):
     def test_get_carts_unauthorized(self):
         url = reverse('basket:get-carts')
         response = self.client.get(url)  # Запрос без авторизации
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_get_carts_cursor_pagination(self):
+        admin = CustomUser.objects.create_superuser(username='testadmin', email='testadmin@example.com', password='testpassword')
+        for _ in range(3):
+            Cart.objects.create(customer=self.customer_instance, adress='Test adress')
+        self.client.force_authenticate(user=admin)
+
+        response = self.client.get('/basket/api/v1/carts/')
+        self.assertEqual(len(response.data), 3)
+
+        response = self.client.get('/basket/api/v1/carts/', {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_get_carts_sparse_fields(self):
+        admin = CustomUser.objects.create_superuser(username='testadmin', email='testadmin@example.com', password='testpassword')
+        Cart.objects.create(customer=self.customer_instance, adress='Test adress')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/basket/api/v1/carts/', {'expand': 'adress'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/basket/api/v1/carts/', {'fields': 'id,adress,customer', 'expand': 'customer'})
+        self.assertEqual([set(cart) for cart in response.data], [{'id', 'adress', 'customer'}])
+        self.assertEqual(response.data[0]['customer'], {'id': self.customer_instance.id, 'phone_number': '1234567890'})
@@ -2,11 +2,24 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser  
 from rest_framework.views import APIView
+from customers_suppliers.mixins import trim_queryset
+from customers_suppliers.pagination import OptionalCursorPagination
 from .models import Cart, CartProduct
 from .serializers import CartSerializer, CartProductSerializer
 from django.core.mail import send_mail
 
 
+def paginated_response(carts, request, view):
+    """Список корзин целиком или страница по курсору, если клиент его запросил."""
+    context = {'request': request}
+    carts = trim_queryset(carts, CartSerializer(context=context))
+    paginator = OptionalCursorPagination()
+    page = paginator.paginate_queryset(carts, request, view)
+    if page is None:
+        return Response(CartSerializer(carts, many=True, context=context).data)
+    return paginator.get_paginated_response(CartSerializer(page, many=True, context=context).data)
+
+
 class ConfirmOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -73,7 +86,7 @@ class GetCartView(APIView):
         try:
             cart = Cart.objects.get(pk=pk)
             if request.user.is_staff or cart.customer == request.user:
-                serializer = CartSerializer(cart)
+                serializer = CartSerializer(cart, context={'request': request})
                 return Response(serializer.data)
             return Response(status=status.HTTP_403_FORBIDDEN)
         except Cart.DoesNotExist:
@@ -87,8 +100,7 @@ class GetCartsView(APIView):
             carts = Cart.objects.all()
         else:
             carts = Cart.objects.filter(customer=request.user)
-        serializer = CartSerializer(carts, many=True)
-        return Response(serializer.data)
+        return paginated_response(carts, request, self)
 
 class UpdateCartView(APIView):
     permission_classes = [IsAuthenticated]
@@ -169,15 +181,14 @@ class GetOrdersView(APIView):
 
     def get(self, request):
         orders = Cart.objects.filter(customer=request.user)
-        serializer = CartSerializer(orders, many=True)
-        return Response(serializer.data)
+        return paginated_response(orders, request, self)
     
 class GetOrderDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
         order = Cart.objects.get(pk=pk)
-        serializer = CartSerializer(order)
+        serializer = CartSerializer(order, context={'request': request})
         return Response(serializer.data)
     
 class UpdateOrderStatusView(APIView):
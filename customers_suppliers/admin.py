@@ -1,9 +1,11 @@
 from django.contrib import admin
 from customers_suppliers.models import CustomUser, Customer, Supplier
+from products.admin import DeletingGoodsAdminMixin
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(DeletingGoodsAdminMixin, admin.ModelAdmin):
+    goods_lookup = 'shop__user'
     list_display = ['id', 'email', 'user_type']
     list_filter = ['id', 'email', 'user_type']
 
@@ -15,6 +17,7 @@ class CustomerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Supplier)
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(DeletingGoodsAdminMixin, admin.ModelAdmin):
+    goods_lookup = 'shop'
     list_display = ['id','name_organization', 'user', 'contact_person', 'supplier_type', 'inn']
     list_filter = ['id', 'name_organization']
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CustomersSuppliersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customers_suppliers'
+
+    def ready(self):
+        from customers_suppliers import signals  # noqa: F401
@@ -0,0 +1,126 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from customers_suppliers.models import CustomUser
+from products.caching import local_cache_backend
+
+
+TOKEN_KEY_PREFIX = 'auth-token'
+USER_VERSION_KEY_PREFIX = 'auth-token-version'
+
+# Поля пользователя в кэше; остальные поля модели отложенные и читаются из базы при обращении
+USER_FIELDS = ['id', 'username', 'email', 'user_type', 'is_staff', 'is_superuser', 'is_active', 'first_name',
+               'last_name']
+
+
+def token_cache_key(key):
+    return f'{TOKEN_KEY_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def user_version_key(user_id):
+    return f'{USER_VERSION_KEY_PREFIX}:{user_id}'
+
+
+def user_version(user_id):
+    """Текущая версия записей пользователя; записи токенов с другой версией не используются."""
+    version = cache.get(user_version_key(user_id))
+    if version is None:
+        cache.add(user_version_key(user_id), uuid.uuid4().hex, None)
+        version = cache.get(user_version_key(user_id))
+    return version
+
+
+def related_id(user, name):
+    try:
+        return getattr(user, name).id
+    except ObjectDoesNotExist:
+        return None
+
+
+def invalidate_user(user_id):
+    """
+    Делает недействительными все токены пользователя в кэше сменой его версии.
+    Смена повторяется после фиксации транзакции, чтобы параллельный запрос
+    не вернул в кэш старые данные.
+    """
+    def bump():
+        cache.set(user_version_key(user_id), uuid.uuid4().hex, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_token(key):
+    cache.delete(token_cache_key(key))
+    transaction.on_commit(lambda: cache.delete(token_cache_key(key)))
+
+
+@checks.register(checks.Tags.caches)
+def check_token_cache(app_configs, **kwargs):
+    backend = local_cache_backend()
+    if settings.AUTH_TOKEN_CACHE and backend:
+        return [checks.Error(
+            f'AUTH_TOKEN_CACHE включен с кэшем {backend}: отозванный токен будет действовать в других процессах '
+            f'до AUTH_TOKEN_CACHE_TIMEOUT секунд.',
+            hint='Задайте REDIS_CACHE_URL или AUTH_TOKEN_CACHE=False.',
+            id='customers_suppliers.E001',
+        )]
+    return []
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который хранит пользователя токена в кэше
+    AUTH_TOKEN_CACHE_TIMEOUT секунд.
+
+    Пользователь из кэша содержит поля USER_FIELDS, а также supplier_id и
+    customer_id его магазина и профиля покупателя (None, если их нет).
+    Запись перестает действовать при удалении токена и при изменении или
+    удалении пользователя, магазина или покупателя. Работает только при
+    AUTH_TOKEN_CACHE (нужен общий кэш), иначе - как TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE:
+            return super().authenticate_credentials(key)
+        cached = cache.get(token_cache_key(key))
+        if cached is not None and cache.get(user_version_key(cached['user']['id'])) == cached['version']:
+            return self.restore(key, cached)
+
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user__supplier', 'user__customer').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        cached = {
+            'user': {field: getattr(user, field) for field in USER_FIELDS},
+            'supplier_id': related_id(user, 'supplier'),
+            'customer_id': related_id(user, 'customer'),
+            'created': token.created,
+            'version': user_version(user.id),
+        }
+        cache.set(token_cache_key(key), cached, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        user.supplier_id, user.customer_id = cached['supplier_id'], cached['customer_id']
+        return user, token
+
+    def restore(self, key, cached):
+        # from_db ждет значения в порядке полей модели
+        fields = [field.attname for field in CustomUser._meta.concrete_fields if field.attname in cached['user']]
+        user = CustomUser.from_db(None, fields, [cached['user'][field] for field in fields])
+        user.supplier_id, user.customer_id = cached['supplier_id'], cached['customer_id']
+        token = self.get_model()(key=key, user=user, created=cached['created'])
+        token._state.adding = False
+        return user, token
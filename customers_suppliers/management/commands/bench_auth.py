@@ -0,0 +1,81 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from customers_suppliers.authentication import CachedTokenAuthentication, invalidate_user
+from customers_suppliers.models import Customer, CustomUser
+from products.importer import QueryCounter
+from products.views import CategoryViewSet
+
+
+AUTHENTICATION_CLASSES = [TokenAuthentication, CachedTokenAuthentication]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает TokenAuthentication и CachedTokenAuthentication на чтении списка категорий из кэша ответов: '
+            'SQL-запросов и времени на один запрос')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Количество запросов для каждого класса')
+        parser.add_argument('--output', default='bench_auth_results.json', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        # запросы идут напрямую во view, без middleware, с хостом APIRequestFactory
+        # один процесс, поэтому кэш токенов и ответов включается и с локальным кэшем
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                                                     AUTH_TOKEN_CACHE=True, RESPONSE_CACHE=True):
+            user = CustomUser.objects.create_user(username='bench-auth', email='bench-auth@example.com',
+                                                  password=None, user_type='customer')
+            Customer.objects.create(user=user)
+            token = Token.objects.create(user=user)
+            for authentication_class in AUTHENTICATION_CLASSES:
+                invalidate_user(user.id)
+                result = self.run_class(authentication_class, token.key, options['requests'])
+                results.append(result)
+                self.stdout.write(f"{result['authentication']:>26}: {result['queries_per_request']} запросов к базе "
+                                  f"на запрос, {result['requests_per_sec']} запросов/с")
+            transaction.set_rollback(True)
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def run_class(self, authentication_class, key, requests):
+        """Первый запрос заполняет кэш ответа и токена, замеряются следующие."""
+        view = CategoryViewSet.as_view({'get': 'list'}, authentication_classes=[authentication_class],
+                                       throttle_classes=[])
+        factory = APIRequestFactory()
+
+        def get():
+            response = view(factory.get('/products/api/v1/category/', HTTP_AUTHORIZATION=f'Token {key}'))
+            if response.status_code != 200:
+                raise ValueError(f'{authentication_class.__name__}: ответ {response.status_code}')
+
+        get()
+        started = time.perf_counter()
+        with QueryCounter() as counter:
+            for _ in range(requests):
+                get()
+        seconds = time.perf_counter() - started
+        return {
+            'authentication': authentication_class.__name__,
+            'requests': requests,
+            'queries': counter.count,
+            'queries_per_request': round(counter.count / requests, 2),
+            'seconds': round(seconds, 3),
+            'requests_per_sec': round(requests / seconds, 1),
+        }
@@ -0,0 +1,139 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELD_PARAMS = ('fields', 'omit', 'expand')
+
+
+def split_field_list(value):
+    """'id,product.name' -> ({'id', 'product'}, {'product': ['name']})"""
+    top, nested = set(), {}
+    for item in value:
+        name, _, rest = item.strip().partition('.')
+        if not name:
+            continue
+        top.add(name)
+        if rest:
+            nested.setdefault(name, []).append(rest)
+    return top, nested
+
+
+class DynamicFieldsMixin:
+    """
+    Выбор полей ответа параметрами запроса ?fields=, ?omit= и ?expand=.
+
+    fields оставляет только перечисленные поля, omit убирает поля, expand
+    заменяет id связанного объекта вложенным объектом из
+    Meta.expandable_fields. Поля вложенных объектов указываются через точку:
+    ?expand=product&fields=id,price,product.name. Из запроса параметры
+    читает только сериализатор верхнего уровня и только для чтения,
+    вложенным они передаются явно.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selection = {'fields': fields, 'omit': omit, 'expand': expand}
+
+    def is_request_root(self):
+        return self.parent is None or (isinstance(self.parent, serializers.ListSerializer)
+                                       and self.parent.parent is None)
+
+    def get_selection(self, name):
+        value = self.selection[name]
+        request = self.context.get('request')
+        if value is None and request is not None and request.method in SAFE_METHODS and self.is_request_root():
+            raw = request.query_params.get(name)
+            value = raw.split(',') if raw else None
+        return split_field_list(value or [])
+
+    def get_fields(self):
+        fields = super().get_fields()
+        (only, only_nested), (omit, omit_nested), (expand, expand_nested) = map(self.get_selection, FIELD_PARAMS)
+
+        expandable = getattr(getattr(self, 'Meta', None), 'expandable_fields', {})
+        unknown = expand - set(expandable)
+        if unknown:
+            raise ValidationError({'expand': f'Поля нельзя развернуть: {", ".join(sorted(unknown))}'})
+        for name in expand:
+            serializer_class, options = expandable[name]
+            if isinstance(serializer_class, str):
+                serializer_class = import_string(serializer_class)
+            fields[name] = serializer_class(fields=only_nested.get(name), omit=omit_nested.get(name),
+                                            expand=expand_nested.get(name), read_only=True, **options)
+
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if name not in expand and isinstance(nested, DynamicFieldsMixin):
+                nested.selection = {'fields': only_nested.get(name), 'omit': omit_nested.get(name),
+                                    'expand': expand_nested.get(name)}
+
+        if only:
+            unknown = only - set(fields)
+            if unknown:
+                raise ValidationError({'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+            fields = {name: field for name, field in fields.items() if name in only}
+        return {name: field for name, field in fields.items() if name not in omit}
+
+
+def serialized_model_fields(serializer, prefix=''):
+    """
+    Пути полей модели, которые читает сериализатор, и связи для select_related.
+
+    Возвращает None, если поле нельзя сопоставить с колонкой модели
+    (SerializerMethodField, свойства, списки), тогда queryset не сужается.
+    """
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        return None
+    paths, relations = [], []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        path = prefix + model_field.name
+        if isinstance(field, serializers.ListSerializer):
+            return None
+        if isinstance(field, serializers.BaseSerializer):
+            nested = serialized_model_fields(field, f'{path}__')
+            if nested is None:
+                return None
+            relations.append(path)
+            paths.extend(nested[0])
+            relations.extend(nested[1])
+        else:
+            paths.append(path)
+    return paths, relations
+
+
+def trim_queryset(queryset, serializer):
+    """Читает из базы только поля, выбранные через ?fields= / ?omit= / ?expand=."""
+    request = serializer.context.get('request')
+    if request is None or not any(request.query_params.get(name) for name in FIELD_PARAMS):
+        return queryset
+    selected = serialized_model_fields(serializer)
+    if selected is None:
+        return queryset
+    paths, relations = selected
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*paths)
+
+
+class DynamicFieldsViewMixin:
+    """Сужает queryset чтения до полей, которые выбрал клиент."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in SAFE_METHODS:
+            queryset = trim_queryset(queryset, self.get_serializer())
+        return queryset
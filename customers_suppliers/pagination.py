@@ -0,0 +1,81 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору в порядке id.
+
+    Страница выбирается условием id > последнего id предыдущей страницы по
+    первичному ключу, без COUNT(*) и OFFSET, поэтому любая страница стоит
+    столько же, сколько первая.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class SwitchablePagination(BasePagination):
+    """
+    Выбор постраничного вывода клиентом в каждом запросе.
+
+    По умолчанию используется default_pagination_class, с параметром
+    pagination=cursor (или cursor из ссылок next/previous) - IdCursorPagination.
+    Если default_pagination_class = None, без курсора список не делится на
+    страницы. Курсор идет в порядке id, поэтому вместе с ordering он
+    отклоняется с ошибкой 400.
+    """
+    default_pagination_class = PageNumberPagination
+    cursor_pagination_class = IdCursorPagination
+    mode_query_param = 'pagination'
+    ordering_query_param = 'ordering'
+
+    def __init__(self):
+        self.paginator = None
+
+    def is_cursor_requested(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_pagination_class.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_requested(request):
+            if request.query_params.get(self.ordering_query_param):
+                raise ValidationError({self.ordering_query_param: 'Сортировка недоступна при постраничном выводе '
+                                                                  'по курсору: курсор идет в порядке id.'})
+            self.paginator = self.cursor_pagination_class()
+        elif self.default_pagination_class:
+            self.paginator = self.default_pagination_class()
+        else:
+            return None
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return (self.default_pagination_class or self.cursor_pagination_class)().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [{
+            'name': self.mode_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'cursor - постраничный вывод по курсору',
+            'schema': {'type': 'string', 'enum': ['cursor']},
+        }]
+        for pagination_class in (self.default_pagination_class, self.cursor_pagination_class):
+            if pagination_class:
+                parameters.extend(pagination_class().get_schema_operation_parameters(view))
+        return parameters
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+
+class OptionalCursorPagination(SwitchablePagination):
+    """Курсор по запросу клиента, иначе весь список, как раньше."""
+    default_pagination_class = None
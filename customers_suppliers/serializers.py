@@ -1,18 +1,19 @@
 from django.forms import ValidationError
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
+from customers_suppliers.mixins import DynamicFieldsMixin
 from customers_suppliers.validators import CustomValidators
 from .models import CustomUser, Customer, Supplier
 from rest_framework.exceptions import ValidationError
 
    
-class CustomerSerializers(serializers.ModelSerializer):
+class CustomerSerializers(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = ['id', 'phone_number']
         
         
-class SupplierSerializers(serializers.ModelSerializer):
+class SupplierSerializers(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = ['id', 'contact_person',
@@ -26,7 +27,7 @@ class SupplierSerializers(serializers.ModelSerializer):
         
         
         
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     customer = CustomerSerializers(required=False)
     supplier = SupplierSerializers(required=False)
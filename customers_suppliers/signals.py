@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from customers_suppliers.authentication import invalidate_token, invalidate_user
+from customers_suppliers.models import Customer, CustomUser, Supplier
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    invalidate_user(instance.id)
+
+
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_cached_tokens_on_profile_change(sender, instance, **kwargs):
+    # в кэше хранятся supplier_id и customer_id пользователя
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
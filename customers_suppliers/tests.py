@@ -1,8 +1,18 @@
+import io
+import json
+import os
+import tempfile
 import time
-from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
 from django.urls import reverse
 from django.contrib.auth.models import User
+from customers_suppliers.authentication import CachedTokenAuthentication, check_token_cache, token_cache_key
 from customers_suppliers.models import CustomUser, Customer, Supplier #  Убедитесь, что путь верный
 
 class CustomUserViewSetTests(APITestCase):
@@ -136,4 +146,86 @@ class CustomUserViewSetTests(APITestCase):
         response_time = time.time() - start_time
         print("Время отклика с кэшированием:", response_time)
 
-        
\ No newline at end of file
+        
+
+@override_settings(AUTH_TOKEN_CACHE=True, RESPONSE_CACHE=True)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='tokensupplier', email='tokensupplier@example.com', password='testpassword', user_type='supplier')
+        self.supplier = Supplier.objects.create(user=self.user, supplier_type='IP', inn='123456789012')
+        self.token = Token.objects.create(user=self.user)
+        self.factory = APIRequestFactory()
+
+    def authenticate(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_user_is_cached(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual((user.id, user.user_type, user.is_staff, user.supplier_id, user.customer_id),
+                         (self.user.id, 'supplier', False, self.supplier.id, None))
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(user.email, 'tokensupplier@example.com')
+
+    def test_authenticated_read_without_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get(reverse('category-list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_is_invalidated(self):
+        self.authenticate()
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.authenticate()[0].username, 'renamed')
+
+        self.supplier.delete()
+        self.assertIsNone(self.authenticate()[0].supplier_id)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        self.user.is_active = True
+        self.user.save()
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_stale_entry_is_not_used(self):
+        self.authenticate()
+        stale = cache.get(token_cache_key(self.token.key))
+        self.user.username = 'renamed'
+        self.user.save()
+        # параллельный запрос прочитал пользователя до изменения и записал его в кэш после сброса
+        cache.set(token_cache_key(self.token.key), stale)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate()[0].username, 'renamed')
+
+    @override_settings(AUTH_TOKEN_CACHE=False)
+    def test_disabled_without_shared_cache(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.authenticate()
+
+    def test_local_cache_fails_check(self):
+        self.assertEqual([error.id for error in check_token_cache(None)], ['customers_suppliers.E001'])
+        with override_settings(AUTH_TOKEN_CACHE=False):
+            self.assertEqual(check_token_cache(None), [])
+
+    def test_bench_auth_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_auth', requests=20, output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as file:
+                results = {result['authentication']: result for result in json.load(file)['results']}
+        self.assertEqual(results['TokenAuthentication']['queries_per_request'], 1)
+        self.assertEqual(results['CachedTokenAuthentication']['queries_per_request'], 0)
+        self.assertFalse(CustomUser.objects.filter(username='bench-auth').exists())
@@ -1,5 +1,6 @@
 from django.http import HttpResponse
 from django.shortcuts import render
+from .mixins import DynamicFieldsViewMixin, trim_queryset
 from .models import CustomUser
 from .serializers import CustomUserSerializer, CustomerSerializers, SupplierSerializers
 from rest_framework.decorators import api_view
@@ -9,6 +10,8 @@ from rest_framework import viewsets
 from .models import Customer, Supplier
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from products.models import ProductInfo
+from products.signals import deleting_goods
 
 
 class CustomUserViewSet(viewsets.ModelViewSet):
@@ -26,7 +29,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         if self.request.user.is_staff:
-            users = CustomUser.objects.all()
+            users = trim_queryset(CustomUser.objects.all(), self.get_serializer())
             serializer = self.get_serializer(users, many=True)  
             return Response(serializer.data)
         serializer = self.get_serializer(request.user)
@@ -96,7 +99,8 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             if user_id:
                 try:
                     user = CustomUser .objects.get(id=user_id)
-                    user.delete()
+                    with deleting_goods(ProductInfo.objects.filter(shop__user=user)):
+                        user.delete()
                     return Response({'detail': 'Пользователь удален.'}, status=status.HTTP_200_OK)
                 except CustomUser .DoesNotExist:
                     return Response({'detail': 'Пользователь не найден.'}, status=status.HTTP_404_NOT_FOUND)
@@ -108,17 +112,22 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         if str(request.user.id) != str(user_id):
             raise PermissionDenied('Вы не можете удалять данные других пользователей.')
 
-        request.user.delete()
+        with deleting_goods(ProductInfo.objects.filter(shop__user=request.user)):
+            request.user.delete()
         return Response({'detail': 'Ваша учетная запись удалена.'}, status=status.HTTP_200_OK)
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(DynamicFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializers
     permission_classes = [IsAdminUser]
     
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(DynamicFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializers
-    permission_classes = [IsAdminUser]
\ No newline at end of file
+    permission_classes = [IsAdminUser]
+
+    def perform_destroy(self, instance):
+        with deleting_goods(ProductInfo.objects.filter(shop=instance)):
+            instance.delete()
\ No newline at end of file
@@ -1,8 +1,22 @@
 from django.contrib import admin
 
-from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+from products.models import (CatalogEntry, Category, CategoryStats, ImportJob, Parameter, ParameterValueFacet, Product,
+                             ProductInfo, ProductParameter)
+from products.signals import deleting_goods
 
 
+class DeletingGoodsAdminMixin:
+    """Удаление из админки внутри deleting_goods; goods_lookup - путь от ProductInfo к удаляемой модели."""
+    goods_lookup = 'pk'
+
+    def delete_model(self, request, obj):
+        with deleting_goods(ProductInfo.objects.filter(**{self.goods_lookup: obj.pk})):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with deleting_goods(ProductInfo.objects.filter(**{f'{self.goods_lookup}__in': queryset})):
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,12 +24,12 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    pass
+class ProductAdmin(DeletingGoodsAdminMixin, admin.ModelAdmin):
+    goods_lookup = 'product'
 
 
 @admin.register(ProductInfo)
-class ProductInfoAdmin(admin.ModelAdmin):
+class ProductInfoAdmin(DeletingGoodsAdminMixin, admin.ModelAdmin):
     pass
 
 
@@ -27,3 +41,26 @@ class ParameterAdmin(admin.ModelAdmin):
 @admin.register(ProductParameter)
 class ProductParameterAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'shop', 'user', 'status', 'rows_processed', 'created_at', 'finished_at']
+    list_filter = ['status']
+
+
+@admin.register(ParameterValueFacet)
+class ParameterValueFacetAdmin(admin.ModelAdmin):
+    list_display = ['category', 'parameter', 'value', 'count']
+    list_filter = ['category']
+
+
+@admin.register(CatalogEntry)
+class CatalogEntryAdmin(admin.ModelAdmin):
+    list_display = ['product_info', 'name', 'category_name', 'shop_name', 'price', 'quantity']
+    list_filter = ['category']
+
+
+@admin.register(CategoryStats)
+class CategoryStatsAdmin(admin.ModelAdmin):
+    list_display = ['category', 'product_count', 'offer_count', 'min_price', 'max_price', 'shop_count']
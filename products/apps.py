@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from products import signals  # noqa: F401
+        from products.search import create_search_indexes
+
+        post_migrate.connect(create_search_indexes, sender=self)
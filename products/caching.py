@@ -0,0 +1,145 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+
+
+VERSION_KEY_PREFIX = 'response-cache-version'
+RESPONSE_KEY_PREFIX = 'response-cache'
+
+# Кэши, которые видит только свой процесс: версии, измененные в нем, не доходят до других процессов
+LOCAL_CACHE_BACKENDS = ['django.core.cache.backends.locmem.LocMemCache']
+
+
+def local_cache_backend():
+    """Бэкенд кэша по умолчанию, если он не общий для процессов, иначе None."""
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get('BACKEND')
+    return backend if backend in LOCAL_CACHE_BACKENDS else None
+
+
+def version_key(model):
+    return f'{VERSION_KEY_PREFIX}:{model._meta.label_lower}'
+
+
+def get_versions(models):
+    """Версии моделей - время их последнего изменения в наносекундах."""
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    """
+    Меняет версию модели, после чего ответы, зависящие от нее, не берутся из кэша.
+
+    Версия меняется сразу и еще раз после фиксации транзакции, чтобы ответ,
+    прочитанный до фиксации, не остался в кэше под новой версией.
+    """
+    def bump():
+        cache.set(version_key(model), time.time_ns(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+@checks.register(checks.Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    backend = local_cache_backend()
+    if settings.RESPONSE_CACHE and backend:
+        return [checks.Error(
+            f'RESPONSE_CACHE включен с кэшем {backend}: после записи в другом процессе этот процесс будет отдавать '
+            f'старые ответы до RESPONSE_CACHE_TIMEOUT секунд.',
+            hint='Задайте REDIS_CACHE_URL или RESPONSE_CACHE=False.',
+            id='products.E001',
+        )]
+    return []
+
+
+class ResponseCacheMixin:
+    """
+    Кэш ответов list и retrieve для данных, которые читают чаще, чем меняют.
+
+    Ключ строится из адреса с упорядоченными параметрами запроса, классов
+    разрешений, формата ответа и версий моделей из cache_models. Версии
+    меняются сигналами при записи этих моделей, поэтому устаревшие ответы
+    просто перестают находиться и вытесняются по времени жизни. Ответ
+    содержит ETag и Last-Modified, на совпадающий If-None-Match или
+    If-Modified-Since отдается 304 без обращения к базе.
+
+    Методы вызываются после initial(), то есть после проверки разрешений и
+    ограничения частоты запросов. Без RESPONSE_CACHE (нужен общий кэш)
+    ответы не кэшируются.
+    """
+    cache_models = ()
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, versions):
+        parts = [
+            request.build_absolute_uri(request.path),
+            repr(sorted(request.query_params.lists())),
+            ','.join(type(permission).__name__ for permission in self.get_permissions()),
+            request.accepted_renderer.format,
+            ','.join(map(str, versions)),
+        ]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE:
+            return handler(request, *args, **kwargs)
+        versions = get_versions(self.cache_models)
+        key = self.get_response_cache_key(request, versions)
+        etag = f'"{key}"'
+        last_modified = max(versions) // 1_000_000_000 if versions else None
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            return self.set_validators(response, etag, last_modified)
+
+        cached = cache.get(f'{RESPONSE_KEY_PREFIX}:{key}')
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return self.set_validators(response, etag, last_modified)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        response = self.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        timeout = self.cache_timeout if self.cache_timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+        cache.set(f'{RESPONSE_KEY_PREFIX}:{key}', (response.content, response['Content-Type']), timeout)
+        response['X-Cache'] = 'MISS'
+        return self.set_validators(response, etag, last_modified)
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return etag in tags or '*' in tags
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        return bool(last_modified and if_modified_since and last_modified <= if_modified_since)
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
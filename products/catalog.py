@@ -0,0 +1,116 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from products.models import CatalogEntry, ProductInfo, ProductParameter
+
+
+BATCH_SIZE = 1000
+
+# Поля, которые пересчитываются из исходных таблиц и сравниваются при проверке
+ENTRY_FIELDS = ['product_id', 'category_id', 'shop_id', 'name', 'category_name', 'shop_name', 'model',
+                'external_id', 'quantity', 'price', 'price_rrc', 'parameters']
+
+_local = threading.local()
+
+
+def build_entries(product_info_ids):
+    """Записи каталога для товаров по текущим данным: два запроса на любое число id."""
+    parameters = defaultdict(dict)
+    for product_info_id, name, value in ProductParameter.objects.filter(
+            product_info_id__in=product_info_ids).values_list(
+            'product_info_id', 'parameter__name', 'value').order_by('product_info_id', 'parameter__name'):
+        parameters[product_info_id][name] = value
+    return [
+        CatalogEntry(product_info_id=product_info_id, product_id=product_id, category_id=category_id, shop_id=shop_id,
+                     name=name, category_name=category_name, shop_name=name_organization or username, model=model,
+                     external_id=external_id, quantity=quantity, price=price, price_rrc=price_rrc,
+                     parameters=parameters.get(product_info_id, {}))
+        for (product_info_id, product_id, category_id, shop_id, name, category_name, name_organization, username,
+             model, external_id, quantity, price, price_rrc) in ProductInfo.objects.filter(
+            id__in=product_info_ids).values_list(
+            'id', 'product_id', 'product__category_id', 'shop_id', 'product__name', 'product__category__name',
+            'shop__name_organization', 'shop__user__username', 'model', 'external_id', 'quantity', 'price',
+            'price_rrc').order_by('id')
+    ]
+
+
+def refresh(product_info_ids, batch_size=BATCH_SIZE):
+    """Пересобирает записи каталога для товаров; записи удаленных товаров удаляются."""
+    # importer сам импортирует catalog
+    from products.importer import chunked
+
+    for chunk in chunked(sorted(set(product_info_ids)), batch_size):
+        entries = build_entries(chunk)
+        CatalogEntry.objects.bulk_create(entries, update_conflicts=True, unique_fields=['product_info'],
+                                         update_fields=ENTRY_FIELDS)
+        missing = set(chunk).difference(entry.product_info_id for entry in entries)
+        if missing:
+            CatalogEntry.objects.filter(product_info_id__in=missing).delete()
+
+
+@contextmanager
+def deferred():
+    """Копит id измененных товаров внутри блока и пересобирает их записи при выходе одним проходом."""
+    if getattr(_local, 'ids', None) is not None:
+        yield _local.ids
+        return
+    _local.ids = set()
+    try:
+        yield _local.ids
+        refresh(_local.ids)
+    finally:
+        _local.ids = None
+
+
+def mark(product_info_ids):
+    pending = getattr(_local, 'ids', None)
+    if pending is None:
+        refresh(product_info_ids)
+    else:
+        pending.update(product_info_ids)
+
+
+def update_category_name(category):
+    CatalogEntry.objects.filter(category_id=category.id).exclude(category_name=category.name).update(
+        category_name=category.name)
+
+
+def update_shop_name(shop):
+    name = shop.name_organization or shop.user.username
+    CatalogEntry.objects.filter(shop_id=shop.id).exclude(shop_name=name).update(shop_name=name)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Заполняет каталог заново по всем ProductInfo."""
+    from products.importer import chunked
+
+    CatalogEntry.objects.all().delete()
+    count = 0
+    for chunk in chunked(ProductInfo.objects.order_by('id').values_list('id', flat=True).iterator(), batch_size):
+        count += len(CatalogEntry.objects.bulk_create(build_entries(chunk)))
+    return count
+
+
+def check(batch_size=BATCH_SIZE):
+    """
+    Сравнивает каталог с исходными таблицами.
+
+    Возвращает id товаров без записи (missing), с устаревшей записью
+    (stale) и записи без товара (orphaned).
+    """
+    from products.importer import chunked
+
+    report = {'missing': [], 'stale': [], 'orphaned': []}
+    for chunk in chunked(ProductInfo.objects.order_by('id').values_list('id', flat=True).iterator(), batch_size):
+        stored = {row[0]: row[1:] for row in CatalogEntry.objects.filter(product_info_id__in=chunk).values_list(
+            'product_info_id', *ENTRY_FIELDS)}
+        for entry in build_entries(chunk):
+            current = stored.get(entry.product_info_id)
+            if current is None:
+                report['missing'].append(entry.product_info_id)
+            elif current != tuple(getattr(entry, field) for field in ENTRY_FIELDS):
+                report['stale'].append(entry.product_info_id)
+    report['orphaned'] = list(CatalogEntry.objects.exclude(
+        product_info_id__in=ProductInfo.objects.values('id')).values_list('product_info_id', flat=True))
+    return report
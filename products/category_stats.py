@@ -0,0 +1,189 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from products import caching
+from products.models import Category, CategoryStats, Product, ProductInfo
+
+
+BATCH_SIZE = 500
+
+STATS_FIELDS = ['product_count', 'offer_count', 'min_price', 'max_price', 'shop_count']
+
+_local = threading.local()
+
+
+def build_stats(category_ids):
+    """
+    Сводки для категорий по текущим данным: три агрегирующих запроса на
+    любое число категорий. Цены и число предложений считаются по товарам
+    в наличии.
+    """
+    products = dict(Product.objects.filter(category_id__in=category_ids).values_list('category_id').annotate(
+        total=Count('id')).order_by())
+    offers = {row[0]: row[1:] for row in ProductInfo.objects.filter(
+        product__category_id__in=category_ids, quantity__gt=0).values_list('product__category_id').annotate(
+        total=Count('id'), min_price=Min('price'), max_price=Max('price')).order_by()}
+    shops = dict(Category.shops.through.objects.filter(category_id__in=category_ids).values_list(
+        'category_id').annotate(total=Count('supplier_id')).order_by())
+    stats = []
+    for category_id in Category.objects.filter(id__in=category_ids).order_by('id').values_list('id', flat=True):
+        offer_count, min_price, max_price = offers.get(category_id, (0, None, None))
+        stats.append(CategoryStats(category_id=category_id, product_count=products.get(category_id, 0),
+                                   offer_count=offer_count, min_price=min_price, max_price=max_price,
+                                   shop_count=shops.get(category_id, 0)))
+    return stats
+
+
+def refresh(category_ids, batch_size=BATCH_SIZE):
+    """Пересчитывает сводки категорий; сводки удаленных категорий удаляются каскадом."""
+    category_ids = sorted(set(category_ids) - {None})
+    for start in range(0, len(category_ids), batch_size):
+        CategoryStats.objects.bulk_create(build_stats(category_ids[start:start + batch_size]), update_conflicts=True,
+                                          unique_fields=['category'], update_fields=STATS_FIELDS)
+    if category_ids:
+        # bulk_create не вызывает post_save, поэтому кэш ответов со сводками сбрасывается здесь
+        caching.bump_version(CategoryStats)
+
+
+def product_categories(product_ids, batch_size=BATCH_SIZE):
+    product_ids = sorted(set(product_ids))
+    category_ids = set()
+    for start in range(0, len(product_ids), batch_size):
+        category_ids.update(Product.objects.filter(id__in=product_ids[start:start + batch_size]).values_list(
+            'category_id', flat=True))
+    return category_ids
+
+
+@contextmanager
+def deferred():
+    """
+    Копит затронутые категории и продукты внутри блока и пересчитывает
+    сводки их категорий при выходе одним проходом.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield _local.pending
+        return
+    _local.pending = {'categories': set(), 'products': set()}
+    try:
+        yield _local.pending
+        refresh(_local.pending['categories'] | product_categories(_local.pending['products']))
+    finally:
+        _local.pending = None
+
+
+def mark(category_ids):
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        refresh(category_ids)
+    else:
+        pending['categories'].update(category_ids)
+
+
+def mark_products(product_ids):
+    """Категории продуктов определяются при пересчете, внутри deferred() - одним запросом на блок."""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        refresh(product_categories(product_ids))
+    else:
+        pending['products'].update(product_ids)
+
+
+def _update(category_ids, **values):
+    """Меняет сводки категорий; отсутствующие сводки создаются пересчетом."""
+    category_ids = set(category_ids)
+    if CategoryStats.objects.filter(category_id__in=category_ids).update(**values) < len(category_ids):
+        refresh(category_ids - set(CategoryStats.objects.filter(category_id__in=category_ids).values_list(
+            'category_id', flat=True)))
+    caching.bump_version(CategoryStats)
+
+
+def count_product(category_id, delta):
+    """Продукт добавлен (delta=1) или удален (delta=-1) из категории."""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['categories'].add(category_id)
+    elif category_id is not None:
+        _update([category_id], product_count=F('product_count') + delta)
+
+
+def change_offer(previous, current):
+    """
+    Товар изменен: previous и current - (product_id, quantity, price) до и
+    после изменения, None - товара нет.
+
+    Предложение в наличии меняет счетчик категории на единицу, а цена
+    расширяет ее диапазон на месте. Минимум и максимум читаются заново
+    только если уходит или дорожает самое дешевое предложение категории или
+    уходит или дешевеет самое дорогое. Счетчик всегда меняется на единицу:
+    при удалении queryset строки удаляются до сигналов, и пересчет по базе
+    уже учел бы следующие удаления.
+    """
+    rows = [row for row in (previous, current) if row]
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['products'].update(row[0] for row in rows)
+        return
+    categories = dict(Product.objects.filter(id__in={row[0] for row in rows}).values_list('id', 'category_id'))
+
+    def offer(row):
+        if row and row[1] > 0 and categories.get(row[0]) is not None:
+            return categories[row[0]], row[2]
+
+    old, new = offer(previous), offer(current)
+    if old == new:
+        return
+    changes = {}
+    if old:
+        category_id, price = old
+        new_price = new[1] if new and new[0] == category_id else None
+        min_price, max_price = CategoryStats.objects.filter(category_id=category_id).values_list(
+            'min_price', 'max_price').first() or (None, None)
+        changes[category_id] = {'offer_count': F('offer_count') - 1}
+        if (price == min_price and (new_price is None or new_price > price)) or \
+                (price == max_price and (new_price is None or new_price < price)):
+            changes[category_id].update(ProductInfo.objects.filter(
+                product__category_id=category_id, quantity__gt=0).aggregate(min_price=Min('price'),
+                                                                             max_price=Max('price')))
+    if new:
+        category_id, price = new
+        values = changes.setdefault(category_id, {'offer_count': F('offer_count')})
+        values['offer_count'] += 1
+        if 'min_price' not in values:
+            # LEAST и GREATEST с NULL на разных базах ведут себя по-разному, пустая цена заменяется новой
+            values.update(min_price=Coalesce(Least('min_price', Value(price)), Value(price)),
+                          max_price=Coalesce(Greatest('max_price', Value(price)), Value(price)))
+    for category_id, values in changes.items():
+        _update([category_id], **values)
+
+
+def count_shops(category_ids, delta):
+    """Магазин добавлен в категории (delta=1); набор связей задан точно, как в post_add."""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['categories'].update(category_ids)
+    elif category_ids and delta:
+        _update(category_ids, shop_count=F('shop_count') + delta)
+
+
+def recount_shops(category_ids):
+    """Пересчитывает только число магазинов категорий - по таблице связей, без товаров."""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['categories'].update(category_ids)
+    elif category_ids:
+        shops = Category.shops.through.objects.filter(category_id=OuterRef('category_id')).values(
+            'category_id').annotate(total=Count('supplier_id')).values('total')
+        _update(category_ids, shop_count=Coalesce(Subquery(shops, output_field=IntegerField()), 0))
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Заполняет сводки заново по всем категориям."""
+    CategoryStats.objects.all().delete()
+    category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(category_ids), batch_size):
+        CategoryStats.objects.bulk_create(build_stats(category_ids[start:start + batch_size]))
+    caching.bump_version(CategoryStats)
+    return len(category_ids)
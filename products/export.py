@@ -0,0 +1,44 @@
+from django.db.models import Prefetch
+
+from products.models import Category, ProductInfo, ProductParameter
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_CONTENT_TYPES = {
+    'yaml': 'application/x-yaml; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def shop_categories(shop):
+    """Категории товаров магазина в виде раздела categories."""
+    return list(Category.objects.filter(products__product_infos__shop=shop).distinct()
+                .order_by('id').values('id', 'name'))
+
+
+def iter_shop_goods(shop, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Товары магазина в виде раздела goods.
+
+    Строки читаются курсором частями по chunk_size, параметры каждой части
+    подгружаются одним запросом, поэтому память не зависит от размера каталога.
+    """
+    queryset = (ProductInfo.objects.filter(shop=shop)
+                .select_related('product')
+                .prefetch_related(Prefetch('product_parameters',
+                                           queryset=ProductParameter.objects.select_related('parameter')))
+                .order_by('id'))
+    for product_info in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'id': product_info.external_id,
+            'category': product_info.product.category_id,
+            'model': product_info.model,
+            'name': product_info.product.name,
+            'price': product_info.price,
+            'price_rrc': product_info.price_rrc,
+            'quantity': product_info.quantity,
+            'parameters': {product_parameter.parameter.name: product_parameter.value
+                           for product_parameter in product_info.product_parameters.all()},
+        }
@@ -0,0 +1,146 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, Exists, F, OuterRef, Sum
+
+from products.models import Parameter, ParameterValueFacet, ProductInfo, ProductParameter
+
+
+CONSTRAINT_SEPARATOR = ':'
+
+_local = threading.local()
+
+
+def apply_deltas(deltas, batch_size=1000):
+    """
+    Прибавляет к счетчикам индекса изменения вида
+    {(category_id, parameter_id, value): delta}.
+
+    Недостающие строки создаются с нулевым счетчиком, затем счетчики
+    меняются через F() одним UPDATE на каждое значение delta, поэтому
+    параллельные транзакции не теряют изменений друг друга.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ParameterValueFacet.objects.bulk_create(
+        [ParameterValueFacet(category_id=category_id, parameter_id=parameter_id, value=value)
+         for (category_id, parameter_id, value), delta in deltas.items() if delta > 0],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
+
+    ids = {}
+    category_ids = {category_id for category_id, _, _ in deltas}
+    parameter_ids = {parameter_id for _, parameter_id, _ in deltas}
+    for facet_id, *key in ParameterValueFacet.objects.filter(
+            category_id__in=category_ids, parameter_id__in=parameter_ids).values_list(
+            'id', 'category_id', 'parameter_id', 'value'):
+        if tuple(key) in deltas:
+            ids[tuple(key)] = facet_id
+
+    by_delta = defaultdict(list)
+    for key, delta in deltas.items():
+        if key in ids:
+            by_delta[delta].append(ids[key])
+    for delta, facet_ids in by_delta.items():
+        ParameterValueFacet.objects.filter(id__in=sorted(facet_ids)).update(count=F('count') + delta)
+    ParameterValueFacet.objects.filter(id__in=ids.values(), count__lte=0).delete()
+
+
+@contextmanager
+def deferred(track_signals=True):
+    """
+    Копит изменения индекса внутри блока и записывает их при выходе.
+
+    При track_signals=False изменения ProductParameter через сигналы не
+    учитываются: вызывающий код сообщает о них сам через record().
+    """
+    if getattr(_local, 'deltas', None) is not None:
+        yield _local.deltas
+        return
+    _local.deltas = Counter()
+    _local.track_signals = track_signals
+    try:
+        yield _local.deltas
+        apply_deltas(_local.deltas)
+    finally:
+        _local.deltas = None
+
+
+def signals_enabled():
+    return getattr(_local, 'deltas', None) is None or _local.track_signals
+
+
+def record(category_id, parameter_id, value, delta):
+    deltas = getattr(_local, 'deltas', None)
+    if deltas is None:
+        apply_deltas({(category_id, parameter_id, value): delta})
+    else:
+        deltas[(category_id, parameter_id, value)] += delta
+
+
+def record_deleted(product_infos):
+    """Вычитает из индекса параметры товаров product_infos (queryset или id) одним запросом до их удаления."""
+    for category_id, parameter_id, value, total in ProductParameter.objects.filter(
+            product_info__in=product_infos).values_list('product_info__product__category_id', 'parameter_id',
+                                                        'value').annotate(total=Count('id')).order_by():
+        record(category_id, parameter_id, value, -total)
+
+
+def rebuild():
+    """Пересчитывает индекс по всем ProductParameter."""
+    ParameterValueFacet.objects.all().delete()
+    rows = ProductParameter.objects.values('product_info__product__category_id', 'parameter_id', 'value').annotate(
+        total=Count('id')).order_by()
+    facets = ParameterValueFacet.objects.bulk_create(
+        [ParameterValueFacet(category_id=row['product_info__product__category_id'], parameter_id=row['parameter_id'],
+                             value=row['value'], count=row['total']) for row in rows],
+        batch_size=1000,
+    )
+    return len(facets)
+
+
+def parse_constraints(values):
+    """
+    Разбирает значения параметра запроса param вида "Цвет:красный".
+
+    Возвращает {имя параметра: [значения]}: значения одного параметра
+    объединяются через ИЛИ, разные параметры - через И.
+    """
+    constraints = defaultdict(list)
+    for item in values:
+        name, separator, value = item.partition(CONSTRAINT_SEPARATOR)
+        if not separator or not name.strip():
+            raise ValueError(f'Ожидается фильтр вида "параметр{CONSTRAINT_SEPARATOR}значение": {item}')
+        constraints[name.strip()].append(value.strip())
+    return dict(constraints)
+
+
+def filter_by_parameters(queryset, constraints):
+    """Оставляет в queryset ProductInfo только товары, подходящие под все ограничения."""
+    if not constraints:
+        return queryset
+    parameter_ids = dict(Parameter.objects.filter(name__in=constraints).values_list('name', 'id'))
+    if len(parameter_ids) < len(constraints):
+        return queryset.none()
+    for name, values in constraints.items():
+        queryset = queryset.filter(Exists(ProductParameter.objects.filter(
+            product_info=OuterRef('pk'), parameter_id=parameter_ids[name], value__in=values)))
+    return queryset
+
+
+def facet_counts(category_id=None):
+    """Количество товаров по каждому значению каждого параметра из индекса."""
+    facets = ParameterValueFacet.objects.all()
+    if category_id is not None:
+        facets = facets.filter(category_id=category_id)
+    counts = defaultdict(dict)
+    for name, value, total in facets.values_list('parameter__name', 'value').annotate(
+            total=Sum('count')).order_by('parameter__name', '-total', 'value'):
+        counts[name][value] = total
+    return dict(counts)
+
+
+def product_info_categories(product_info_ids):
+    return dict(ProductInfo.objects.filter(id__in=product_info_ids).values_list('id', 'product__category_id'))
@@ -0,0 +1,120 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Поля, чье представление совпадает со значением из .values(): база уже отдает int, str и bool
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+_mappers = {}
+
+
+def field_path(model, field):
+    """
+    Ключ .values() для поля сериализатора (source с точкой - через связи) и
+    функция преобразования значения (None - значение выводится как есть).
+    Возвращает None, если поле нельзя прочитать из одной колонки.
+    """
+    if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField,
+                          serializers.SerializerMethodField)):
+        return None
+    if field.source == '*':
+        return None
+    *relations, attribute = field.source.split('.')
+    for name in relations:
+        relation = get_model_field(model, name)
+        if relation is None or not is_single_relation(relation):
+            return None
+        model = relation.related_model
+    model_field = get_model_field(model, attribute)
+    if model_field is None or not model_field.concrete or model_field.many_to_many:
+        return None
+    path = '__'.join(relations + [model_field.name])
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # для внешнего ключа .values() отдает id связанного объекта
+        return (path, None) if field.pk_field is None else None
+    if isinstance(field, serializers.RelatedField):
+        return None
+    return path, None if isinstance(field, PLAIN_FIELDS) else field.to_representation
+
+
+def get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def is_single_relation(relation):
+    """
+    Связь, через которую source с точкой читается так же, как сериализатор:
+    обратная один-к-одному (без строки DRF отдает None, как и .values())
+    или обязательный внешний ключ.
+    """
+    if relation.one_to_one and relation.auto_created:
+        return True
+    return relation.concrete and (relation.many_to_one or relation.one_to_one) and not relation.null
+
+
+def compile_mapper(serializer):
+    """
+    Колонки для .values() и функция, которая превращает строку в ответ
+    сериализатора без создания модели и вызова полей на каждую строку.
+
+    Результат кэшируется по классу сериализатора и набору его полей.
+    Возвращает None, если сериализатор читает вложенные объекты,
+    методы или свойства - тогда список строится обычным сериализатором.
+    """
+    fields = [(name, field) for name, field in serializer.fields.items() if not field.write_only]
+    key = (type(serializer), tuple((name, type(field)) for name, field in fields))
+    if key in _mappers:
+        return _mappers[key]
+
+    model = serializer.Meta.model
+    specs = []
+    for name, field in fields:
+        path = field_path(model, field)
+        if path is None:
+            _mappers[key] = None
+            return None
+        specs.append((name, *path))
+
+    paths = [path for _, path, _ in specs]
+    pk_name = model._meta.pk.name
+    if pk_name not in paths:
+        # id нужен постраничному выводу по курсору, в ответ он не попадает
+        paths.append(pk_name)
+
+    if [name for name, _, _ in specs] == paths and not any(convert for _, _, convert in specs):
+        # .values() уже возвращает словарь ответа в нужном порядке
+        def mapper(row):
+            return row
+    else:
+        specs = tuple(specs)
+
+        def mapper(row):
+            return {name: row[path] if convert is None or row[path] is None else convert(row[path])
+                    for name, path, convert in specs}
+
+    _mappers[key] = paths, mapper
+    return _mappers[key]
+
+
+class ValuesListMixin:
+    """
+    Быстрый список только для чтения: строки читаются через .values() и
+    переводятся в ответ заранее собранной функцией. Ответ совпадает с
+    ответом сериализатора; для сериализаторов с вложенными объектами
+    (например, ?expand=) используется обычный list.
+    """
+
+    def list(self, request, *args, **kwargs):
+        compiled = compile_mapper(self.get_serializer())
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        paths, mapper = compiled
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*paths)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([mapper(row) for row in page])
+        return Response([mapper(row) for row in queryset])
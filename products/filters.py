@@ -0,0 +1,51 @@
+from django_filters import rest_framework as filters
+
+from products.models import CatalogEntry, ProductInfo
+
+
+class ProductInfoFilter(filters.FilterSet):
+    """
+    Фильтры товаров магазинов по диапазону цены и наличию.
+
+    Запросы вида shop + price_min/price_max обслуживает индекс
+    product_info_shop_price, in_stock и quantity_gt с сортировкой по цене -
+    частичный индекс product_info_in_stock_price по товарам в наличии.
+    """
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    quantity_gt = filters.NumberFilter(method='filter_quantity_gt')
+    in_stock = filters.BooleanFilter(method='filter_in_stock')
+    ordering = filters.OrderingFilter(fields=('price', 'quantity', 'id'))
+
+    class Meta:
+        model = ProductInfo
+        fields = ['id', 'model', 'external_id', 'product', 'shop', 'quantity', 'price', 'price_rrc']
+
+    def filter_quantity_gt(self, queryset, name, value):
+        queryset = queryset.filter(quantity__gt=value)
+        if value >= 0:
+            # условие частичного индекса, планировщик не выводит его из quantity > N сам
+            queryset = queryset.filter(quantity__gt=0)
+        return queryset
+
+    def filter_in_stock(self, queryset, name, value):
+        return queryset.filter(quantity__gt=0) if value else queryset.filter(quantity=0)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not queryset.query.order_by:
+            queryset = queryset.order_by('id')
+        elif 'id' not in queryset.query.order_by and '-id' not in queryset.query.order_by:
+            # одинаковые цены иначе идут в произвольном порядке между страницами
+            queryset = queryset.order_by(*queryset.query.order_by, 'id')
+        return queryset
+
+
+class CatalogEntryFilter(filters.FilterSet):
+    """Те же параметры, что у карточек из ProductInfo, для чтения из CatalogEntry."""
+    id = filters.NumberFilter(field_name='product_info_id')
+    product__category = filters.NumberFilter(field_name='category_id')
+
+    class Meta:
+        model = CatalogEntry
+        fields = ['id', 'external_id', 'product', 'product__category', 'shop']
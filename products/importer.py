@@ -0,0 +1,653 @@
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+from queue import Empty, Full
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from products import catalog, category_stats, facets
+from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+from products.signals import price_list_imported
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+SHARD_QUEUE_SIZE = 4
+# Сколько секунд записанная часть ждет решения основного процесса, прежде чем откатиться
+SHARD_DECISION_TIMEOUT = 600
+# Как часто основной процесс, ожидая исполнителей, проверяет, живы ли их процессы, секунды
+SHARD_POLL_INTERVAL = 1
+PARTITION_KEYS = ('category', 'hash')
+
+PRODUCT_INFO_FIELDS = ['product_id', 'model', 'quantity', 'price', 'price_rrc']
+
+
+def chunked(iterable, size):
+    """Разбивает итерируемый объект на списки длиной не более size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_pool_context():
+    """Контекст fork для пула или None, если пул здесь недоступен."""
+    if multiprocessing.current_process().daemon:
+        return None
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork')
+
+
+class QueryCounter:
+    """Считает SQL-запросы, выполненные внутри блока with."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.count = 0
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+
+
+class ImportStats:
+    """Счетчики одной загрузки прайс-листа."""
+
+    def __init__(self):
+        self.rows = 0
+        self.categories_created = 0
+        self.products_created = 0
+        self.product_infos_created = 0
+        self.parameters_created = 0
+        self.product_parameters_created = 0
+        self.product_infos_updated = 0
+        self.product_infos_unchanged = 0
+        self.product_infos_deleted = 0
+        self.product_parameters_updated = 0
+        self.product_parameters_deleted = 0
+        self.queries = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_sec(self):
+        if not self.seconds:
+            return 0.0
+        return self.rows / self.seconds
+
+    def as_dict(self):
+        data = dict(vars(self))
+        data['seconds'] = round(self.seconds, 3)
+        data['rows_per_sec'] = round(self.rows_per_sec, 1)
+        return data
+
+    def merge(self, data):
+        """Добавляет счетчики другой части загрузки, кроме времени."""
+        for name, value in data.items():
+            if name not in ('seconds', 'rows_per_sec') and hasattr(self, name):
+                setattr(self, name, getattr(self, name) + value)
+
+
+class ProductImporter:
+    """
+    Загрузка товаров магазина пакетами вместо построчных запросов.
+
+    Категории и параметры загружаются в словари один раз, продукты
+    дочитываются по мере появления новых имен. Каждый пакет из batch_size
+    строк записывается несколькими bulk_create, поэтому число запросов
+    растет с числом пакетов, а не с числом строк и параметров.
+
+    В режиме differential товары сопоставляются с уже загруженными по
+    (shop, external_id): записываются только новые, измененные и
+    пропавшие из файла строки.
+    """
+
+    def __init__(self, shop, batch_size=DEFAULT_BATCH_SIZE, progress=None, differential=False,
+                 delete_missing=True):
+        self.shop = shop
+        self.batch_size = batch_size
+        self.progress = progress
+        self.differential = differential
+        self.delete_missing = delete_missing
+        self.stats = ImportStats()
+        self._category_ids = set()
+        self._parameter_ids = {}
+        self._product_ids = {}
+        self._existing = {}
+        self._seen_external_ids = set()
+
+    def run(self, goods, categories=()):
+        started = time.perf_counter()
+        with QueryCounter() as counter, transaction.atomic(), facets.deferred(track_signals=False), \
+                catalog.deferred(), category_stats.deferred():
+            self.write(goods, categories, started)
+        self.stats.queries = counter.count
+        self.stats.seconds = time.perf_counter() - started
+        logger.info('Импорт магазина %s завершен: %s', self.shop.id, self.stats.as_dict())
+        price_list_imported.send(sender=self.__class__, shop=self.shop, stats=self.stats)
+        return self.stats
+
+    def write(self, goods, categories=(), started=None):
+        """Записывает товары; транзакцию и отложенные пересчеты открывает вызывающий код."""
+        started = started or time.perf_counter()
+        self.import_categories(categories)
+        self._preload()
+        for batch in chunked(goods, self.batch_size):
+            self._import_batch(batch)
+            self.stats.seconds = time.perf_counter() - started
+            if self.progress:
+                self.progress(self.stats)
+        if self.differential and self.delete_missing:
+            self._delete_missing()
+
+    def import_categories(self, categories):
+        names = {category['id']: category['name'] for category in categories}
+        if not names:
+            return
+        existing = set(Category.objects.filter(id__in=names).values_list('id', flat=True))
+        new_categories = [Category(id=category_id, name=name)
+                          for category_id, name in names.items() if category_id not in existing]
+        Category.objects.bulk_create(new_categories, batch_size=self.batch_size)
+        category_stats.mark(category.id for category in new_categories)
+        self.stats.categories_created += len(new_categories)
+
+    def _preload(self):
+        self._category_ids = set(Category.objects.values_list('id', flat=True))
+        self._parameter_ids = dict(Parameter.objects.values_list('name', 'id'))
+        if self.differential:
+            self._existing = {
+                row[0]: row[1:]
+                for row in ProductInfo.objects.filter(shop=self.shop).values_list('external_id', 'id',
+                                                                                  *PRODUCT_INFO_FIELDS)
+            }
+
+    def _check_categories(self, batch):
+        for product_data in batch:
+            if product_data['category'] not in self._category_ids:
+                logger.info(f"Категория с ID {product_data['category']} не существует.")
+                raise ValueError(f"Категория с ID {product_data['category']} не существует.")
+
+    def _import_batch(self, batch):
+        self._check_categories(batch)
+        self._resolve_products(batch)
+        self._resolve_parameters(batch)
+        if self.differential:
+            self._merge_batch(batch)
+        else:
+            self._create_batch(batch)
+        self.stats.rows += len(batch)
+
+    def _build_product_info(self, product_data):
+        return ProductInfo(
+            model=product_data['model'],
+            external_id=product_data['id'],
+            product_id=self._product_ids[(product_data['name'], product_data['category'])],
+            shop=self.shop,
+            quantity=product_data['quantity'],
+            price=product_data['price'],
+            price_rrc=product_data['price_rrc'],
+        )
+
+    def _incoming_parameters(self, product_data):
+        return {
+            self._parameter_ids[param_name]: str(param_value)
+            for param_name, param_value in (product_data.get('parameters') or {}).items()
+        }
+
+    def _create_batch(self, batch):
+        product_infos = ProductInfo.objects.bulk_create(
+            [self._build_product_info(product_data) for product_data in batch],
+            batch_size=self.batch_size,
+        )
+        product_parameters = [
+            ProductParameter(product_info_id=product_info.id, parameter_id=parameter_id, value=value)
+            for product_info, product_data in zip(product_infos, batch)
+            for parameter_id, value in self._incoming_parameters(product_data).items()
+        ]
+        ProductParameter.objects.bulk_create(product_parameters, batch_size=self.batch_size)
+        catalog.mark(product_info.id for product_info in product_infos)
+        category_stats.mark(product_data['category'] for product_data in batch)
+        for product_data in batch:
+            for parameter_id, value in self._incoming_parameters(product_data).items():
+                facets.record(product_data['category'], parameter_id, value, 1)
+
+        self.stats.product_infos_created += len(product_infos)
+        self.stats.product_parameters_created += len(product_parameters)
+
+    def _merge_batch(self, batch):
+        new_rows, existing_rows, changed = [], [], []
+        for product_data in batch:
+            external_id = product_data['id']
+            if external_id in self._seen_external_ids:
+                raise ValueError(f"Товар с id {external_id} встречается в файле несколько раз.")
+            self._seen_external_ids.add(external_id)
+
+            current = self._existing.get(external_id)
+            if current is None:
+                new_rows.append(product_data)
+                continue
+            product_info = self._build_product_info(product_data)
+            product_info.id = current[0]
+            existing_rows.append((product_info, product_data, current[1]))
+            if tuple(getattr(product_info, field) for field in PRODUCT_INFO_FIELDS) != current[1:]:
+                changed.append(product_info)
+                # товар мог перейти к продукту другой категории
+                category_stats.mark([product_data['category']])
+                category_stats.mark_products([current[1]])
+
+        if new_rows:
+            self._create_batch(new_rows)
+        ProductInfo.objects.bulk_update(changed, PRODUCT_INFO_FIELDS, batch_size=self.batch_size)
+        catalog.mark(product_info.id for product_info in changed)
+        self.stats.product_infos_updated += len(changed)
+        self.stats.product_infos_unchanged += len(existing_rows) - len(changed)
+        self._merge_parameters(existing_rows)
+
+    def _merge_parameters(self, rows):
+        if not rows:
+            return
+        current = defaultdict(dict)
+        for product_parameter_id, product_info_id, parameter_id, value in ProductParameter.objects.filter(
+                product_info_id__in=[product_info.id for product_info, _, _ in rows]).values_list(
+                'id', 'product_info_id', 'parameter_id', 'value'):
+            current[product_info_id][parameter_id] = (product_parameter_id, value)
+        previous_categories = dict(Product.objects.filter(
+            id__in={product_id for product_info, _, product_id in rows if product_id != product_info.product_id}
+        ).values_list('id', 'category_id'))
+
+        to_create, to_update, to_delete, touched = [], [], [], set()
+        for product_info, product_data, previous_product_id in rows:
+            incoming = self._incoming_parameters(product_data)
+            stored = current.get(product_info.id, {})
+            category_id = product_data['category']
+            moved = previous_categories.get(previous_product_id, category_id) != category_id
+            if moved:
+                for parameter_id, (_, value) in stored.items():
+                    facets.record(previous_categories[previous_product_id], parameter_id, value, -1)
+                for parameter_id, value in incoming.items():
+                    facets.record(category_id, parameter_id, value, 1)
+
+            for parameter_id, value in incoming.items():
+                stored_parameter = stored.get(parameter_id)
+                if stored_parameter is None:
+                    to_create.append(ProductParameter(product_info_id=product_info.id, parameter_id=parameter_id,
+                                                      value=value))
+                elif stored_parameter[1] != value:
+                    to_update.append(ProductParameter(id=stored_parameter[0], value=value))
+                else:
+                    continue
+                touched.add(product_info.id)
+                if not moved:
+                    if stored_parameter:
+                        facets.record(category_id, parameter_id, stored_parameter[1], -1)
+                    facets.record(category_id, parameter_id, value, 1)
+            for parameter_id, (product_parameter_id, value) in stored.items():
+                if parameter_id not in incoming:
+                    to_delete.append(product_parameter_id)
+                    touched.add(product_info.id)
+                    if not moved:
+                        facets.record(category_id, parameter_id, value, -1)
+
+        ProductParameter.objects.bulk_create(to_create, batch_size=self.batch_size)
+        ProductParameter.objects.bulk_update(to_update, ['value'], batch_size=self.batch_size)
+        if to_delete:
+            ProductParameter.objects.filter(id__in=to_delete).delete()
+        catalog.mark(touched)
+        self.stats.product_parameters_created += len(to_create)
+        self.stats.product_parameters_updated += len(to_update)
+        self.stats.product_parameters_deleted += len(to_delete)
+
+    def _delete_missing(self):
+        removed = [current[0] for external_id, current in self._existing.items()
+                   if external_id not in self._seen_external_ids]
+        for chunk in chunked(removed, self.batch_size):
+            facets.record_deleted(chunk)
+            ProductInfo.objects.filter(id__in=chunk).delete()
+        self.stats.product_infos_deleted += len(removed)
+
+    def _resolve_products(self, batch):
+        missing = {(product_data['name'], product_data['category']) for product_data in batch}
+        missing.difference_update(self._product_ids)
+        if not missing:
+            return
+
+        names = {name for name, _ in missing}
+        for name, category_id, product_id in Product.objects.filter(name__in=names).values_list(
+                'name', 'category_id', 'id'):
+            self._product_ids.setdefault((name, category_id), product_id)
+        missing.difference_update(self._product_ids)
+
+        new_products = Product.objects.bulk_create(
+            [Product(name=name, category_id=category_id) for name, category_id in missing],
+            batch_size=self.batch_size,
+        )
+        for product in new_products:
+            self._product_ids[(product.name, product.category_id)] = product.id
+        self.stats.products_created += len(new_products)
+
+    def _resolve_parameters(self, batch):
+        missing = {param_name for product_data in batch for param_name in (product_data.get('parameters') or {})}
+        missing.difference_update(self._parameter_ids)
+        if not missing:
+            return
+
+        # параметр мог создать другой процесс параллельной загрузки
+        self._parameter_ids.update(Parameter.objects.filter(name__in=missing).values_list('name', 'id'))
+        missing.difference_update(self._parameter_ids)
+        if not missing:
+            return
+
+        new_parameters = Parameter.objects.bulk_create([Parameter(name=name) for name in missing],
+                                                       batch_size=self.batch_size)
+        for parameter in new_parameters:
+            self._parameter_ids[parameter.name] = parameter.id
+        self.stats.parameters_created += len(new_parameters)
+
+
+class ImportAborted(Exception):
+    """Основной процесс прервал параллельную загрузку."""
+
+
+class ShardGoods:
+    """Товары одной части из очереди основного процесса."""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.finished = False
+
+    def __iter__(self):
+        while not self.finished:
+            batch = self.queue.get()
+            if batch is None or batch == 'abort':
+                self.finished = True
+            if batch is None:
+                return
+            if batch == 'abort':
+                raise ImportAborted('Загрузка прервана основным процессом.')
+            yield from batch
+
+    def drain(self):
+        """Дочитывает очередь после ошибки, чтобы основной процесс не ждал места в ней."""
+        try:
+            for _ in self:
+                pass
+        except ImportAborted:
+            pass
+
+
+def _import_shard(index, shop_id, batch_size, differential, queue, decisions, results):
+    """
+    Записывает одну часть товаров; выполняется в дочернем процессе.
+
+    Записанная часть сообщает о готовности ('ready') и держит транзакцию
+    открытой до решения основного процесса: 'commit' фиксирует ее, все
+    остальное откатывает. После готовности отправляется еще одно сообщение -
+    'committed' или 'rolled_back'; ошибка до готовности - 'error'.
+    """
+    from customers_suppliers.models import Supplier
+
+    goods = ShardGoods(queue)
+    ready = False
+    try:
+        shop = Supplier.objects.get(id=shop_id)
+        importer = ProductImporter(shop, batch_size, differential=differential, delete_missing=False)
+        started = time.perf_counter()
+        with QueryCounter() as counter, transaction.atomic():
+            with facets.deferred(track_signals=False) as deltas, catalog.deferred(), \
+                    category_stats.deferred() as pending:
+                importer.write(goods, started=started)
+                # счетчики фасетов и сводки категорий бывают общими для нескольких частей; их пишет
+                # основной процесс после фиксации, иначе части ждали бы блокировок друг друга
+                shared = {'facets': dict(deltas), 'categories': set(pending['categories']),
+                          'products': set(pending['products'])}
+                deltas.clear()
+                pending['categories'].clear()
+                pending['products'].clear()
+            importer.stats.queries = counter.count
+            results.put((index, 'ready', (importer.stats.as_dict(), shared)))
+            ready = True
+            try:
+                decision = decisions.get(timeout=SHARD_DECISION_TIMEOUT)
+            except Empty:
+                raise ImportAborted(f'Часть {index} не дождалась решения основного процесса за '
+                                    f'{SHARD_DECISION_TIMEOUT} с.')
+            if decision != 'commit':
+                raise ImportAborted('Загрузка отменена основным процессом.')
+        results.put((index, 'committed', None))
+    except ImportAborted as e:
+        results.put((index, 'rolled_back' if ready else 'error', str(e)))
+    except Exception as e:
+        logger.exception('Ошибка импорта части товаров магазина %s', shop_id)
+        results.put((index, 'rolled_back' if ready else 'error', str(e)))
+        goods.drain()
+    finally:
+        connections.close_all()
+
+
+def send_to_shard(queue, item, process):
+    """Кладет item в очередь исполнителя; False, если его процесс завершился и очередь уже не разберет."""
+    while True:
+        try:
+            queue.put(item, timeout=SHARD_POLL_INTERVAL)
+            return True
+        except Full:
+            if not process.is_alive():
+                return False
+
+
+def wait_shards(processes, results, inbox, indexes, kinds):
+    """
+    Ждет от каждой части из indexes одно сообщение вида из kinds и
+    возвращает {номер части: (вид, данные)}. Сообщения других видов
+    остаются в inbox до следующего вызова. Часть, процесс которой
+    завершился без сообщения, получает вид 'error'.
+    """
+    replies, pending, dead = {}, set(indexes), set()
+    while pending:
+        for index in list(pending):
+            for kind in kinds:
+                if (index, kind) in inbox:
+                    replies[index] = (kind, inbox.pop((index, kind)))
+                    pending.discard(index)
+        if not pending:
+            break
+        try:
+            index, kind, payload = results.get(timeout=SHARD_POLL_INTERVAL)
+        except Empty:
+            # сообщение, отправленное перед выходом, могло прийти после проверки; часть
+            # считается потерянной, только если ее процесс уже был завершен при прошлом ожидании
+            for index in pending & dead:
+                replies[index] = ('error', f'Процесс части {index} завершился с кодом {processes[index].exitcode} '
+                                           f'без ответа.')
+            pending -= dead
+            dead = {index for index in pending if not processes[index].is_alive()}
+            continue
+        inbox[index, kind] = payload
+    return replies
+
+
+class ParallelImporter(ProductImporter):
+    """
+    Загрузка товаров магазина несколькими процессами одновременно.
+
+    Основной процесс читает goods, создает категории, параметры и (при
+    разбиении по hash) продукты, после чего раздает пакеты товаров
+    процессам-исполнителям. Каждый исполнитель записывает свою часть через
+    ProductImporter со своим соединением с базой и в своей транзакции.
+
+    Транзакции частей фиксируются вместе: исполнитель, записавший свою
+    часть, ждет решения основного процесса, и при ошибке в любой части все
+    части откатываются. Не фиксированной может остаться только часть, у
+    которой не удалась сама фиксация после успешной записи; тогда ошибка
+    называет это явно, и загрузку нужно повторить с differential=True.
+    Категории, параметры и продукты, которые основной процесс создает до
+    раздачи товаров, остаются и после отката.
+
+    partition='category' отдает все товары категории одному исполнителю,
+    partition='hash' распределяет товары по external_id. Счетчики фасетов,
+    сводки категорий и удаление пропавших из файла товаров в режиме
+    differential основной процесс записывает после фиксации всех частей.
+
+    На SQLite, внутри открытой транзакции и там, где нельзя запустить
+    дочерние процессы, загрузка идет в текущем процессе.
+    """
+
+    def __init__(self, shop, workers=None, partition='category', batch_size=DEFAULT_BATCH_SIZE, progress=None,
+                 differential=False):
+        super().__init__(shop, batch_size, progress, differential)
+        if partition not in PARTITION_KEYS:
+            raise ValueError(f"Неизвестный способ разбиения: {partition}.")
+        self.workers = workers or os.cpu_count() or 1
+        self.partition = partition
+        self._shard_loads = [0] * self.workers
+        self._category_shards = {}
+
+    def run(self, goods, categories=()):
+        context = get_pool_context()
+        connection = connections[DEFAULT_DB_ALIAS]
+        # SQLite допускает одну пишущую транзакцию, а внутри открытой транзакции
+        # дочерние процессы не увидят ее данных
+        if self.workers == 1 or context is None or connection.vendor == 'sqlite' or connection.in_atomic_block:
+            return super().run(goods, categories)
+
+        started = time.perf_counter()
+        with QueryCounter() as counter:
+            with transaction.atomic():
+                self.import_categories(categories)
+                self._preload()
+            connections.close_all()
+
+            queues = [context.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(self.workers)]
+            decisions = [context.Queue() for _ in range(self.workers)]
+            results = context.Queue()
+            processes = [context.Process(target=_import_shard,
+                                         args=(index, self.shop.id, self.batch_size, self.differential, queue,
+                                               decisions[index], results))
+                         for index, queue in enumerate(queues)]
+            for process in processes:
+                process.start()
+
+            dispatched = False
+            try:
+                self._dispatch(goods, queues, processes)
+                dispatched = True
+            except BaseException:
+                for queue, process in zip(queues, processes):
+                    send_to_shard(queue, 'abort', process)
+                raise
+            finally:
+                committed, errors = self._finish_shards(processes, decisions, results, commit=dispatched)
+
+            for data, _ in committed:
+                self.stats.merge(data)
+            self._apply_shared([shared for _, shared in committed])
+            if errors:
+                raise ValueError('; '.join(errors))
+            if self.differential:
+                with transaction.atomic(), facets.deferred(track_signals=False), category_stats.deferred():
+                    self._delete_missing()
+        self.stats.queries += counter.count
+        self.stats.seconds = time.perf_counter() - started
+        logger.info('Параллельный импорт магазина %s завершен: %s', self.shop.id, self.stats.as_dict())
+        price_list_imported.send(sender=self.__class__, shop=self.shop, stats=self.stats)
+        return self.stats
+
+    @staticmethod
+    def _finish_shards(processes, decisions, results, commit):
+        """
+        Фиксирует части, если все они записаны без ошибок и commit=True,
+        иначе откатывает все. Возвращает итоги зафиксированных частей
+        [(статистика, общие изменения)] и ошибки.
+        """
+        inbox = {}
+        written = wait_shards(processes, results, inbox, range(len(processes)), ('ready', 'error'))
+        ready = {index: payload for index, (kind, payload) in written.items() if kind == 'ready'}
+        errors = [payload for kind, payload in written.values() if kind != 'ready']
+        commit = commit and not errors
+        for index in ready:
+            decisions[index].put('commit' if commit else 'rollback')
+
+        finished = wait_shards(processes, results, inbox, ready, ('committed', 'rolled_back'))
+        committed = [ready[index] for index, (kind, _) in finished.items() if kind == 'committed']
+        failed = [payload for kind, payload in finished.values() if kind != 'committed']
+        for process in processes:
+            process.join()
+        if commit and failed:
+            errors.append(f"Зафиксировано частей: {len(committed)} из {len(processes)}, остальные не "
+                          f"зафиксированы ({'; '.join(failed)}). Повторите загрузку с differential=true.")
+        return committed, errors
+
+    @staticmethod
+    def _apply_shared(shared):
+        """Записывает счетчики фасетов и сводки категорий зафиксированных частей."""
+        deltas, category_ids, product_ids = Counter(), set(), set()
+        for changes in shared:
+            deltas.update(changes['facets'])
+            category_ids |= changes['categories']
+            product_ids |= changes['products']
+        with transaction.atomic():
+            facets.apply_deltas(deltas)
+            category_stats.refresh(category_ids | category_stats.product_categories(product_ids))
+
+    def shard_for(self, product_data):
+        """Номер исполнителя для товара; новая категория уходит наименее загруженному."""
+        if self.partition == 'hash':
+            return product_data['id'] % self.workers
+        shard = self._category_shards.get(product_data['category'])
+        if shard is None:
+            shard = self._shard_loads.index(min(self._shard_loads))
+            self._category_shards[product_data['category']] = shard
+        self._shard_loads[shard] += 1
+        return shard
+
+    def _dispatch(self, goods, queues, processes):
+        buffers = [[] for _ in queues]
+        dispatched = 0
+        for batch in chunked(goods, self.batch_size):
+            self._check_categories(batch)
+            if self.differential:
+                self._check_duplicates(batch)
+            self._resolve_parameters(batch)
+            if self.partition == 'hash':
+                self._resolve_products(batch)
+            for product_data in batch:
+                shard = self.shard_for(product_data)
+                buffers[shard].append(product_data)
+                if len(buffers[shard]) >= self.batch_size:
+                    self._send(queues, processes, shard, buffers[shard])
+                    buffers[shard] = []
+            dispatched += len(batch)
+            if self.progress:
+                self.stats.rows = dispatched
+                self.progress(self.stats)
+        self.stats.rows = 0
+        for shard, buffer in enumerate(buffers):
+            if buffer:
+                self._send(queues, processes, shard, buffer)
+            self._send(queues, processes, shard, None)
+
+    @staticmethod
+    def _send(queues, processes, shard, item):
+        if not send_to_shard(queues[shard], item, processes[shard]):
+            raise ValueError(f'Процесс части {shard} завершился с кодом {processes[shard].exitcode}.')
+
+    def _check_duplicates(self, batch):
+        for product_data in batch:
+            if product_data['id'] in self._seen_external_ids:
+                raise ValueError(f"Товар с id {product_data['id']} встречается в файле несколько раз.")
+            self._seen_external_ids.add(product_data['id'])
@@ -0,0 +1,150 @@
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from customers_suppliers.models import CustomUser, Supplier
+from products.importer import PARTITION_KEYS, QueryCounter, get_pool_context
+from products.management.commands.generate_price_list import DEFAULT_SIZES, price_list_path, write_price_list
+from products.models import Category
+from products.pipeline import import_price_list
+from products.price_list import PRICE_LIST_FORMATS
+from products.synthetic import generate_categories
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Пиковый RSS процесса в мегабайтах (ru_maxrss на Linux в КБ, на macOS в байтах)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / 1024 / (1024 if platform.system() == 'Darwin' else 1), 1)
+
+
+class Command(BaseCommand):
+    help = 'Замеряет загрузку синтетических прайс-листов: время, строк/с, число SQL-запросов и пиковую память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Количество товаров')
+        parser.add_argument('--file-format', choices=PRICE_LIST_FORMATS, default='yaml')
+        parser.add_argument('--data-dir', help='Каталог с файлами generate_price_list; иначе файлы создаются заново')
+        parser.add_argument('--categories', type=int, default=50,
+                            help='Количество категорий, как у generate_price_list; в CSV их нет, они создаются заранее')
+        parser.add_argument('--differential', action='store_true', help='Загружать в режиме только изменений')
+        parser.add_argument('--workers', type=int, default=1, help='Число процессов записи')
+        parser.add_argument('--partition', choices=PARTITION_KEYS, default='category',
+                            help='Разбиение товаров между процессами записи')
+        parser.add_argument('--keep', action='store_true', help='Не откатывать загруженные данные')
+        parser.add_argument('--output', default='bench_import_results.json', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for size in sorted(options['sizes']):
+                path = price_list_path(options['data_dir'] or directory, size, options['file_format'])
+                if not os.path.exists(path):
+                    write_price_list(path, size, options['file_format'], categories=options['categories'])
+                result = self.measure(path, size, options)
+                results.append(result)
+                self.stdout.write(f"{size:>8}: {result['wall_seconds']} с, {result['rows_per_sec']} строк/с, "
+                                  f"{result['queries']} запросов, RSS {result['peak_rss_mb']} МБ")
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'file_format': options['file_format'],
+                'differential': options['differential'],
+                'workers': options['workers'],
+                'partition': options['partition'],
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def measure(self, path, size, options):
+        """
+        Замеряет один файл в отдельном процессе, чтобы пиковая память
+        относилась только к этому размеру. Там, где fork недоступен, замер
+        идет в текущем процессе, и peak_rss_mb - пик за все размеры.
+        """
+        context = get_pool_context()
+        if context is None:
+            return self.run_size(path, size, options)
+        # дочерний процесс не должен работать через соединения родителя
+        connections.close_all()
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=self.run_child, args=(sender, path, size, options))
+        process.start()
+        sender.close()
+        try:
+            result, error = receiver.recv()
+        except EOFError:
+            result, error = None, f'Процесс замера {size} товаров завершился без результата'
+        process.join()
+        if error:
+            raise ValueError(error)
+        return result
+
+    def run_child(self, sender, path, size, options):
+        try:
+            sender.send((self.run_size(path, size, options), None))
+        except Exception as e:
+            sender.send((None, str(e)))
+        finally:
+            connections.close_all()
+
+    def run_size(self, path, size, options):
+        """
+        Загружает один файл; без --keep все изменения откатываются.
+
+        Параллельная запись идет в отдельных транзакциях процессов, поэтому
+        при --workers больше 1 вместо отката удаляются товары тестового
+        магазина, а созданные продукты и параметры остаются в базе.
+        """
+        parallel = options['workers'] > 1
+        with nullcontext() if parallel else transaction.atomic():
+            if options['file_format'] == 'csv':
+                Category.objects.bulk_create(
+                    [Category(**category) for category in generate_categories(options['categories'])],
+                    ignore_conflicts=True)
+            # с --keep магазины прошлых запусков остаются, поэтому имя пользователя уникально
+            name = f'bench-{size}-{uuid.uuid4().hex[:8]}'
+            user = CustomUser.objects.create_user(username=name, email=f'{name}@example.com', password=None,
+                                                  user_type='supplier')
+            shop = Supplier.objects.create(user=user, supplier_type='IP', inn='000000000000')
+
+            try:
+                started = time.perf_counter()
+                with QueryCounter() as counter:
+                    _, report, stats = import_price_list(lambda: open(path, 'rb'), lambda shop_id: shop,
+                                                         file_format=options['file_format'],
+                                                         shop_id=shop.id,
+                                                         differential=options['differential'],
+                                                         workers=options['workers'],
+                                                         partition=options['partition'])
+                wall_seconds = time.perf_counter() - started
+            finally:
+                if not options['keep']:
+                    if parallel:
+                        user.delete()
+                    else:
+                        transaction.set_rollback(True)
+
+        if stats is None:
+            raise ValueError(f'Файл {path} не прошел проверку: {report.errors[:5]}')
+        return {
+            'size': size,
+            'rows': stats.rows,
+            'wall_seconds': round(wall_seconds, 3),
+            'import_seconds': round(stats.seconds, 3),
+            'rows_per_sec': round(stats.rows / wall_seconds, 1),
+            'queries': counter.count,
+            'import_queries': stats.queries,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_children_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        }
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from Orders.log import QueueFileHandler, SamplingFilter
+from customers_suppliers.models import CustomUser, Supplier
+from products.views import ProductViewSet
+
+
+LOGGER_NAMES = ['products', 'products.permissions']
+
+MODES = ['off', 'sync', 'queue', 'queue_sampled']
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку запроса списка продуктов без журнала, с синхронной записью в файл, '
+            'с записью через очередь и с выборкой записей проверок доступа')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Количество запросов для каждого режима')
+        parser.add_argument('--sample-rate', type=float, default=settings.LOG_PERMISSIONS_SAMPLE_RATE,
+                            help='Доля записей INFO проверок доступа в режиме queue_sampled')
+        parser.add_argument('--output', default='bench_logging_results.json', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        loggers = [logging.getLogger(name) for name in LOGGER_NAMES]
+        saved = [(logger.handlers, logger.filters, logger.level, logger.propagate, logger.disabled)
+                 for logger in loggers]
+        results = []
+        try:
+            # запросы идут напрямую во view, без middleware, с хостом APIRequestFactory;
+            # один процесс, поэтому кэш ответов включается и с локальным кэшем
+            with tempfile.TemporaryDirectory() as directory, transaction.atomic(), \
+                    override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], RESPONSE_CACHE=True):
+                user = CustomUser.objects.create_user(username='bench-logging', email='bench-logging@example.com',
+                                                      password=None, user_type='supplier')
+                Supplier.objects.create(user=user, supplier_type='IP', inn='000000000000')
+                for mode in MODES:
+                    filename = os.path.join(directory, f'{mode}.log')
+                    handlers = self.configure(loggers, mode, filename, options['sample_rate'])
+                    result = self.run_mode(user, options['requests'])
+                    for handler in handlers:
+                        handler.close()
+                    result.update(mode=mode, log_bytes=os.path.getsize(filename) if os.path.exists(filename) else 0)
+                    results.append(result)
+                    self.stdout.write(f"{mode:>14}: среднее {result['mean_ms']} мс, p50 {result['p50_ms']} мс, "
+                                      f"p99 {result['p99_ms']} мс, журнал {result['log_bytes']} байт")
+                transaction.set_rollback(True)
+        finally:
+            for logger, (handlers, filters, level, propagate, disabled) in zip(loggers, saved):
+                logger.handlers, logger.filters = handlers, filters
+                logger.setLevel(level)
+                logger.propagate, logger.disabled = propagate, disabled
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'sample_rate': options['sample_rate'],
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    @staticmethod
+    def configure(loggers, mode, filename, sample_rate):
+        """Обработчики режима для логгеров products; возвращает созданные обработчики."""
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', '%Y-%m-%d %H:%M:%S')
+        if mode == 'off':
+            handler = None
+        elif mode == 'sync':
+            handler = logging.FileHandler(filename, encoding='utf-8')
+        else:
+            handler = QueueFileHandler(filename)
+        if handler is not None:
+            handler.setFormatter(formatter)
+        for logger in loggers:
+            logger.handlers = [handler] if handler is not None else []
+            logger.filters = []
+            logger.setLevel(logging.INFO)
+            logger.propagate, logger.disabled = False, mode == 'off'
+        if mode == 'queue_sampled':
+            logging.getLogger('products.permissions').addFilter(SamplingFilter(sample_rate))
+        return [handler] if handler is not None else []
+
+    @staticmethod
+    def run_mode(user, requests):
+        """Первый запрос заполняет кэш ответа, замеряются следующие."""
+        view = ProductViewSet.as_view({'get': 'list'}, throttle_classes=[])
+        factory = APIRequestFactory()
+
+        def get():
+            request = factory.get('/products/api/v1/product/')
+            force_authenticate(request, user=user)
+            response = view(request)
+            if response.status_code != 200:
+                raise ValueError(f'Ответ {response.status_code}')
+
+        get()
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            get()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'requests': requests,
+            'mean_ms': round(statistics.mean(timings), 4),
+            'p50_ms': round(percentile(timings, 0.5), 4),
+            'p95_ms': round(percentile(timings, 0.95), 4),
+            'p99_ms': round(percentile(timings, 0.99), 4),
+        }
@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.price_list import PRICE_LIST_FORMATS, dump_price_list, open_price_list
+from products.synthetic import SYNTHETIC_CATEGORIES, generate_goods
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость разбора прайс-листа в форматах YAML, CSV и JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, default=100000, help='Количество товаров в файле')
+        parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for file_format in PRICE_LIST_FORMATS:
+                path = os.path.join(directory, f'price_list.{file_format}')
+                with open(path, 'w', encoding='utf-8', newline='') as file:
+                    goods = generate_goods(options['goods'])
+                    file.writelines(dump_price_list(file_format, 1, SYNTHETIC_CATEGORIES, goods))
+
+                started = time.perf_counter()
+                with open(path, 'rb') as file:
+                    rows = sum(1 for _ in open_price_list(file, file_format, shop_id=1).goods())
+                seconds = time.perf_counter() - started
+
+                result = {
+                    'format': file_format,
+                    'rows': rows,
+                    'megabytes': round(os.path.getsize(path) / 1024 / 1024, 2),
+                    'seconds': round(seconds, 3),
+                    'rows_per_sec': round(rows / seconds, 1),
+                }
+                results.append(result)
+                self.stdout.write(f"{file_format:>6}: {rows} строк, {result['megabytes']} МБ, "
+                                  f"{result['seconds']} с, {result['rows_per_sec']} строк/с")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
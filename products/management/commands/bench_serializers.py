@@ -0,0 +1,113 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from customers_suppliers.models import CustomUser, Supplier
+from customers_suppliers.renderers import FastJSONRenderer, orjson
+from products.fastpath import compile_mapper
+from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+from products.serializers import CategorySerializer, ProductInfoSerializer, ProductParameterSerializer, ProductSerializer
+
+
+BENCH_SERIALIZERS = {
+    'category': (Category, CategorySerializer),
+    'product': (Product, ProductSerializer),
+    'product_info': (ProductInfo, ProductInfoSerializer),
+    'product_parameter': (ProductParameter, ProductParameterSerializer),
+}
+
+
+def best_time(func, repeat):
+    """Лучшее время из repeat запусков и результат последнего."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает вывод страницы списка обычным сериализатором с JSONRenderer и быстрым путем '
+            'через .values() с FastJSONRenderer: строк/с для каждого этапа')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Строк на странице')
+        parser.add_argument('--repeat', type=int, default=3, help='Число повторов, берется лучшее время')
+        parser.add_argument('--output', default='bench_serializers_results.json', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        results = []
+        with transaction.atomic():
+            self.create_rows(rows)
+            for name, (model, serializer_class) in BENCH_SERIALIZERS.items():
+                result = self.run_serializer(model, serializer_class, rows, repeat)
+                result['name'] = name
+                results.append(result)
+                self.stdout.write(f"{name:>18}: сериализатор {result['serializer']['rows_per_sec']} строк/с, "
+                                  f"быстрый путь {result['fast']['rows_per_sec']} строк/с, "
+                                  f"ускорение {result['speedup']}x")
+            transaction.set_rollback(True)
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'orjson': orjson is not None,
+                'rows': rows,
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def create_rows(self, rows):
+        """Тестовые данные: rows строк каждой модели, после замера они откатываются."""
+        user = CustomUser.objects.create_user(username='bench-serializers', email='bench-serializers@example.com',
+                                              password=None, user_type='supplier')
+        shop = Supplier.objects.create(user=user, supplier_type='IP', inn='000000000000')
+        categories = Category.objects.bulk_create(Category(name=f'Категория {i}') for i in range(rows))
+        products = Product.objects.bulk_create(
+            Product(name=f'Продукт {i}', category=categories[i]) for i in range(rows))
+        product_infos = ProductInfo.objects.bulk_create(
+            ProductInfo(model=f'model-{i}', external_id=i, product=products[i], shop=shop,
+                        quantity=i % 50, price=1000 + i, price_rrc=1200 + i) for i in range(rows))
+        parameter = Parameter.objects.create(name='Цвет')
+        ProductParameter.objects.bulk_create(
+            ProductParameter(product_info=product_info, parameter=parameter, value='черный')
+            for product_info in product_infos)
+
+    def run_serializer(self, model, serializer_class, rows, repeat):
+        queryset = model.objects.order_by('id')
+        paths, mapper = compile_mapper(serializer_class())
+
+        serializer_seconds, data = best_time(lambda: serializer_class(queryset[:rows], many=True).data, repeat)
+        render_seconds, content = best_time(lambda: JSONRenderer().render(data), repeat)
+        fast_seconds, fast_data = best_time(lambda: [mapper(row) for row in queryset.values(*paths)[:rows]], repeat)
+        fast_render_seconds, fast_content = best_time(lambda: FastJSONRenderer().render(fast_data), repeat)
+
+        if json.loads(content) != json.loads(fast_content):
+            raise ValueError(f'Ответы {serializer_class.__name__} не совпадают')
+        count = len(data)
+        before = serializer_seconds + render_seconds
+        after = fast_seconds + fast_render_seconds
+        return {
+            'rows': count,
+            'serializer': self.stage(count, serializer_seconds, render_seconds),
+            'fast': self.stage(count, fast_seconds, fast_render_seconds),
+            'speedup': round(before / after, 1),
+        }
+
+    @staticmethod
+    def stage(count, serialize_seconds, render_seconds):
+        total = serialize_seconds + render_seconds
+        return {
+            'serialize_seconds': round(serialize_seconds, 4),
+            'render_seconds': round(render_seconds, 4),
+            'serialize_rows_per_sec': round(count / serialize_seconds, 1),
+            'render_rows_per_sec': round(count / render_seconds, 1),
+            'rows_per_sec': round(count / total, 1),
+        }
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products import catalog
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает каталог для чтения (CatalogEntry) с исходными таблицами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Пересобрать расходящиеся записи')
+
+    def handle(self, *args, **options):
+        report = catalog.check()
+        for problem, product_info_ids in report.items():
+            if product_info_ids:
+                self.stdout.write(f'{problem}: {len(product_info_ids)} ({", ".join(map(str, product_info_ids[:20]))})')
+        broken = [product_info_id for product_info_ids in report.values() for product_info_id in product_info_ids]
+        if not broken:
+            self.stdout.write('Каталог совпадает с исходными таблицами')
+            return
+        if not options['fix']:
+            raise CommandError(f'Расходится записей: {len(broken)}')
+        with transaction.atomic():
+            catalog.refresh(broken)
+        self.stdout.write(f'Пересобрано записей: {len(broken)}')
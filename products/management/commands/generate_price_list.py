@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from products.price_list import PRICE_LIST_FORMATS, dump_price_list
+from products.synthetic import generate_categories, generate_goods
+
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+
+def price_list_path(directory, size, file_format):
+    return os.path.join(directory, f'price_list_{size}.{file_format}')
+
+
+def write_price_list(path, size, file_format, shop_id=1, categories=50, seed=0):
+    """Записывает синтетический прайс-лист из size товаров в файл path."""
+    category_list = generate_categories(categories)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.writelines(dump_price_list(file_format, shop_id, category_list,
+                                        generate_goods(size, category_list, seed=seed)))
+    return path
+
+
+class Command(BaseCommand):
+    help = 'Создает синтетические прайс-листы в формате shop1.yaml для замеров загрузки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Количество товаров')
+        parser.add_argument('--file-format', choices=PRICE_LIST_FORMATS, default='yaml')
+        parser.add_argument('--categories', type=int, default=50, help='Количество категорий')
+        parser.add_argument('--shop', type=int, default=1, help='id магазина в разделе shop')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output-dir', default='bench_data')
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for size in options['sizes']:
+            path = price_list_path(options['output_dir'], size, options['file_format'])
+            write_price_list(path, size, options['file_format'], options['shop'], options['categories'],
+                             options['seed'])
+            self.stdout.write(f'{path}: {size} товаров, {os.path.getsize(path) / 1024 / 1024:.1f} МБ')
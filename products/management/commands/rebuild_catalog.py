@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products import catalog
+
+
+class Command(BaseCommand):
+    help = 'Заполняет каталог для чтения (CatalogEntry) заново по всем товарам'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = catalog.rebuild()
+        self.stdout.write(f'Каталог пересобран: {count} товаров')
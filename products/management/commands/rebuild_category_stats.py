@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products import category_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки по категориям (CategoryStats) по всем продуктам и товарам'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = category_stats.rebuild()
+        self.stdout.write(f'Сводки пересчитаны: {count} категорий')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products import facets
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает индекс фильтров по параметрам товаров с нуля'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = facets.rebuild()
+        self.stdout.write(f'Индекс пересчитан: {count} значений')
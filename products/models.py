@@ -1,8 +1,23 @@
+from django.conf import settings
 from django.db import models
 
 from customers_suppliers.models import Customer, Supplier
 
 
+PRICE_LIST_FORMAT_CHOICES = [
+    ('yaml', 'YAML'),
+    ('csv', 'CSV'),
+    ('jsonl', 'JSON Lines'),
+]
+
+IMPORT_JOB_STATUS_CHOICES = [
+    ('pending', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершена'),
+    ('failed', 'Ошибка'),
+]
+
+
 
 
 class Category(models.Model):
@@ -49,6 +64,14 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'price'], name='product_info_shop_price'),
+            models.Index(fields=['price', 'id'], name='product_info_price'),
+            models.Index(fields=['price', 'id'], condition=models.Q(quantity__gt=0),
+                         name='product_info_in_stock_price'),
+            models.Index(fields=['product', 'price', 'id'], condition=models.Q(quantity__gt=0),
+                         name='product_info_offer_price'),
+        ]
         
     def __str__(self):
         return f"{self.product.name}, Количество: {self.quantity} - {self.shop}"
@@ -83,4 +106,120 @@ class ProductParameter(models.Model):
     
     def __str__(self):
         return f"{self.product_info.model}. {self.parameter.name}"
-    
\ No newline at end of file
+
+
+class ParameterValueFacet(models.Model):
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='facets', on_delete=models.CASCADE)
+    parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='facets', on_delete=models.CASCADE)
+    value = models.CharField(verbose_name='Значение', max_length=100)
+    count = models.IntegerField(default=0, verbose_name='Количество товаров')
+
+    class Meta:
+        verbose_name = 'Значение фильтра'
+        verbose_name_plural = 'Индекс фильтров по параметрам'
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'parameter', 'value'], name='unique_parameter_value_facet'),
+        ]
+
+    def __str__(self):
+        return f"{self.parameter.name}: {self.value} ({self.count})"
+
+
+class CategoryStats(models.Model):
+    """Сводка по категории для меню; обновляется при изменении продуктов, товаров и магазинов категории."""
+    category = models.OneToOneField(Category, verbose_name='Категория', primary_key=True, related_name='stats',
+                                    on_delete=models.CASCADE)
+    product_count = models.PositiveIntegerField(default=0, verbose_name='Количество продуктов')
+    offer_count = models.PositiveIntegerField(default=0, verbose_name='Предложений в наличии')
+    min_price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Минимальная цена')
+    max_price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Максимальная цена')
+    shop_count = models.PositiveIntegerField(default=0, verbose_name='Количество магазинов')
+
+    class Meta:
+        verbose_name = 'Сводка по категории'
+        verbose_name_plural = 'Сводки по категориям'
+
+    def __str__(self):
+        return f"{self.category_id}: {self.product_count} продуктов, {self.offer_count} предложений"
+
+
+class CatalogEntry(models.Model):
+    """Карточка товара одной строкой: копия данных ProductInfo, Product, Category, Supplier и параметров."""
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='catalog_entry', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='+', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='+', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Supplier, verbose_name='Магазин', related_name='+', on_delete=models.CASCADE)
+    name = models.CharField(max_length=80, verbose_name='Наименование')
+    category_name = models.CharField(max_length=40, verbose_name='Название категории')
+    shop_name = models.CharField(max_length=250, verbose_name='Название магазина')
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    parameters = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+
+    class Meta:
+        verbose_name = 'Карточка каталога'
+        verbose_name_plural = 'Каталог для чтения'
+        indexes = [
+            models.Index(fields=['category', 'price'], name='catalog_entry_category_price'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.shop_name}"
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name='Пользователь', related_name='import_jobs',
+                             null=True, on_delete=models.SET_NULL)
+    shop = models.ForeignKey(Supplier, verbose_name='Магазин', related_name='import_jobs', null=True, blank=True,
+                             on_delete=models.CASCADE)
+    file = models.FileField(upload_to='imports/', verbose_name='Файл')
+    file_format = models.CharField(max_length=5, choices=PRICE_LIST_FORMAT_CHOICES, default='yaml',
+                                   verbose_name='Формат файла')
+    differential = models.BooleanField(default=False, verbose_name='Загружать только изменения')
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name='Хэш содержимого')
+    status = models.CharField(max_length=10, choices=IMPORT_JOB_STATUS_CHOICES, default='pending',
+                              verbose_name='Статус')
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+    result = models.JSONField(default=dict, blank=True, verbose_name='Итоги')
+    errors = models.JSONField(default=list, blank=True, verbose_name='Ошибки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало обработки')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Окончание обработки')
+
+    class Meta:
+        verbose_name = 'Загрузка прайс-листа'
+        verbose_name_plural = 'Загрузки прайс-листов'
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['shop', 'status', '-created_at'], name='import_job_shop_status'),
+        ]
+
+    def __str__(self):
+        return f"Загрузка {self.id} ({self.status})"
+
+    @property
+    def progress_key(self):
+        return f'import-job-progress:{self.id}'
+
+    @classmethod
+    def find_duplicate(cls, content_hash, file_format, shop, user):
+        """
+        Последняя успешная загрузка того же файла, если она же последняя
+        успешная для своего магазина и пользователь может загружать в него.
+
+        Магазин YAML указан в самом файле. Для CSV и JSON Lines магазин
+        передается в запросе, поэтому повтором считается только загрузка в
+        тот же магазин shop.
+        """
+        jobs = cls.objects.filter(content_hash=content_hash, file_format=file_format, status='done')
+        if file_format != 'yaml':
+            jobs = jobs.filter(shop=shop)
+        job = jobs.select_related('shop').first()
+        if not job or not (user.is_staff or job.shop.user_id == user.id):
+            return None
+        last_job = cls.objects.filter(shop_id=job.shop_id, status='done').only('id').first()
+        return job if last_job.id == job.id else None
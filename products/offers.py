@@ -0,0 +1,49 @@
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+
+from products.models import Product, ProductInfo
+
+
+def in_stock_offers():
+    return ProductInfo.objects.filter(quantity__gt=0)
+
+
+def products_with_offers():
+    """Продукты, у которых есть хотя бы одно предложение в наличии."""
+    return Product.objects.filter(Exists(in_stock_offers().filter(product=OuterRef('pk')))).order_by('id')
+
+
+def offer_stats(product_ids):
+    """
+    Сводка предложений в наличии по каждому продукту: число предложений,
+    минимальная, максимальная и медианная цена и самое дешевое предложение.
+
+    Предложения нумеруются оконной функцией по цене внутри продукта, из
+    базы читаются только строки с первым и средними номерами, поэтому
+    объем ответа не зависит от числа магазинов.
+    """
+    partition = {'partition_by': F('product_id')}
+    rows = in_stock_offers().filter(product_id__in=product_ids).annotate(
+        position=Window(RowNumber(), order_by=[F('price').asc(), F('id').asc()], **partition),
+        offers=Window(Count('id'), **partition),
+        min_price=Window(Min('price'), **partition),
+        max_price=Window(Max('price'), **partition),
+    ).filter(
+        Q(position=1) | Q(position=(F('offers') + 1) / 2) | Q(position=(F('offers') + 2) / 2)
+    ).values_list('product_id', 'position', 'offers', 'min_price', 'max_price', 'id', 'price', 'quantity', 'shop_id',
+                  'shop__name_organization', 'shop__user__username')
+
+    stats = {}
+    for (product_id, position, offers, min_price, max_price, product_info_id, price, quantity, shop_id,
+         name_organization, username) in rows:
+        product_stats = stats.setdefault(product_id, {
+            'offers': offers, 'min_price': min_price, 'max_price': max_price, 'median_price': 0, 'best_offer': None,
+        })
+        if position == 1:
+            product_stats['best_offer'] = {'id': product_info_id, 'price': price, 'quantity': quantity,
+                                           'shop': {'id': shop_id, 'name': name_organization or username}}
+        # при нечетном числе предложений средняя строка одна, при четном - две
+        middle = {(offers + 1) // 2, (offers + 2) // 2}
+        if position in middle:
+            product_stats['median_price'] += price / len(middle)
+    return stats
@@ -0,0 +1,32 @@
+from products.importer import ParallelImporter, ProductImporter
+from products.price_list import open_price_list
+from products.validation import known_category_ids, normalised_goods, validate_goods
+
+
+def import_price_list(open_file, get_shop, file_format='yaml', shop_id=None, differential=False, progress=None,
+                      workers=1, partition='category'):
+    """
+    Полный цикл загрузки прайс-листа: проверка файла, затем запись.
+
+    open_file открывает файл заново для каждого прохода, get_shop получает
+    id магазина из файла и возвращает магазин или выбрасывает исключение.
+    При workers больше 1 товары записываются параллельно, см.
+    ParallelImporter. Возвращает (магазин, отчет проверки, статистика загрузки или None,
+    если файл не прошел проверку).
+    """
+    with open_file() as file:
+        price_list = open_price_list(file, file_format, shop_id)
+        shop = get_shop(price_list.shop_id)
+        category_ids = known_category_ids(price_list.categories)
+        report = validate_goods(price_list.goods(), category_ids)
+    if not report.is_valid:
+        return shop, report, None
+
+    with open_file() as file:
+        price_list = open_price_list(file, file_format, shop_id)
+        if workers > 1:
+            importer = ParallelImporter(shop, workers, partition, progress=progress, differential=differential)
+        else:
+            importer = ProductImporter(shop, progress=progress, differential=differential)
+        stats = importer.run(normalised_goods(price_list.goods(), category_ids), price_list.categories)
+    return shop, report, stats
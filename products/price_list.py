@@ -0,0 +1,290 @@
+import csv
+import io
+import json
+import os
+
+import yaml
+from yaml.constructor import SafeConstructor
+from yaml.events import (
+    AliasEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+)
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+from yaml.resolver import Resolver
+
+try:
+    from yaml import CSafeDumper as SafeDumper, CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
+
+HEADER_KEYS = ('shop', 'categories')
+PRICE_LIST_FORMATS = ('yaml', 'csv', 'jsonl')
+FORMAT_EXTENSIONS = {
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+CSV_PARAMETER_PREFIX = 'param:'
+CSV_FIELDS = ['id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity', 'parameters']
+
+
+class DetachingTextIO(io.TextIOWrapper):
+    """Текстовая обертка над загруженным файлом, которая не закрывает сам файл."""
+
+    def close(self):
+        self.detach()
+
+
+def detect_format(file_name, file_format=None):
+    """Формат прайс-листа из явного параметра или по расширению файла."""
+    if file_format:
+        if file_format not in PRICE_LIST_FORMATS:
+            raise ValueError(f"Неизвестный формат файла: {file_format}.")
+        return file_format
+    return FORMAT_EXTENSIONS.get(os.path.splitext(file_name or '')[1].lower(), 'yaml')
+
+
+def open_price_list(stream, file_format='yaml', shop_id=None):
+    """Возвращает потоковый читатель прайс-листа нужного формата."""
+    if file_format == 'csv':
+        return CsvPriceList(stream, shop_id)
+    if file_format == 'jsonl':
+        return JsonLinesPriceList(stream, shop_id)
+    return YamlPriceList(stream)
+
+
+class YamlPriceList:
+    """
+    Потоковое чтение прайс-листа в формате shop1.yaml.
+
+    Разделы shop и categories читаются сразу, а товары из goods отдаются
+    по одному через goods(), поэтому файл не загружается в память целиком.
+    Если goods идет раньше shop или categories, файл читается дважды:
+    сначала заголовок с пропуском товаров, затем сами товары.
+    Если доступен libyaml, разбор событий выполняет C-парсер.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._events = yaml.parse(stream, Loader=SafeLoader)
+        self._resolver = Resolver()
+        self._constructor = SafeConstructor()
+        self._anchors = {}
+        self._header = {}
+        self._has_goods = self._read_header()
+
+    @property
+    def shop_id(self):
+        return (self._header.get('shop') or [{}])[0].get('id')
+
+    @property
+    def categories(self):
+        return self._header.get('categories') or []
+
+    def goods(self):
+        if not self._has_goods:
+            return
+        for event in self._events:
+            if isinstance(event, SequenceEndEvent):
+                break
+            yield self._construct(event)
+
+    def _read_header(self):
+        goods_found = False
+        self._skip_to_root()
+        for event in self._events:
+            if isinstance(event, MappingEndEvent):
+                break
+            key = self._construct(event)
+            if key != 'goods':
+                self._header[key] = self._construct(next(self._events))
+                continue
+            value_event = next(self._events)
+            if not isinstance(value_event, SequenceStartEvent):
+                self._construct(value_event)
+                continue
+            if all(header_key in self._header for header_key in HEADER_KEYS):
+                return True
+            goods_found = True
+            self._skip(value_event)
+
+        if goods_found:
+            self._rewind_to_goods()
+        return goods_found
+
+    def _rewind_to_goods(self):
+        if not self._stream.seekable():
+            raise ValueError("Разделы shop и categories должны идти перед goods.")
+        self._stream.seek(0)
+        self._events = yaml.parse(self._stream, Loader=SafeLoader)
+        self._skip_to_root()
+        for event in self._events:
+            value_event = next(self._events)
+            if self._construct(event) == 'goods' and isinstance(value_event, SequenceStartEvent):
+                return
+            self._skip(value_event)
+
+    def _skip_to_root(self):
+        for event in self._events:
+            if isinstance(event, MappingStartEvent):
+                return
+
+    def _skip(self, event):
+        depth = 1 if isinstance(event, (SequenceStartEvent, MappingStartEvent)) else 0
+        while depth:
+            event = next(self._events)
+            if isinstance(event, (SequenceStartEvent, MappingStartEvent)):
+                depth += 1
+            elif isinstance(event, (SequenceEndEvent, MappingEndEvent)):
+                depth -= 1
+
+    def _construct(self, event):
+        return self._constructor.construct_document(self._compose(event))
+
+    def _compose(self, event):
+        if isinstance(event, AliasEvent):
+            return self._anchors[event.anchor]
+
+        if isinstance(event, ScalarEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self._resolver.resolve(ScalarNode, event.value, event.implicit)
+            node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        elif isinstance(event, SequenceStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self._resolver.resolve(SequenceNode, None, event.implicit)
+            node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            for item_event in self._events:
+                if isinstance(item_event, SequenceEndEvent):
+                    break
+                node.value.append(self._compose(item_event))
+        elif isinstance(event, MappingStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self._resolver.resolve(MappingNode, None, event.implicit)
+            node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            for key_event in self._events:
+                if isinstance(key_event, MappingEndEvent):
+                    break
+                node.value.append((self._compose(key_event), self._compose(next(self._events))))
+        else:
+            raise ValueError(f"Неожиданная структура YAML: {event}")
+
+        if event.anchor:
+            self._anchors[event.anchor] = node
+        return node
+
+
+class CsvPriceList:
+    """
+    Потоковое чтение прайс-листа в CSV.
+
+    Колонки совпадают с полями goods из shop1.yaml. Параметры передаются
+    JSON-объектом в колонке parameters или отдельными колонками вида
+    "param:Цвет". Магазин указывается при загрузке, категории должны уже
+    существовать.
+    """
+
+    def __init__(self, stream, shop_id=None):
+        self.shop_id = shop_id
+        self.categories = []
+        self._text = DetachingTextIO(stream, encoding='utf-8-sig', newline='')
+
+    def goods(self):
+        for row in csv.DictReader(self._text):
+            parameters = json.loads(row.pop('parameters', None) or '{}')
+            for column in [column for column in row if column and column.startswith(CSV_PARAMETER_PREFIX)]:
+                value = row.pop(column)
+                if value:
+                    parameters[column[len(CSV_PARAMETER_PREFIX):]] = value
+            row['parameters'] = parameters
+            yield row
+
+
+class JsonLinesPriceList:
+    """
+    Потоковое чтение прайс-листа в JSON Lines: одна строка - один товар.
+
+    В начале файла могут идти строки {"shop": ...} и {"categories": [...]}
+    в том же виде, что и разделы shop1.yaml.
+    """
+
+    def __init__(self, stream, shop_id=None):
+        self._shop_id = shop_id
+        self._header = {}
+        self._first_good = None
+        self._lines = (line for line in DetachingTextIO(stream, encoding='utf-8-sig') if line.strip())
+        self._read_header()
+
+    @property
+    def shop_id(self):
+        shop = self._header.get('shop')
+        if isinstance(shop, list):
+            shop = (shop or [{}])[0].get('id')
+        return shop or self._shop_id
+
+    @property
+    def categories(self):
+        return self._header.get('categories') or []
+
+    def goods(self):
+        if self._first_good is not None:
+            yield self._first_good
+        for line in self._lines:
+            yield json.loads(line)
+
+    def _read_header(self):
+        for line in self._lines:
+            record = json.loads(line)
+            if isinstance(record, dict) and set(record) and set(record) <= set(HEADER_KEYS):
+                self._header.update(record)
+                continue
+            self._first_good = record
+            return
+
+
+def dump_yaml(shop_id, categories, goods):
+    """Прайс-лист в формате shop1.yaml частями по одному товару."""
+    yield yaml.dump({'shop': [{'id': shop_id}], 'categories': list(categories)}, Dumper=SafeDumper,
+                    allow_unicode=True, sort_keys=False)
+    yield 'goods:\n'
+    for good in goods:
+        yield yaml.dump([good], Dumper=SafeDumper, allow_unicode=True, sort_keys=False)
+
+
+def dump_csv(goods):
+    """Прайс-лист в CSV частями по одной строке."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for good in goods:
+        writer.writerow([good.get(field) for field in CSV_FIELDS[:-1]]
+                        + [json.dumps(good.get('parameters') or {}, ensure_ascii=False)])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def dump_jsonl(shop_id, categories, goods):
+    """Прайс-лист в JSON Lines частями по одной строке."""
+    yield json.dumps({'shop': [{'id': shop_id}]}) + '\n'
+    yield json.dumps({'categories': list(categories)}, ensure_ascii=False) + '\n'
+    for good in goods:
+        yield json.dumps(good, ensure_ascii=False) + '\n'
+
+
+def dump_price_list(file_format, shop_id, categories, goods):
+    if file_format == 'csv':
+        return dump_csv(goods)
+    if file_format == 'jsonl':
+        return dump_jsonl(shop_id, categories, goods)
+    return dump_yaml(shop_id, categories, goods)
@@ -0,0 +1,268 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+from collections import defaultdict
+
+from django.core import checks
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, Case, F, FloatField, Func, IntegerField, Q, TextField, Value, When
+from django.db.models.functions import Greatest
+
+from products.caching import local_cache_backend
+from products.models import Product, ProductInfo
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULTS_LIMIT = 1000
+TRIGRAM_THRESHOLD = 0.3
+INDEX_VERSION_KEY = 'product-search-index-version'
+
+# Разделители в model вида apple/iphone/xr заменяются пробелами, иначе парсер
+# PostgreSQL считает такую строку одним словом. Выражения совпадают с индексами ниже.
+MODEL_DOCUMENT = "translate(%s, '/-_.', '    ')"
+
+POSTGRES_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX IF NOT EXISTS product_name_fts ON products_product "
+    "USING gin (to_tsvector('simple', name))",
+    'CREATE INDEX IF NOT EXISTS product_name_trgm ON products_product USING gin (name gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS product_info_model_fts ON products_productinfo "
+    f"USING gin (to_tsvector('simple', {MODEL_DOCUMENT % 'model'}))",
+    'CREATE INDEX IF NOT EXISTS product_info_model_trgm ON products_productinfo USING gin (model gin_trgm_ops)',
+]
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class SqlTemplate(Func):
+    """Выражение, в шаблон которого аргументы подставляются по порядку через %s."""
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        return self.template % tuple(parts), params
+
+
+class FullTextMatch(SqlTemplate):
+    template = "to_tsvector('simple', %s) @@ to_tsquery('simple', %s)"
+    output_field = BooleanField()
+
+
+class FullTextRank(SqlTemplate):
+    template = "ts_rank(to_tsvector('simple', %s), to_tsquery('simple', %s))"
+    output_field = FloatField()
+
+
+class TrigramMatch(SqlTemplate):
+    template = '%s %%%% %s'
+    output_field = BooleanField()
+
+
+class TrigramSimilarity(SqlTemplate):
+    template = 'similarity(%s, %s)'
+    output_field = FloatField()
+
+
+class ModelDocument(SqlTemplate):
+    template = MODEL_DOCUMENT
+    output_field = TextField()
+
+
+def prefix_query(terms):
+    """Запрос to_tsquery, где каждое слово может быть началом слова в тексте: iphone:* & 256:*."""
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def search_product_infos(queryset, query, using=DEFAULT_DB_ALIAS):
+    """
+    Товары из queryset, подходящие под текстовый запрос, по убыванию
+    релевантности.
+
+    Ищутся совпадения всех слов запроса в названии продукта или в модели,
+    а также похожие по триграммам названия и модели (опечатки). На
+    PostgreSQL используются индексы из POSTGRES_INDEXES, на других базах -
+    индекс в памяти процесса. Кандидаты ограничены SEARCH_RESULTS_LIMIT.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    if connections[using].vendor == 'postgresql':
+        return _postgres_search(queryset, query, terms)
+    ranked = get_index().search(terms, SEARCH_RESULTS_LIMIT)
+    if not ranked:
+        return queryset.none()
+    return queryset.filter(id__in=ranked).order_by(
+        Case(*[When(id=product_info_id, then=Value(position)) for position, product_info_id in enumerate(ranked)],
+             output_field=IntegerField()),
+        'id',
+    )
+
+
+def _postgres_search(queryset, query, terms):
+    tsquery = Value(prefix_query(terms))
+    text = Value(query.lower())
+
+    def rank(field):
+        return FullTextRank(field, tsquery) + TrigramSimilarity(field, text)
+
+    def match(field):
+        return Q(FullTextMatch(field, tsquery)) | Q(TrigramMatch(field, text))
+
+    model_document = ModelDocument(F('model'))
+    product_ids = list(Product.objects.filter(match(F('name'))).annotate(rank=rank(F('name'))).order_by(
+        '-rank').values_list('id', flat=True)[:SEARCH_RESULTS_LIMIT])
+    product_info_ids = list(ProductInfo.objects.filter(
+        Q(FullTextMatch(model_document, tsquery)) | Q(TrigramMatch(F('model'), text))
+    ).annotate(rank=FullTextRank(model_document, tsquery) + TrigramSimilarity(F('model'), text)).order_by(
+        '-rank').values_list('id', flat=True)[:SEARCH_RESULTS_LIMIT])
+
+    return queryset.filter(Q(product_id__in=product_ids) | Q(id__in=product_info_ids)).annotate(
+        search_rank=Greatest(rank(F('product__name')),
+                             FullTextRank(model_document, tsquery) + TrigramSimilarity(F('model'), text)),
+    ).order_by('-search_rank', 'id')
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Индекс в памяти для баз без полнотекстового поиска.
+
+    Слова названий продуктов и моделей хранятся в отсортированном списке
+    для поиска по началу слова, для слов без совпадений подбираются
+    похожие по триграммам.
+    """
+
+    def __init__(self, rows):
+        postings = defaultdict(set)
+        for product_info_id, name, model in rows:
+            for token in set(tokenize(name)) | set(tokenize(model)):
+                postings[token].add(product_info_id)
+        self.postings = dict(postings)
+        self.tokens = sorted(self.postings)
+        self.trigram_tokens = defaultdict(set)
+        for token in self.tokens:
+            for trigram in trigrams(token):
+                self.trigram_tokens[trigram].add(token)
+
+    @classmethod
+    def build(cls):
+        return cls(ProductInfo.objects.values_list('id', 'product__name', 'model').iterator(chunk_size=10000))
+
+    def term_tokens(self, term):
+        """Слова индекса для слова запроса с весами: 1 - то же слово, 0.8 - начало слова, иначе сходство."""
+        tokens = {}
+        position = bisect.bisect_left(self.tokens, term)
+        while position < len(self.tokens) and self.tokens[position].startswith(term):
+            tokens[self.tokens[position]] = 1.0 if self.tokens[position] == term else 0.8
+            position += 1
+        if tokens:
+            return tokens
+
+        term_trigrams = trigrams(term)
+        candidates = set().union(*(self.trigram_tokens.get(trigram, ()) for trigram in term_trigrams))
+        for token in candidates:
+            token_trigrams = trigrams(token)
+            similarity = len(term_trigrams & token_trigrams) / len(term_trigrams | token_trigrams)
+            if similarity >= TRIGRAM_THRESHOLD:
+                tokens[token] = similarity * 0.6
+        return tokens
+
+    def search(self, terms, limit=SEARCH_RESULTS_LIMIT):
+        """
+        id товаров, в которых найдены все слова, по убыванию суммарной оценки.
+
+        Сначала пересекаются множества товаров для каждого слова, начиная с
+        самого короткого, и только оставшиеся товары получают оценку.
+        """
+        matches = []
+        for term in terms:
+            tokens = self.term_tokens(term)
+            if not tokens:
+                return []
+            matches.append((tokens, set().union(*(self.postings[token] for token in tokens))))
+        matches.sort(key=lambda match: len(match[1]))
+
+        candidates = matches[0][1]
+        for _, product_info_ids in matches[1:]:
+            candidates = candidates & product_info_ids
+            if not candidates:
+                return []
+
+        total = dict.fromkeys(candidates, 0.0)
+        for tokens, _ in matches:
+            if len(set(tokens.values())) == 1:
+                # одинаковая оценка у всех кандидатов не меняет порядок
+                continue
+            best = {}
+            for token, weight in sorted(tokens.items(), key=lambda item: item[1]):
+                best.update(dict.fromkeys(self.postings[token] & candidates, weight))
+            for product_info_id, weight in best.items():
+                total[product_info_id] += weight
+        return heapq.nsmallest(limit, total, key=lambda product_info_id: (-total[product_info_id], product_info_id))
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+@checks.register(checks.Tags.caches)
+def check_search_index_version(app_configs, **kwargs):
+    backend = local_cache_backend()
+    if backend and connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+        return [checks.Warning(
+            f'Поиск идет по индексу в памяти процесса, а его версия хранится в кэше {backend}: '
+            f'другие процессы не узнают об изменении товаров и ищут по старому индексу.',
+            hint='Задайте REDIS_CACHE_URL или запускайте один процесс.',
+            id='products.W001',
+        )]
+    return []
+
+
+def get_index_version():
+    return cache.get_or_set(INDEX_VERSION_KEY, 1, None)
+
+
+def invalidate():
+    """Помечает индексы в памяти всех процессов устаревшими."""
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, 2, None)
+
+
+def get_index():
+    global _index, _index_version
+    version = get_index_version()
+    with _index_lock:
+        if _index is None or _index_version != version:
+            _index = SearchIndex.build()
+            _index_version = version
+        return _index
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создает индексы полнотекстового и триграммного поиска после migrate на PostgreSQL."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_INDEXES:
+            try:
+                cursor.execute(statement)
+            except Exception as e:
+                logger.warning(f'Не удалось выполнить {statement}: {e}')
+                return
@@ -1,46 +1,178 @@
+from django.conf import settings
 from rest_framework import serializers
+from customers_suppliers.mixins import DynamicFieldsMixin
+from customers_suppliers.models import Supplier
 from customers_suppliers.validators import CustomValidators
-from .models import Category, Product, ProductInfo, Parameter, ProductParameter
-import logging
+from products import offers
+from .models import CatalogEntry, Category, ImportJob, Product, ProductInfo, Parameter, ProductParameter
 
 
-logging.basicConfig(level=logging.INFO)
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logging.basicConfig(filename='log.txt')
-
-
-
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name',]
         
 
-class ProductSerializer(serializers.ModelSerializer):
+class CategoryWithStatsSerializer(CategorySerializer):
+    """Категория со сводкой из CategoryStats для меню каталога."""
+    product_count = serializers.IntegerField(source='stats.product_count', read_only=True)
+    offer_count = serializers.IntegerField(source='stats.offer_count', read_only=True)
+    min_price = serializers.IntegerField(source='stats.min_price', read_only=True)
+    max_price = serializers.IntegerField(source='stats.max_price', read_only=True)
+    shop_count = serializers.IntegerField(source='stats.shop_count', read_only=True)
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['product_count', 'offer_count', 'min_price', 'max_price',
+                                                   'shop_count']
+
+
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'category']
+        expandable_fields = {'category': (CategorySerializer, {})}
         
 
-class ProductInfoSerializer(serializers.ModelSerializer):
+class ProductInfoSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductInfo
         fields = ['id', 'model', 'external_id', 'product', 'shop', 'quantity', 'price', 'price_rrc']
+        expandable_fields = {
+            'product': (ProductSerializer, {}),
+            'shop': ('products.serializers.ProductCardShopSerializer', {}),
+        }
         
 
-class ProductInfoCreateSerializer(serializers.ModelSerializer):
+class ProductInfoBatchSerializer(serializers.Serializer):
+    """Список id для пакетного чтения товаров; повторы убираются с сохранением порядка."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.PRODUCT_INFO_BATCH_MAX:
+            raise serializers.ValidationError(f'Не больше {settings.PRODUCT_INFO_BATCH_MAX} id в одном запросе.')
+        return ids
+
+
+class ProductInfoCreateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductInfo
         fields = ['id', 'model', 'external_id', 'product', 'quantity', 'price', 'price_rrc']
+        expandable_fields = {'product': (ProductSerializer, {})}
     
          
-class ParameterSerializer(serializers.ModelSerializer):
+class ParameterSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Parameter
         fields = ['id', 'name']        
 
 
-class ProductParameterSerializer(serializers.ModelSerializer):
+class ProductParameterSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductParameter
-        fields = ['id', 'product_info', 'parameter', 'value']
\ No newline at end of file
+        fields = ['id', 'product_info', 'parameter', 'value']
+        expandable_fields = {
+            'product_info': (ProductInfoSerializer, {}),
+            'parameter': (ParameterSerializer, {}),
+        }
+
+
+class ProductCardShopSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Supplier
+        fields = ['id', 'name']
+
+    def get_name(self, obj):
+        return obj.name_organization or obj.user.username
+
+
+class ProductCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Товар магазина для витрины: продукт, категория, магазин и параметры в одном ответе."""
+    name = serializers.CharField(source='product.name', read_only=True)
+    category = CategorySerializer(source='product.category', read_only=True)
+    shop = ProductCardShopSerializer(read_only=True)
+    parameters = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductInfo
+        fields = ['id', 'product', 'name', 'model', 'external_id', 'category', 'shop', 'quantity', 'price',
+                  'price_rrc', 'parameters']
+        read_only_fields = fields
+
+    def get_parameters(self, obj):
+        return {product_parameter.parameter.name: product_parameter.value
+                for product_parameter in obj.product_parameters.all()}
+
+
+class CatalogEntrySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Карточка товара из CatalogEntry в том же виде, что и ProductCardSerializer, без JOIN."""
+    id = serializers.IntegerField(source='product_info_id', read_only=True)
+    product = serializers.IntegerField(source='product_id', read_only=True)
+    category = serializers.SerializerMethodField()
+    shop = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CatalogEntry
+        fields = ProductCardSerializer.Meta.fields
+        read_only_fields = fields
+
+    def get_category(self, obj):
+        return {'id': obj.category_id, 'name': obj.category_name}
+
+    def get_shop(self, obj):
+        return {'id': obj.shop_id, 'name': obj.shop_name}
+
+
+class BestOfferShopSerializer(DynamicFieldsMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class BestOfferItemSerializer(DynamicFieldsMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    price = serializers.IntegerField()
+    quantity = serializers.IntegerField()
+    shop = BestOfferShopSerializer()
+
+
+class BestOfferListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        products = list(data)
+        self.child.offer_stats = offers.offer_stats([product.id for product in products])
+        return super().to_representation(products)
+
+
+class BestOfferSerializer(DynamicFieldsMixin, serializers.Serializer):
+    """Сводка цен продукта по магазинам; для списка считается одним запросом на страницу."""
+    product = serializers.IntegerField(source='product.id')
+    name = serializers.CharField(source='product.name')
+    category = serializers.IntegerField(source='product.category_id')
+    offers = serializers.IntegerField()
+    min_price = serializers.IntegerField()
+    max_price = serializers.IntegerField()
+    median_price = serializers.FloatField()
+    best_offer = BestOfferItemSerializer()
+
+    class Meta:
+        list_serializer_class = BestOfferListSerializer
+
+    def to_representation(self, instance):
+        stats = getattr(self, 'offer_stats', None)
+        if stats is None:
+            stats = offers.offer_stats([instance.id])
+        return super().to_representation(dict(stats[instance.id], product=instance))
+
+
+class ImportJobSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    rows_per_sec = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'status', 'shop', 'file_format', 'differential', 'rows_processed', 'rows_per_sec', 'errors', 'result',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_rows_per_sec(self, obj):
+        return obj.result.get('rows_per_sec', 0)
@@ -0,0 +1,249 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from customers_suppliers.models import Supplier
+from products import caching, catalog, category_stats, facets, search
+from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+
+
+# Отправляется импортером после записи прайс-листа: shop, stats.
+# bulk_create и bulk_update не вызывают post_save, поэтому зависящие от
+# товаров данные обновляются по этому сигналу.
+price_list_imported = Signal()
+
+
+@contextmanager
+def deleting_goods(product_infos):
+    """
+    Удаление с каскадом на товары product_infos (queryset): индекс фасетов
+    уменьшается одним запросом заранее, каталог и сводки категорий
+    пересчитываются один раз при выходе, а не на каждую удаленную строку.
+    """
+    with transaction.atomic(), facets.deferred(track_signals=False), catalog.deferred(), \
+            category_stats.deferred():
+        facets.record_deleted(product_infos)
+        yield
+
+
+@receiver(pre_save, sender=ProductParameter)
+def remember_product_parameter(sender, instance, **kwargs):
+    instance._facet_previous = None
+    if instance.pk and facets.signals_enabled():
+        instance._facet_previous = ProductParameter.objects.filter(pk=instance.pk).values_list(
+            'product_info__product__category_id', 'parameter_id', 'value').first()
+
+
+@receiver(post_save, sender=ProductParameter)
+def update_facets_on_save(sender, instance, created, **kwargs):
+    if not facets.signals_enabled():
+        return
+    current = (facets.product_info_categories([instance.product_info_id]).get(instance.product_info_id),
+               instance.parameter_id, instance.value)
+    previous = getattr(instance, '_facet_previous', None)
+    if previous == current:
+        return
+    if previous:
+        facets.record(*previous, -1)
+    facets.record(*current, 1)
+
+
+@receiver(post_delete, sender=ProductParameter)
+def update_facets_on_delete(sender, instance, **kwargs):
+    if not facets.signals_enabled():
+        return
+    category_id = facets.product_info_categories([instance.product_info_id]).get(instance.product_info_id)
+    if category_id is not None:
+        facets.record(category_id, instance.parameter_id, instance.value, -1)
+
+
+@receiver(pre_save, sender=ProductInfo)
+def remember_product_info_category(sender, instance, **kwargs):
+    instance._facet_category_id = None
+    if instance.pk and facets.signals_enabled():
+        instance._facet_category_id = facets.product_info_categories([instance.pk]).get(instance.pk)
+
+
+@receiver(post_save, sender=ProductInfo)
+def move_facets_on_category_change(sender, instance, created, **kwargs):
+    """Переносит параметры товара в индексе, если у него сменился продукт другой категории."""
+    previous = getattr(instance, '_facet_category_id', None)
+    if created or previous is None or not facets.signals_enabled():
+        return
+    current = facets.product_info_categories([instance.pk]).get(instance.pk)
+    if current == previous:
+        return
+    with facets.deferred():
+        for parameter_id, value in instance.product_parameters.values_list('parameter_id', 'value'):
+            facets.record(previous, parameter_id, value, -1)
+            facets.record(current, parameter_id, value, 1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductInfo)
+@receiver(post_delete, sender=ProductInfo)
+@receiver(price_list_imported)
+def invalidate_search_index(sender, **kwargs):
+    search.invalidate()
+
+
+@receiver(post_save, sender=ProductInfo)
+def refresh_catalog_entry(sender, instance, **kwargs):
+    catalog.mark([instance.pk])
+
+
+@receiver(post_save, sender=ProductParameter)
+def refresh_catalog_parameters(sender, instance, **kwargs):
+    catalog.mark([instance.product_info_id])
+
+
+@receiver(post_delete, sender=ProductParameter)
+def refresh_catalog_on_parameter_delete(sender, instance, origin=None, **kwargs):
+    # при удалении самого товара запись каталога удаляется каскадом, а пересборка
+    # до удаления ProductInfo вернула бы ее обратно
+    if isinstance(origin, (ProductParameter, Parameter)) or getattr(origin, 'model', None) in (ProductParameter,
+                                                                                                Parameter):
+        catalog.mark([instance.product_info_id])
+
+
+@receiver(post_save, sender=Product)
+def refresh_catalog_product(sender, instance, created, **kwargs):
+    if not created:
+        catalog.mark(ProductInfo.objects.filter(product=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Parameter)
+def refresh_catalog_parameter_name(sender, instance, created, **kwargs):
+    if not created:
+        catalog.mark(ProductParameter.objects.filter(parameter=instance).values_list('product_info_id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def refresh_catalog_category_name(sender, instance, created, **kwargs):
+    if not created:
+        catalog.update_category_name(instance)
+
+
+@receiver(post_save, sender=Supplier)
+def refresh_catalog_shop_name(sender, instance, created, **kwargs):
+    if not created:
+        catalog.update_shop_name(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_catalog_username(sender, instance, created, update_fields=None, **kwargs):
+    """Название магазина без name_organization - имя пользователя поставщика."""
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    for shop in Supplier.objects.filter(Q(name_organization='') | Q(name_organization__isnull=True), user=instance):
+        shop.user = instance
+        catalog.update_shop_name(shop)
+
+
+def is_category_deletion(origin):
+    """Сводка удаляемой категории удалится каскадом, пересчет ее бы вернул."""
+    return isinstance(origin, Category) or getattr(origin, 'model', None) is Category
+
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, **kwargs):
+    if created:
+        category_stats.mark([instance.id])
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_stats_category(sender, instance, **kwargs):
+    instance._stats_category_id = None
+    if instance.pk:
+        instance._stats_category_id = Product.objects.filter(pk=instance.pk).values_list(
+            'category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def refresh_category_stats_on_product_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_stats_category_id', None)
+    if created:
+        category_stats.count_product(instance.category_id, 1)
+    elif previous != instance.category_id:
+        # вместе с продуктом переходят его предложения, обе категории пересчитываются
+        category_stats.mark({instance.category_id, previous})
+
+
+@receiver(post_delete, sender=Product)
+def refresh_category_stats_on_product_delete(sender, instance, origin=None, **kwargs):
+    if not is_category_deletion(origin):
+        category_stats.count_product(instance.category_id, -1)
+
+
+@receiver(pre_save, sender=ProductInfo)
+def remember_product_info_offer(sender, instance, **kwargs):
+    instance._stats_offer = None
+    if instance.pk:
+        instance._stats_offer = ProductInfo.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'quantity', 'price').first()
+
+
+@receiver(post_save, sender=ProductInfo)
+def refresh_category_stats_on_product_info_save(sender, instance, **kwargs):
+    category_stats.change_offer(getattr(instance, '_stats_offer', None),
+                                (instance.product_id, instance.quantity, instance.price))
+
+
+@receiver(post_delete, sender=ProductInfo)
+def refresh_category_stats_on_product_info_delete(sender, instance, origin=None, **kwargs):
+    if not is_category_deletion(origin):
+        category_stats.change_offer((instance.product_id, instance.quantity, instance.price), None)
+
+
+@receiver(m2m_changed, sender=Category.shops.through)
+def refresh_category_stats_on_shops_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._stats_category_ids = list(instance.categories.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        # в post_add pk_set содержит только действительно добавленные связи
+        if not reverse:
+            if action == 'post_add':
+                category_stats.count_shops([instance.pk], len(pk_set))
+            else:
+                category_stats.recount_shops([instance.pk])
+        elif action == 'post_add':
+            category_stats.count_shops(pk_set, 1)
+        elif action == 'post_clear':
+            category_stats.recount_shops(getattr(instance, '_stats_category_ids', []))
+        else:
+            category_stats.recount_shops(pk_set)
+
+
+@receiver(pre_delete, sender=Supplier)
+def remember_supplier_categories(sender, instance, **kwargs):
+    # связи магазина с категориями удаляются каскадом без m2m_changed
+    instance._stats_category_ids = list(instance.categories.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Supplier)
+def refresh_category_stats_on_supplier_delete(sender, instance, **kwargs):
+    category_stats.recount_shops(getattr(instance, '_stats_category_ids', []))
+
+
+CACHED_MODELS = (Category, Product, ProductInfo, Parameter, ProductParameter, Supplier)
+
+
+def bump_response_cache(sender, **kwargs):
+    caching.bump_version(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(bump_response_cache, sender=model, dispatch_uid=f'bump_response_cache_save_{model.__name__}')
+    post_delete.connect(bump_response_cache, sender=model, dispatch_uid=f'bump_response_cache_delete_{model.__name__}')
+
+
+@receiver(price_list_imported)
+def bump_response_cache_on_import(sender, **kwargs):
+    """Импорт пишет bulk-операциями без post_save, поэтому сбрасываются все ответы каталога."""
+    for model in CACHED_MODELS:
+        caching.bump_version(model)
@@ -0,0 +1,74 @@
+import random
+from itertools import accumulate
+
+
+SYNTHETIC_CATEGORIES = [
+    {'id': 224, 'name': 'Смартфоны'},
+    {'id': 15, 'name': 'Аксессуары'},
+    {'id': 1, 'name': 'Flash-накопители'},
+    {'id': 5, 'name': 'Телевизоры'},
+]
+
+SYNTHETIC_PARAMETERS = {
+    'Диагональ (дюйм)': [5.5, 6.1, 6.5, 32, 43, 55],
+    'Разрешение (пикс)': ['1792x828', '2688x1242', '1920x1080', '3840x2160'],
+    'Встроенная память (Гб)': [32, 64, 128, 256, 512],
+    'Цвет': ['черный', 'белый', 'красный', 'синий', 'золотистый'],
+    'Объем (Гб)': [16, 32, 64, 128],
+    'Интерфейс': ['USB 2.0', 'USB 3.0', 'USB-C'],
+    'Вес (г)': [150, 180, 200, 5000, 12000],
+    'Гарантия (мес)': [6, 12, 24],
+}
+
+SYNTHETIC_CATEGORY_NAMES = ['Смартфоны', 'Аксессуары', 'Flash-накопители', 'Телевизоры', 'Ноутбуки',
+                            'Планшеты', 'Наушники', 'Мониторы', 'Фотоаппараты', 'Колонки']
+
+SYNTHETIC_BRANDS = ['Apple', 'Samsung', 'Xiaomi', 'Sony', 'LG', 'Kingston']
+
+EXTRA_PARAMETERS = 24
+
+
+def generate_categories(count, first_id=1):
+    """Синтетический раздел categories из count категорий."""
+    return [
+        {'id': first_id + number,
+         'name': f'{SYNTHETIC_CATEGORY_NAMES[number % len(SYNTHETIC_CATEGORY_NAMES)]} {number // 10 + 1}'}
+        for number in range(count)
+    ]
+
+
+def generate_goods(count, categories=SYNTHETIC_CATEGORIES, seed=0, first_id=1):
+    """
+    Синтетические товары в формате goods из shop1.yaml.
+
+    Товары распределены по категориям неравномерно (несколько крупных
+    категорий и длинный хвост), у каждой категории свой набор из 6-10
+    параметров, у товара заполнено от 3 параметров до всего набора.
+    """
+    rnd = random.Random(seed)
+    parameter_values = dict(SYNTHETIC_PARAMETERS)
+    for number in range(EXTRA_PARAMETERS):
+        parameter_values[f'Характеристика {number + 1}'] = [f'вариант {value}' for value in range(1, 8)]
+    parameter_names = list(parameter_values)
+
+    category_ids = [category['id'] for category in categories]
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(category_ids) + 1)))
+    category_parameters = {category_id: rnd.sample(parameter_names, rnd.randint(6, 10))
+                           for category_id in category_ids}
+
+    for number in range(count):
+        category_id = rnd.choices(category_ids, cum_weights=cum_weights)[0]
+        names = category_parameters[category_id]
+        brand = rnd.choice(SYNTHETIC_BRANDS)
+        price = rnd.randrange(500, 150000, 10)
+        yield {
+            'id': first_id + number,
+            'category': category_id,
+            'model': f'{brand.lower()}/model-{number % 5000}',
+            'name': f'{brand} модель {number % 20000}',
+            'price': price,
+            'price_rrc': price + price // 10,
+            'quantity': rnd.randint(0, 50),
+            'parameters': {name: rnd.choice(parameter_values[name])
+                           for name in rnd.sample(names, rnd.randint(3, len(names)))},
+        }
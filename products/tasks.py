@@ -1,9 +1,75 @@
+import logging
+
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from easy_thumbnails.files import get_thumbnailer
 
+from customers_suppliers.models import Supplier
+from products.models import ImportJob
+from products.pipeline import import_price_list
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_PROGRESS_TIMEOUT = 60 * 60
+
+
 @shared_task
 def create_thumbnail(image_path):
     thumbnail_options = {'size': (100, 100), 'crop': True}
     thumbnailer = get_thumbnailer(image_path)
     thumbnail = thumbnailer.get_thumbnail(thumbnail_options)
-    return thumbnail.url
\ No newline at end of file
+    return thumbnail.url
+
+
+def get_import_shop(job, shop_id):
+    shop = Supplier.objects.filter(id=shop_id).first()
+    if not shop:
+        raise ValueError(f"Shop id {shop_id} не найден.")
+    if not job.user.is_staff and shop.user_id != job.user_id:
+        raise ValueError("Нет прав для доступа к этому магазину.")
+    return shop
+
+
+@shared_task
+def run_import_job(job_id):
+    job = ImportJob.objects.select_related('user').get(id=job_id)
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    def report_progress(stats):
+        cache.set(job.progress_key, stats.as_dict(), IMPORT_PROGRESS_TIMEOUT)
+
+    try:
+        job.shop, report, stats = import_price_list(
+            lambda: job.file.open('rb'),
+            lambda shop_id: get_import_shop(job, shop_id),
+            file_format=job.file_format,
+            shop_id=job.shop_id,
+            differential=job.differential,
+            progress=report_progress,
+            workers=settings.PRICE_LIST_IMPORT_WORKERS,
+            partition=settings.PRICE_LIST_IMPORT_PARTITION,
+        )
+    except Exception as e:
+        logger.error(f'Загрузка {job.id} завершилась ошибкой: {e}')
+        job.status = 'failed'
+        job.errors = [{'error': str(e)}]
+    else:
+        if stats:
+            job.status = 'done'
+            job.rows_processed = stats.rows
+            job.result = stats.as_dict()
+        else:
+            logger.info(f'Загрузка {job.id} не прошла проверку: {report.error_count} ошибок')
+            job.status = 'failed'
+            job.errors = report.errors
+            job.result = {'rows': report.rows, 'error_count': report.error_count}
+
+    job.finished_at = timezone.now()
+    job.save()
+    cache.delete(job.progress_key)
+    return job.status
@@ -1,10 +1,46 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import statistics
+import tempfile
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from decimal import Decimal
 
+import yaml
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.db.models import F, Value
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from django.urls import reverse
+from Orders.log import QueueFileHandler, SamplingFilter, stop_handlers
 from customers_suppliers.models import CustomUser, Supplier
-from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+from customers_suppliers.renderers import FastJSONRenderer
+from products import catalog, category_stats, facets, search
+from products.caching import check_response_cache
+from products.fastpath import compile_mapper
+from products.filters import ProductInfoFilter
+from products.importer import ImportStats, ParallelImporter, ProductImporter, wait_shards
+from products.price_list import CsvPriceList, YamlPriceList, detect_format, dump_price_list, open_price_list
+from products.synthetic import SYNTHETIC_CATEGORIES, generate_categories, generate_goods
+from products.validation import normalise_good, validate_goods
+from products.views import ProductInfoViewSet
+from products.models import CatalogEntry, Category, CategoryStats, ImportJob, Parameter, ParameterValueFacet, Product, ProductInfo, ProductParameter
+from products.serializers import CategoryWithStatsSerializer, ProductCardSerializer, ProductInfoSerializer, ProductParameterSerializer, ProductSerializer
 
 
 
@@ -166,3 +202,1128 @@ class ProductViewSetTests(APITestCase):
         response = self.client.patch(url, data)  # Используем patch
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(Product.objects.get(pk=self.product.id).name, "Partially Updated Product")
+
+
+class ProductImporterTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='importsupplier', email='importsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.categories = [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}]
+
+    def make_goods(self, count):
+        return [
+            {
+                'id': 1000 + i, 'category': 224 if i % 7 % 2 else 15, 'model': f'model-{i}',
+                'name': f'Товар {i % 7}', 'price': 100 + i, 'price_rrc': 120 + i, 'quantity': i,
+                'parameters': {'Цвет': 'красный', 'Встроенная память (Гб)': 256, 'Диагональ (дюйм)': 6.5},
+            }
+            for i in range(count)
+        ]
+
+    def test_import_creates_rows(self):
+        stats = ProductImporter(self.shop).run(self.make_goods(10), self.categories)
+        self.assertEqual(stats.rows, 10)
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(Product.objects.count(), 7)
+        self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), 10)
+        self.assertEqual(Parameter.objects.count(), 3)
+        self.assertEqual(ProductParameter.objects.count(), 30)
+        self.assertEqual(ProductParameter.objects.filter(parameter__name='Встроенная память (Гб)').first().value, '256')
+
+    def test_query_count_depends_on_batches(self):
+        stats = ProductImporter(self.shop, batch_size=500).run(self.make_goods(500), self.categories)
+        self.assertEqual(stats.product_parameters_created, 1500)
+        self.assertLess(stats.queries, 50)
+
+    def test_unknown_category(self):
+        goods = self.make_goods(1)
+        goods[0]['category'] = 999
+        with self.assertRaises(ValueError):
+            ProductImporter(self.shop).run(goods, self.categories)
+        self.assertEqual(ProductInfo.objects.count(), 0)
+
+
+    def test_differential_reimport(self):
+        goods = self.make_goods(10)
+        ProductImporter(self.shop).run(goods, self.categories)
+        goods[0]['price'] = 1
+        goods[1]['parameters'] = {'Цвет': 'синий', 'Встроенная память (Гб)': 256}
+        goods.pop()
+        goods.append({'id': 5000, 'category': 224, 'model': 'new', 'name': 'Новый товар', 'price': 10,
+                      'price_rrc': 12, 'quantity': 1, 'parameters': {'Цвет': 'белый'}})
+
+        stats = ProductImporter(self.shop, differential=True).run(goods, self.categories)
+        self.assertEqual(stats.product_infos_created, 1)
+        self.assertEqual(stats.product_infos_updated, 1)
+        self.assertEqual(stats.product_infos_unchanged, 8)
+        self.assertEqual(stats.product_infos_deleted, 1)
+        self.assertEqual(stats.product_parameters_updated, 1)
+        self.assertEqual(stats.product_parameters_deleted, 1)
+        self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), 10)
+        self.assertEqual(ProductInfo.objects.get(external_id=goods[0]['id']).price, 1)
+        self.assertFalse(ProductInfo.objects.filter(external_id=1009).exists())
+
+        stats = ProductImporter(self.shop, differential=True).run(goods, self.categories)
+        self.assertEqual(stats.product_infos_unchanged, 10)
+        self.assertEqual(stats.product_infos_updated + stats.product_parameters_updated, 0)
+
+    def test_parallel_partition(self):
+        goods = self.make_goods(20)
+        by_category = ParallelImporter(self.shop, workers=2)
+        shards = {}
+        for product_data in goods:
+            shard = by_category.shard_for(product_data)
+            self.assertEqual(shards.setdefault(product_data['category'], shard), shard)
+        self.assertEqual(set(shards.values()), {0, 1})
+
+        by_hash = ParallelImporter(self.shop, workers=3, partition='hash')
+        self.assertEqual([by_hash.shard_for(product_data) for product_data in goods[:4]], [1, 2, 0, 1])
+
+    def test_parallel_import_inside_transaction_runs_in_process(self):
+        stats = ParallelImporter(self.shop, workers=4).run(self.make_goods(10), self.categories)
+        self.assertEqual(stats.rows, 10)
+        self.assertEqual(ProductParameter.objects.count(), 30)
+
+    def test_merge_stats(self):
+        stats = ImportStats()
+        stats.rows = 5
+        stats.merge({'rows': 10, 'products_created': 2, 'seconds': 3.0, 'rows_per_sec': 3.3})
+        self.assertEqual((stats.rows, stats.products_created, stats.seconds), (15, 2, 0.0))
+
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Параллельная загрузка работает только с PostgreSQL')
+class ParallelImporterTests(TransactionTestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='parallelsupplier', email='parallelsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.categories = [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}]
+
+    make_goods = ProductImporterTests.make_goods
+
+    def test_workers_write_all_shards(self):
+        goods = self.make_goods(20)
+        for partition in ('category', 'hash'):
+            stats = ParallelImporter(self.shop, workers=2, partition=partition).run(goods, self.categories)
+            self.assertEqual(stats.product_infos_created, 20)
+            self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), 20)
+            self.assertEqual(CatalogEntry.objects.count(), 20)
+            in_category = sum(product_data['category'] == 224 for product_data in goods)
+            self.assertEqual(ParameterValueFacet.objects.get(category_id=224, parameter__name='Цвет', value='красный').count, in_category)
+            self.assertEqual(CategoryStats.objects.get(category_id=224).offer_count,
+                             sum(product_data['category'] == 224 and product_data['quantity'] > 0 for product_data in goods))
+            ProductInfo.objects.filter(shop=self.shop).delete()
+
+    def test_failed_shard_rolls_back_all_shards(self):
+        goods = self.make_goods(20)
+        # повтор товара нарушает уникальность только в части категории 224, часть категории 15 записывается без ошибок
+        goods.append(next(product_data for product_data in goods if product_data['category'] == 224))
+        with self.assertRaises(ValueError):
+            ParallelImporter(self.shop, workers=2).run(goods, self.categories)
+        self.assertFalse(ProductInfo.objects.filter(shop=self.shop).exists())
+        self.assertFalse(CatalogEntry.objects.exists())
+        self.assertFalse(ParameterValueFacet.objects.exists())
+        self.assertFalse(CategoryStats.objects.filter(offer_count__gt=0).exists())
+
+
+class ShardRepliesTests(TestCase):
+    alive = SimpleNamespace(is_alive=lambda: True, exitcode=None)
+
+    def test_replies_are_matched_by_shard_and_kind(self):
+        results = queue.Queue()
+        # часть 0 не дождалась решения и откатилась раньше, чем ответила часть 1
+        for message in [(0, 'ready', 'a'), (0, 'rolled_back', 'timeout'), (1, 'ready', 'b')]:
+            results.put(message)
+        inbox = {}
+        processes = [self.alive, self.alive]
+        self.assertEqual(wait_shards(processes, results, inbox, [0, 1], ('ready', 'error')),
+                         {0: ('ready', 'a'), 1: ('ready', 'b')})
+        self.assertEqual(wait_shards(processes, results, inbox, [0], ('committed', 'rolled_back')),
+                         {0: ('rolled_back', 'timeout')})
+
+    def test_dead_shard_does_not_block(self):
+        results = queue.Queue()
+        results.put((1, 'ready', 'b'))
+        processes = [SimpleNamespace(is_alive=lambda: False, exitcode=-9), self.alive]
+        replies = wait_shards(processes, results, {}, [0, 1], ('ready', 'error'))
+        self.assertEqual(replies[1], ('ready', 'b'))
+        self.assertEqual(replies[0][0], 'error')
+        self.assertIn('-9', replies[0][1])
+
+
+class YamlPriceListTests(TestCase):
+    def test_matches_safe_load(self):
+        path = settings.BASE_DIR / 'shop1.yaml'
+        with open(path, 'rb') as file:
+            data = yaml.safe_load(file)
+        with open(path, 'rb') as file:
+            price_list = YamlPriceList(file)
+            self.assertEqual(price_list.shop_id, data['shop'][0]['id'])
+            self.assertEqual(price_list.categories, data['categories'])
+            self.assertEqual(list(price_list.goods()), data['goods'])
+
+    def test_goods_are_read_lazily(self):
+        content = 'shop:\n  - id: 1\ncategories: []\ngoods:\n  - id: 1\n    name: first\n  - id: 2\n    name: [broken\n'
+        goods = YamlPriceList(io.BytesIO(content.encode('utf-8'))).goods()
+        self.assertEqual(next(goods), {'id': 1, 'name': 'first'})
+        with self.assertRaises(yaml.YAMLError):
+            next(goods)
+
+    def test_header_after_goods(self):
+        content = 'goods:\n  - id: 1\n    parameters: {a: [1, 2]}\ncategories:\n  - id: 5\n    name: x\nshop:\n  - id: 3\n'
+        price_list = YamlPriceList(io.BytesIO(content.encode('utf-8')))
+        self.assertEqual(price_list.shop_id, 3)
+        self.assertEqual(price_list.categories, [{'id': 5, 'name': 'x'}])
+        self.assertEqual(list(price_list.goods()), [{'id': 1, 'parameters': {'a': [1, 2]}}])
+
+    def test_csv_and_jsonl_round_trip(self):
+        goods = list(generate_goods(20))
+        category_ids = {category['id'] for category in SYNTHETIC_CATEGORIES}
+        expected = [normalise_good(good, category_ids)[0] for good in goods]
+        for file_format in ('yaml', 'csv', 'jsonl'):
+            content = ''.join(dump_price_list(file_format, 7, SYNTHETIC_CATEGORIES, goods)).encode('utf-8')
+            price_list = open_price_list(io.BytesIO(content), file_format, shop_id=7)
+            self.assertEqual(price_list.shop_id, 7)
+            self.assertEqual([normalise_good(good, category_ids)[0] for good in price_list.goods()], expected)
+
+    def test_csv_parameter_columns(self):
+        content = 'id,category,model,name,price,price_rrc,quantity,param:Цвет\n1,224,m,x,10,12,1,красный\n'
+        good = next(CsvPriceList(io.BytesIO(content.encode('utf-8'))).goods())
+        self.assertEqual(good['parameters'], {'Цвет': 'красный'})
+        self.assertEqual(detect_format('shop.CSV'), 'csv')
+
+
+class ValidationTests(TestCase):
+    def make_good(self, external_id, **fields):
+        good = {'id': external_id, 'category': 224, 'model': 'm', 'name': 'Товар', 'price': '100',
+                'price_rrc': 120, 'quantity': 3.0, 'parameters': {'Память': 256}}
+        good.update(fields)
+        return good
+
+    def test_normalise_good(self):
+        good, errors = normalise_good(self.make_good(1), {224})
+        self.assertEqual(errors, [])
+        self.assertEqual(good['price'], 100)
+        self.assertEqual(good['quantity'], 3)
+        self.assertEqual(good['parameters'], {'Память': '256'})
+
+        good, errors = normalise_good(self.make_good(1, price=-1, category=5, name=''), {224})
+        self.assertEqual({error['field'] for error in errors}, {'price', 'category', 'name'})
+
+    def test_validate_goods_in_pool(self):
+        goods = [self.make_good(i) for i in range(1, 41)]
+        goods[9]['quantity'] = 'много'
+        goods[30]['id'] = 5
+        report = validate_goods(iter(goods), {224}, workers=2, shard_size=4)
+        self.assertEqual(report.rows, 40)
+        self.assertFalse(report.is_valid)
+        self.assertEqual([(error['row'], error['field']) for error in report.as_dict()['errors']],
+                         [(10, 'quantity'), (31, 'id')])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+class ImportJobTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='jobsupplier', email='jobsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.other = CustomUser.objects.create_user(username='othersupplier', email='othersupplier@example.com', password='testpassword', user_type='supplier')
+        self.client.force_authenticate(user=self.supplier)
+
+    def upload(self, shop_id, expected_status=status.HTTP_202_ACCEPTED, **data):
+        content = yaml.safe_dump({
+            'shop': [{'id': shop_id}],
+            'categories': [{'id': 224, 'name': 'Смартфоны'}],
+            'goods': [{'id': 1, 'category': 224, 'model': 'apple/iphone/xr', 'name': 'iPhone XR', 'price': 65000,
+                       'price_rrc': 69990, 'quantity': 9, 'parameters': {'Цвет': 'красный'}}],
+        }, allow_unicode=True)
+        upload = SimpleUploadedFile('shop.yaml', content.encode('utf-8'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload-yaml'), dict(data, file=upload), format='multipart')
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def job_status(self, response):
+        return self.client.get(reverse('import-job', kwargs={'pk': response.data['id']}))
+
+    def test_upload_runs_job(self):
+        response = self.job_status(self.upload(self.shop.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['rows_processed'], 1)
+        self.assertEqual(response.data['result']['product_infos_created'], 1)
+        self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), 1)
+
+    def test_upload_foreign_shop_fails(self):
+        Supplier.objects.create(user=self.other, supplier_type='IP', inn='210987654321')
+        response = self.job_status(self.upload(self.other.supplier.id))
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertEqual(response.data['errors'], [{'error': 'Нет прав для доступа к этому магазину.'}])
+        self.assertEqual(ProductInfo.objects.count(), 0)
+
+    def test_job_status_hidden_from_other_users(self):
+        job = ImportJob.objects.create(user=self.supplier, file='imports/shop.yaml')
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(reverse('import-job', kwargs={'pk': job.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_dry_run(self):
+        content = yaml.safe_dump({
+            'shop': [{'id': self.shop.id}],
+            'categories': [{'id': 224, 'name': 'Смартфоны'}],
+            'goods': [{'id': 1, 'category': 224, 'model': 'm', 'name': 'x', 'price': 1, 'price_rrc': 1,
+                       'quantity': 1},
+                      {'id': 1, 'category': 15, 'model': 'm', 'name': 'y', 'price': 1, 'price_rrc': 1,
+                       'quantity': 1}],
+        }, allow_unicode=True)
+        upload = SimpleUploadedFile('shop.yaml', content.encode('utf-8'))
+        response = self.client.post(reverse('upload-yaml'), {'file': upload, 'dry_run': 'true'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['error_count'], 2)
+        self.assertEqual({error['row'] for error in response.data['errors']}, {2})
+        self.assertEqual(ImportJob.objects.count(), 0)
+        self.assertEqual(Category.objects.count(), 0)
+
+    def test_upload_csv(self):
+        Category.objects.create(id=224, name='Смартфоны')
+        content = 'id,category,model,name,price,price_rrc,quantity,parameters\n' \
+                  '1,224,m,iPhone XR,65000,69990,9,"{""Цвет"": ""красный""}"\n'
+        upload = SimpleUploadedFile('shop.csv', content.encode('utf-8'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload-yaml'), {'file': upload}, format='multipart')
+        self.assertEqual(response.data['file_format'], 'csv')
+        response = self.client.get(reverse('import-job', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.data['status'], 'done')
+        product_info = ProductInfo.objects.get(shop=self.shop)
+        self.assertEqual(product_info.price, 65000)
+        self.assertEqual(product_info.product_parameters.get().value, 'красный')
+
+    def test_same_csv_for_another_shop_is_imported(self):
+        Category.objects.create(id=224, name='Смартфоны')
+        other_shop = Supplier.objects.create(user=self.other, supplier_type='IP', inn='210987654321')
+        admin = CustomUser.objects.create_user(username='jobadmin', email='jobadmin@example.com', password='testpassword', user_type='supplier', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        content = 'id,category,model,name,price,price_rrc,quantity,parameters\n' \
+                  '1,224,m,iPhone XR,65000,69990,9,"{""Цвет"": ""красный""}"\n'
+        responses = []
+        for shop in (self.shop, other_shop):
+            upload = SimpleUploadedFile('shop.csv', content.encode('utf-8'))
+            with self.captureOnCommitCallbacks(execute=True):
+                responses.append(self.client.post(reverse('upload-yaml'), {'file': upload, 'shop': shop.id}, format='multipart'))
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_202_ACCEPTED] * 2)
+        self.assertTrue(ProductInfo.objects.filter(shop=other_shop).exists())
+
+    def test_repeated_upload_is_deduplicated(self):
+        first = self.upload(self.shop.id)
+        self.assertEqual(self.job_status(first).data['status'], 'done')
+
+        second = self.upload(self.shop.id, expected_status=status.HTTP_200_OK)
+        self.assertTrue(second.data['duplicate'])
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(ImportJob.objects.count(), 1)
+
+        forced = self.upload(self.shop.id, force='true', differential='true')
+        self.assertEqual(self.job_status(forced).data['status'], 'done')
+        self.assertEqual(ImportJob.objects.count(), 2)
+        self.assertNotEqual(forced.data['id'], first.data['id'])
+
+
+class ShopCatalogExportTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='exportsupplier', email='exportsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.goods = list(generate_goods(30))
+        ProductImporter(self.shop).run(self.goods, SYNTHETIC_CATEGORIES)
+        self.client.force_authenticate(user=self.supplier)
+
+    def export(self, file_format):
+        response = self.client.get(reverse('shop-export', kwargs={'shop_id': self.shop.id}), {'file_format': file_format})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(2):
+            return b''.join(response.streaming_content)
+
+    def test_export_yaml(self):
+        price_list = YamlPriceList(io.BytesIO(self.export('yaml')))
+        self.assertEqual(price_list.shop_id, self.shop.id)
+        category_ids = {category['id'] for category in price_list.categories}
+        self.assertEqual([normalise_good(good, category_ids)[0] for good in price_list.goods()],
+                         [normalise_good(good, category_ids)[0] for good in self.goods])
+
+    def test_export_jsonl(self):
+        lines = self.export('jsonl').decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 32)
+        self.assertEqual(json.loads(lines[2])['id'], self.goods[0]['id'])
+
+    def test_export_foreign_shop(self):
+        customer = CustomUser.objects.create_user(username='exportcustomer', email='exportcustomer@example.com', password='testpassword', user_type='customer')
+        self.client.force_authenticate(user=customer)
+        response = self.client.get(reverse('shop-export', kwargs={'shop_id': self.shop.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductCardTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='cardsupplier', email='cardsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='OOO', inn='123456789012', name_organization='Связной')
+        self.goods = list(generate_goods(40))
+        ProductImporter(self.shop).run(self.goods, SYNTHETIC_CATEGORIES)
+
+    def test_card_contains_nested_data(self):
+        product_info = ProductInfo.objects.get(external_id=self.goods[0]['id'])
+        response = self.client.get(reverse('product-card-detail', kwargs={'pk': product_info.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], self.goods[0]['name'])
+        self.assertEqual(response.data['category']['id'], self.goods[0]['category'])
+        self.assertEqual(response.data['shop'], {'id': self.shop.id, 'name': 'Связной'})
+        self.assertEqual(response.data['parameters'],
+                         {name: str(value) for name, value in self.goods[0]['parameters'].items()})
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for count in (30, 5):
+            ProductInfo.objects.filter(id__in=ProductInfo.objects.order_by('-id').values('id')[:ProductInfo.objects.count() - count]).delete()
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('product-card-list'))
+            self.assertEqual(len(response.data['results']), count)
+
+
+class FacetTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='facetsupplier', email='facetsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.goods = list(generate_goods(60))
+        ProductImporter(self.shop).run(self.goods, SYNTHETIC_CATEGORIES)
+
+    def assertIndexIsConsistent(self):
+        index = set(ParameterValueFacet.objects.values_list('category_id', 'parameter_id', 'value', 'count'))
+        facets.rebuild()
+        self.assertEqual(index, set(ParameterValueFacet.objects.values_list('category_id', 'parameter_id', 'value', 'count')))
+
+    def test_index_follows_imports(self):
+        self.assertIndexIsConsistent()
+        self.goods[0]['parameters'] = {'Цвет': 'фиолетовый'}
+        self.goods[1]['category'] = 5 if self.goods[1]['category'] != 5 else 1
+        del self.goods[2]
+        ProductImporter(self.shop, differential=True).run(self.goods, SYNTHETIC_CATEGORIES)
+        self.assertIndexIsConsistent()
+        self.assertEqual(ParameterValueFacet.objects.get(parameter__name='Цвет', value='фиолетовый').count, 1)
+
+    def test_index_follows_single_changes(self):
+        product_parameter = ProductParameter.objects.select_related('parameter').first()
+        product_parameter.value = 'новое значение'
+        product_parameter.save()
+        ProductParameter.objects.exclude(id=product_parameter.id).first().delete()
+        ProductInfo.objects.last().delete()
+        product_info = ProductInfo.objects.first()
+        product_info.product = Product.objects.exclude(category=product_info.product.category).first()
+        product_info.save()
+        self.assertIndexIsConsistent()
+
+    def test_shop_delete_keeps_derived_data(self):
+        admin = CustomUser.objects.create_superuser(username='facetadmin', email='facetadmin@example.com', password='testpassword')
+        self.client.force_authenticate(user=admin)
+        product = Product.objects.filter(product_infos__isnull=False).first()
+        response = self.client.delete(reverse('product-detail', kwargs={'pk': product.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIndexIsConsistent()
+
+        parameters = ProductParameter.objects.filter(product_info__shop=self.shop).count()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(reverse('supplier-detail', kwargs={'pk': self.shop.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        # без deleting_goods - по запросу на каждый удаленный параметр
+        self.assertLess(len(queries), parameters / 2)
+        self.assertIndexIsConsistent()
+        self.assertFalse(CatalogEntry.objects.exists())
+        stats = set(CategoryStats.objects.values_list('category_id', *category_stats.STATS_FIELDS))
+        category_stats.rebuild()
+        self.assertEqual(stats, set(CategoryStats.objects.values_list('category_id', *category_stats.STATS_FIELDS)))
+
+    def test_search_by_parameters(self):
+        first = self.goods[0]
+        names = list(first['parameters'])[:2]
+        params = [f"{name}:{first['parameters'][name]}" for name in names]
+        response = self.client.get(reverse('product-search-list'), {'param': params, 'category': first['category']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = [good['id'] for good in self.goods if good['category'] == first['category']
+                    and all(str(good['parameters'].get(name)) == str(first['parameters'][name]) for name in names)]
+        self.assertEqual(sorted(card['external_id'] for card in response.data['results']), sorted(expected))
+        color_counts = Counter(good['parameters']['Цвет'] for good in self.goods
+                               if good['category'] == first['category'] and 'Цвет' in good['parameters'])
+        self.assertEqual(response.data['facets'].get('Цвет', {}), dict(color_counts))
+
+    def test_search_rejects_malformed_constraint(self):
+        response = self.client.get(reverse('product-search-list'), {'param': 'Цвет'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('product-search-list'), {'param': 'Нет такого:1'})
+        self.assertEqual(response.data['count'], 0)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='searchsupplier', email='searchsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        with open(os.path.join(settings.BASE_DIR, 'shop1.yaml'), 'rb') as file:
+            price_list = YamlPriceList(file)
+            ProductImporter(self.shop).run(list(price_list.goods()), price_list.categories)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('product-search-list'), dict(params, q=query))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [card['name'] for card in response.data['results']]
+
+    def test_all_words_must_match(self):
+        names = self.search('iphone xr 256')
+        self.assertTrue(names)
+        self.assertTrue(all('XR 256GB' in name for name in names))
+
+    def test_typo_and_model(self):
+        self.assertTrue(all('iPhone' in name for name in self.search('ipone')))
+        self.assertEqual(set(self.search('xs-max')), set(self.search('iphone xs max')))
+
+    def test_search_combines_with_parameters(self):
+        names = self.search('iphone', param='Цвет:красный')
+        self.assertTrue(names)
+        self.assertTrue(all('красный' in name for name in names))
+
+    def test_index_ranks_whole_words_first(self):
+        index = search.SearchIndex([(1, 'Смартфон Apple iPhone XR', 'apple/iphone/xr'),
+                                    (2, 'Чехол для iPhone XR', 'case/xrl')])
+        self.assertEqual(index.search(['xr']), [1, 2])
+        self.assertEqual(index.search(['xrl']), [2])
+        self.assertEqual(index.search(['iphone', 'чехол']), [2])
+
+    def test_index_is_rebuilt_after_changes(self):
+        self.assertEqual(self.search('новинка'), [])
+        product = Product.objects.first()
+        product.name = 'Новинка'
+        product.save()
+        self.assertTrue(self.search('новинка'))
+
+    def test_postgres_expressions(self):
+        queryset = Product.objects.filter(search.FullTextMatch(F('name'), Value('iphone:*')))
+        self.assertIn("to_tsvector('simple', \"products_product\".\"name\") @@ to_tsquery('simple', ", str(queryset.query))
+        queryset = ProductInfo.objects.filter(search.TrigramMatch(F('model'), Value('ipone')))
+        self.assertIn('"products_productinfo"."model" %% ', queryset.query.sql_with_params()[0])
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='cursorsupplier', email='cursorsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        ProductImporter(self.shop).run(list(generate_goods(75)), SYNTHETIC_CATEGORIES)
+
+    def test_cursor_pages_cover_filtered_list(self):
+        url = reverse('productinfo-list') + f'?pagination=cursor&shop={self.shop.id}&page_size=20'
+        ids = []
+        while url:
+            # фильтр shop проверяет магазин отдельным запросом, COUNT(*) нет
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, list(ProductInfo.objects.filter(shop=self.shop).order_by('id').values_list('id', flat=True)))
+
+    def test_page_number_is_default(self):
+        response = self.client.get(reverse('productparameter-list'))
+        self.assertEqual(response.data['count'], ProductParameter.objects.count())
+        response = self.client.get(reverse('product-list'), {'pagination': 'cursor'})
+        self.assertNotIn('count', response.data)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_cursor_rejects_ordering(self):
+        response = self.client.get(reverse('productinfo-list'), {'pagination': 'cursor', 'ordering': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.data)
+        response = self.client.get(reverse('productinfo-list'), {'ordering': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        prices = [item['price'] for item in response.data['results']]
+        self.assertEqual(prices, sorted(prices))
+
+
+@override_settings(RESPONSE_CACHE=True)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='cachesupplier', email='cachesupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        ProductImporter(self.shop).run(list(generate_goods(20)), SYNTHETIC_CATEGORIES)
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse('product-card-list')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url, {'shop': self.shop.id})['X-Cache'], 'MISS')
+
+    def test_not_modified(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, status.HTTP_200_OK)
+
+    def test_writes_invalidate_cached_responses(self):
+        url = reverse('product-card-detail', kwargs={'pk': ProductInfo.objects.first().id})
+        etag = self.client.get(url)['ETag']
+        Category.objects.filter(id=self.client.get(url).json()['category']['id']).first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        ProductImporter(self.shop, differential=True).run(list(generate_goods(20)), SYNTHETIC_CATEGORIES)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_local_cache_requires_disabled_cache(self):
+        self.assertEqual([error.id for error in check_response_cache(None)], ['products.E001'])
+        with override_settings(RESPONSE_CACHE=False):
+            self.assertEqual(check_response_cache(None), [])
+            url = reverse('category-list')
+            self.client.get(url)
+            response = self.client.get(url)
+        self.assertNotIn('X-Cache', response)
+        self.assertNotIn('ETag', response)
+
+
+class ProductInfoRangeFilterTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='rangesupplier', email='rangesupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.goods = list(generate_goods(60))
+        for good in self.goods[::4]:
+            good['quantity'] = 0
+        ProductImporter(self.shop).run(self.goods, SYNTHETIC_CATEGORIES)
+
+    def test_price_range_and_stock(self):
+        response = self.client.get(reverse('productinfo-list'), {
+            'shop': self.shop.id, 'price_min': 20000, 'price_max': 90000, 'in_stock': 'true', 'ordering': '-price',
+            'page_size': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = sorted((good for good in self.goods if 20000 <= good['price'] <= 90000 and good['quantity'] > 0),
+                          key=lambda good: -good['price'])
+        prices = [item['price'] for item in response.data['results']]
+        self.assertEqual(prices, [good['price'] for good in expected][:30])
+        self.assertEqual(response.data['count'], len(expected))
+
+        response = self.client.get(reverse('productinfo-list'), {'quantity_gt': 10})
+        self.assertEqual(response.data['count'], sum(good['quantity'] > 10 for good in self.goods))
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # на маленькой таблице PostgreSQL выбрал бы последовательное чтение
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            self.assertIn(index_name, queryset.explain())
+
+    def test_query_plans_use_indexes(self):
+        queryset = ProductInfoFilter({'shop': self.shop.id, 'price_min': 100, 'price_max': 500},
+                                     queryset=ProductInfo.objects.all()).qs
+        self.assertUsesIndex(queryset, 'product_info_shop_price')
+        queryset = ProductInfoFilter({'in_stock': 'true', 'ordering': 'price'}, queryset=ProductInfo.objects.all()).qs
+        self.assertUsesIndex(queryset[:30], 'product_info_in_stock_price')
+        queryset = ProductInfoFilter({'quantity_gt': 5, 'price_max': 500, 'ordering': 'price'},
+                                     queryset=ProductInfo.objects.all()).qs
+        self.assertUsesIndex(queryset[:30], 'product_info_in_stock_price')
+
+
+class CatalogReadModelTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='catalogsupplier', email='catalogsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.goods = list(generate_goods(40))
+        ProductImporter(self.shop).run(self.goods, SYNTHETIC_CATEGORIES)
+
+    def assertCatalogIsConsistent(self):
+        self.assertEqual(catalog.check(), {'missing': [], 'stale': [], 'orphaned': []})
+
+    def test_imports_keep_catalog_in_sync(self):
+        self.assertEqual(CatalogEntry.objects.count(), 40)
+        self.assertCatalogIsConsistent()
+        self.goods[0]['price'] += 10
+        self.goods[1]['parameters'] = {'Цвет': 'фиолетовый'}
+        self.goods[2]['category'] = 5 if self.goods[2]['category'] != 5 else 1
+        del self.goods[3]
+        ProductImporter(self.shop, differential=True).run(self.goods, SYNTHETIC_CATEGORIES)
+        self.assertEqual(CatalogEntry.objects.count(), 39)
+        self.assertCatalogIsConsistent()
+
+    def test_single_changes_keep_catalog_in_sync(self):
+        product_parameter = ProductParameter.objects.first()
+        product_parameter.value = 'новое значение'
+        product_parameter.save()
+        ProductParameter.objects.exclude(id=product_parameter.id).first().delete()
+        ProductInfo.objects.last().delete()
+        product = Product.objects.first()
+        product.name = 'Новое название'
+        product.save()
+        category = Category.objects.get(id=self.goods[0]['category'])
+        category.name = 'Новая категория'
+        category.save()
+        self.shop.name_organization = 'Новый магазин'
+        self.shop.save()
+        parameter = Parameter.objects.first()
+        parameter.name = 'Новый параметр'
+        parameter.save()
+        self.assertCatalogIsConsistent()
+
+    def test_check_and_rebuild_commands(self):
+        CatalogEntry.objects.filter(product_info_id=ProductInfo.objects.first().id).update(price=1)
+        CatalogEntry.objects.filter(product_info_id=ProductInfo.objects.last().id).delete()
+        with self.assertRaises(CommandError):
+            call_command('check_catalog', stdout=io.StringIO())
+        call_command('check_catalog', fix=True, stdout=io.StringIO())
+        self.assertCatalogIsConsistent()
+        call_command('rebuild_catalog', stdout=io.StringIO())
+        self.assertEqual(CatalogEntry.objects.count(), 40)
+        self.assertCatalogIsConsistent()
+
+    def test_card_endpoint_serves_same_data(self):
+        url = reverse('product-card-list')
+        params = {'product__category': self.goods[0]['category']}
+        expected = self.client.get(url, params).json()
+        with override_settings(CATALOG_READ_MODEL=True):
+            Category.objects.first().save()
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            self.assertEqual(response.json(), expected)
+            product_info_id = expected['results'][0]['id']
+            response = self.client.get(reverse('product-card-detail', kwargs={'pk': product_info_id}))
+            self.assertEqual(response.json(), expected['results'][0])
+
+
+class BestOfferTests(APITestCase):
+    def setUp(self):
+        self.goods = list(generate_goods(30))
+        self.shops = []
+        for number, (quantity, markup) in enumerate([(5, 0), (0, -100), (3, 50), (7, 70)]):
+            user = CustomUser.objects.create_user(username=f'offersupplier{number}', email=f'offersupplier{number}@example.com', password='testpassword', user_type='supplier')
+            shop = Supplier.objects.create(user=user, supplier_type='IP', inn='123456789012', name_organization=f'Магазин {number}')
+            goods = [dict(good, price=good['price'] + markup, quantity=quantity) for good in self.goods[:10 + number * 5]]
+            ProductImporter(shop).run(goods, SYNTHETIC_CATEGORIES)
+            self.shops.append(shop)
+
+    def expected(self, product):
+        prices = sorted((offer.price, offer.id, offer.shop_id) for offer in product.product_infos.filter(quantity__gt=0))
+        return {'offers': len(prices), 'min_price': prices[0][0], 'max_price': prices[-1][0],
+                'median_price': statistics.median(price for price, _, _ in prices), 'shop': prices[0][2]}
+
+    def test_offer_statistics(self):
+        category_id = self.goods[0]['category']
+        # проверка категории фильтром, COUNT(*), страница продуктов и сводка по всей странице
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('best-offer-list'), {'category': category_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        products = Product.objects.filter(category_id=category_id, product_infos__quantity__gt=0).distinct()
+        self.assertEqual(response.data['count'], products.count())
+        for item in response.data['results']:
+            expected = self.expected(Product.objects.get(id=item['product']))
+            self.assertEqual(item['category'], category_id)
+            self.assertEqual(item['best_offer']['shop']['id'], expected.pop('shop'))
+            self.assertEqual({key: item[key] for key in expected}, expected)
+
+    @override_settings(RESPONSE_CACHE=True)
+    def test_price_change_invalidates_cached_offer(self):
+        product_info = ProductInfo.objects.filter(shop=self.shops[3]).first()
+        url = reverse('best-offer-detail', kwargs={'pk': product_info.product_id})
+        self.assertNotEqual(self.client.get(url).json()['best_offer']['id'], product_info.id)
+        product_info.price = 1
+        product_info.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['best_offer']['id'], product_info.id)
+        self.assertEqual(response.data['best_offer']['shop'], {'id': self.shops[3].id, 'name': 'Магазин 3'})
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='fieldssupplier', email='fieldssupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='OOO', inn='123456789012', name_organization='Связной')
+        ProductImporter(self.shop).run(list(generate_goods(10)), SYNTHETIC_CATEGORIES)
+
+    def test_fields_trim_payload_and_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('productinfo-list'), {'fields': 'id,price,quantity'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'price', 'quantity'})
+        select = [query['sql'] for query in queries if '"products_productinfo"."price"' in query['sql']][-1]
+        self.assertNotIn('"products_productinfo"."model"', select)
+
+        response = self.client.get(reverse('productinfo-list'), {'omit': 'model,price_rrc'})
+        self.assertEqual(set(response.data['results'][0]),
+                         {'id', 'external_id', 'product', 'shop', 'quantity', 'price'})
+
+    def test_expand_nested_objects(self):
+        product_info = ProductInfo.objects.select_related('product__category').first()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('productinfo-detail', kwargs={'pk': product_info.id}),
+                                       {'expand': 'product,product.category', 'fields': 'id,product.name,product.category'})
+        self.assertEqual(response.data, {'id': product_info.id, 'product': {
+            'name': product_info.product.name,
+            'category': {'id': product_info.product.category_id, 'name': product_info.product.category.name},
+        }})
+        response = self.client.get(reverse('productinfo-detail', kwargs={'pk': product_info.id}), {'expand': 'shop'})
+        self.assertEqual(response.data['shop'], {'id': self.shop.id, 'name': 'Связной'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,color'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('product-list'), {'expand': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fields_do_not_affect_writes(self):
+        self.client.force_authenticate(user=self.supplier)
+        response = self.client.post(reverse('product-list') + '?fields=id',
+                                    {'name': 'Новый продукт', 'category': Category.objects.first().id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['name'], 'Новый продукт')
+
+
+class ValuesListTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='valuessupplier', email='valuessupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        ProductImporter(self.shop).run(list(generate_goods(25)), SYNTHETIC_CATEGORIES)
+
+    def test_lists_match_serializers(self):
+        for url_name, model, serializer_class in [
+            ('category-list', Category, CategoryWithStatsSerializer),
+            ('product-list', Product, ProductSerializer),
+            ('productinfo-list', ProductInfo, ProductInfoSerializer),
+            ('productparameter-list', ProductParameter, ProductParameterSerializer),
+        ]:
+            with self.subTest(url_name):
+                response = self.client.get(reverse(url_name), {'pagination': 'cursor', 'page_size': 1000})
+                results = sorted(response.json()['results'], key=lambda item: item['id'])
+                expected = serializer_class(model.objects.order_by('id'), many=True).data
+                self.assertEqual(results, json.loads(json.dumps(expected)))
+
+    def test_fast_path_reads_values(self):
+        serializer = ProductInfoSerializer(fields=['price', 'quantity'])
+        paths, mapper = compile_mapper(serializer)
+        self.assertEqual(paths, ['quantity', 'price', 'id'])
+        self.assertEqual(mapper({'quantity': 1, 'price': 2, 'id': 3}), {'quantity': 1, 'price': 2})
+        self.assertIsNone(compile_mapper(ProductInfoSerializer(expand=['product'])))
+        self.assertIsNone(compile_mapper(ProductCardSerializer()))
+
+        # id не выбран, но курсор по нему все равно строится
+        response = self.client.get(reverse('productinfo-list'), {'pagination': 'cursor', 'page_size': 10, 'fields': 'price'})
+        self.assertEqual(set(response.data['results'][0]), {'price'})
+        self.assertIsNotNone(response.data['next'])
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+    def test_fast_json_renderer_matches_json_renderer(self):
+        data = {'price': Decimal('10.50'), 'created_at': datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+                'name': 'Смартфон\u2028', 1: [None, True, 1.5]}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertNotIn('\u2028'.encode(), FastJSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_bench_serializers_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_serializers', rows=50, repeat=1, output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as file:
+                results = json.load(file)['results']
+        self.assertEqual([result['name'] for result in results], ['category', 'product', 'product_info', 'product_parameter'])
+        self.assertTrue(all(result['rows'] == 50 and result['fast']['rows_per_sec'] > 0 for result in results))
+        self.assertFalse(Category.objects.filter(name='Категория 0').exists())
+
+
+class ProductInfoBatchTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='batchsupplier', email='batchsupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        ProductImporter(self.shop).run(list(generate_goods(30)), SYNTHETIC_CATEGORIES)
+        self.url = reverse('productinfo-batch')
+
+    def test_batch_returns_rows_in_request_order(self):
+        ids = list(ProductInfo.objects.order_by('-id').values_list('id', flat=True))
+        missing = max(ids) + 1
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {'ids': ids[:20] + [missing, ids[0]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], ids[:20])
+        self.assertEqual(response.data['missing'], [missing])
+        self.assertEqual(response.data['results'][0], ProductInfoSerializer(ProductInfo.objects.get(id=ids[0])).data)
+
+    def test_batch_permissions_match_retrieve(self):
+        customer = CustomUser.objects.create_user(username='batchcustomer', email='batchcustomer@example.com', password='testpassword', user_type='customer')
+        for user in (customer, self.supplier):
+            self.client.force_authenticate(user=user)
+            response = self.client.post(self.url, {'ids': [ProductInfo.objects.first().id]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(PRODUCT_INFO_BATCH_MAX=5)
+    def test_batch_validates_ids(self):
+        ids = list(ProductInfo.objects.values_list('id', flat=True))
+        response = self.client.post(self.url, {'ids': ids[:6]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
+        response = self.client.post(self.url, {'ids': ids[:5] + ids[:5]}, format='json')
+        self.assertEqual(len(response.data['results']), 5)
+        for ids in ([], ['a'], [0]):
+            response = self.client.post(self.url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CategoryStatsTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='statssupplier', email='statssupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.goods = list(generate_goods(40))
+        ProductImporter(self.shop, differential=True).run(self.goods, SYNTHETIC_CATEGORIES)
+
+    def expected_stats(self):
+        stats = {}
+        for category in Category.objects.all():
+            offers = [price for price, quantity in ProductInfo.objects.filter(product__category=category).values_list('price', 'quantity') if quantity > 0]
+            stats[category.id] = {
+                'product_count': Product.objects.filter(category=category).count(),
+                'offer_count': len(offers),
+                'min_price': min(offers, default=None),
+                'max_price': max(offers, default=None),
+                'shop_count': category.shops.count(),
+            }
+        return stats
+
+    def stored_stats(self):
+        return {row.pop('category_id'): row for row in CategoryStats.objects.values('category_id', *category_stats.STATS_FIELDS)}
+
+    def test_import_fills_stats(self):
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+        goods = [dict(good, quantity=0) if good['id'] % 3 == 0 else good for good in self.goods[:30]]
+        ProductImporter(self.shop, differential=True).run(goods, SYNTHETIC_CATEGORIES)
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+    def test_stats_follow_changes(self):
+        product_info = ProductInfo.objects.filter(quantity__gt=0).select_related('product').first()
+        product_info.price = 10 ** 6
+        product_info.save()
+        self.assertEqual(CategoryStats.objects.get(category_id=product_info.product.category_id).max_price, 10 ** 6)
+
+        other = Category.objects.exclude(id=product_info.product.category_id).first()
+        product_info.product.category = other
+        product_info.product.save()
+        self.shop.categories.add(other)
+        ProductInfo.objects.filter(quantity__gt=0).first().delete()
+        Product.objects.create(name='Новый продукт', category=Category.objects.create(id=9000, name='Новая'))
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+        self.shop.categories.clear()
+        Category.objects.get(id=other.id).delete()
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+        self.supplier.delete()
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+    def test_single_changes_do_not_aggregate_category(self):
+        category_id = ProductInfo.objects.filter(quantity__gt=0).values_list('product__category_id', flat=True).first()
+        offers = ProductInfo.objects.filter(product__category_id=category_id, quantity__gt=0).order_by('price')
+        self.assertGreater(offers.count(), 2)
+        middle = offers[1]
+        middle.price += 1
+        with CaptureQueriesContext(connection) as queries:
+            middle.save()
+            ProductInfo.objects.filter(quantity=0).first().delete()
+        # LEAST на SQLite - это MIN(a, b) в UPDATE сводки, агрегаты по товарам категории - в SELECT
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('SELECT')
+                          and ('MIN(' in query['sql'] or 'COUNT(' in query['sql'])])
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+        cheapest, dearest = offers.first(), offers.last()
+        cheapest.price = dearest.price + 1
+        cheapest.save()
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+        dearest = offers.last()
+        dearest.quantity = 0
+        dearest.save()
+        ProductInfo.objects.filter(product__category_id=category_id).exclude(id=offers.first().id).delete()
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+    def test_category_list_includes_stats(self):
+        category = CategoryStats.objects.order_by('-offer_count').first().category
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('category-list'))
+        item = next(item for item in response.data['results'] if item['id'] == category.id)
+        self.assertEqual(item, dict(id=category.id, name=category.name, **self.expected_stats()[category.id]))
+        response = self.client.get(reverse('category-detail', kwargs={'pk': category.id}))
+        self.assertEqual(response.data['offer_count'], category.stats.offer_count)
+
+    def test_rebuild_category_stats_command(self):
+        CategoryStats.objects.all().delete()
+        call_command('rebuild_category_stats', stdout=io.StringIO())
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+
+
+class OwnershipResolverTests(APITestCase):
+    def setUp(self):
+        self.supplier = CustomUser.objects.create_user(username='ownersupplier', email='ownersupplier@example.com', password='testpassword', user_type='supplier')
+        self.shop = Supplier.objects.create(user=self.supplier, supplier_type='IP', inn='123456789012')
+        self.other = CustomUser.objects.create_user(username='othersupplier', email='othersupplier@example.com', password='testpassword', user_type='supplier')
+        self.other_shop = Supplier.objects.create(user=self.other, supplier_type='IP', inn='123456789013')
+        ProductImporter(self.shop).run(list(generate_goods(5)), SYNTHETIC_CATEGORIES)
+        ProductImporter(self.other_shop).run(list(generate_goods(5, first_id=100)), SYNTHETIC_CATEGORIES)
+        self.own_ids = list(ProductInfo.objects.filter(shop=self.shop).values_list('id', flat=True))
+        self.other_id = ProductInfo.objects.filter(shop=self.other_shop).values_list('id', flat=True).first()
+
+    def get_view(self, user):
+        view = ProductInfoViewSet()
+        view.request = SimpleNamespace(user=user)
+        return view
+
+    def test_single_query_and_memoised(self):
+        view = self.get_view(self.supplier)
+        with self.assertNumQueries(1):
+            self.assertTrue(view.check_creators(self.own_ids))
+            self.assertTrue(view.check_creator(str(self.own_ids[0])))
+        with self.assertNumQueries(1):
+            self.assertFalse(view.check_creators(self.own_ids + [self.other_id]))
+        self.assertEqual(view.resolve_owners([self.own_ids[0], self.other_id, 'abc', 10 ** 9]), [True, False, None, None])
+        with self.assertRaises(NotFound):
+            view.check_creators(self.own_ids + [10 ** 9])
+        self.assertFalse(self.get_view(AnonymousUser()).check_creator(self.own_ids[0]))
+
+    def test_product_parameter_write_checks_owner_once(self):
+        parameter = Parameter.objects.create(name='Гарантия')
+        self.client.force_authenticate(user=self.supplier)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('productparameter-list'), {'product_info': self.own_ids[0], 'parameter': parameter.id, 'value': '1 год'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        owner_query = 'SELECT "products_productinfo"."id", "customers_suppliers_supplier"."user_id"'
+        self.assertEqual(sum(query['sql'].startswith(owner_query) for query in queries), 1)
+
+        response = self.client.post(reverse('productparameter-list'), {'product_info': self.other_id, 'parameter': parameter.id, 'value': '1 год'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('productparameter-list'), {'product_info': 'abc', 'parameter': parameter.id, 'value': '1 год'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.patch(reverse('productinfo-detail', kwargs={'pk': self.own_ids[0]}), {'price': 777})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(reverse('productinfo-detail', kwargs={'pk': self.other_id}), {'price': 777})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class LoggingTests(TestCase):
+    def test_sampling_filter(self):
+        sample = SamplingFilter(rate=0.25)
+        info = logging.makeLogRecord({'levelno': logging.INFO})
+        warning = logging.makeLogRecord({'levelno': logging.WARNING})
+        self.assertEqual(sum(sample.filter(info) for _ in range(8)), 2)
+        self.assertTrue(all(sample.filter(warning) for _ in range(8)))
+        self.assertFalse(SamplingFilter(rate=0).filter(info))
+
+    def test_queue_handler_writes_in_background(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.log')
+            handler = QueueFileHandler(filename)
+            handler.setFormatter(logging.Formatter('%(name)s %(levelname)s %(message)s'))
+            logger = logging.getLogger('products.tests.queue')
+            # только свой обработчик, без файла журнала логгера products
+            logger.propagate = False
+            logger.addHandler(handler)
+            try:
+                ids = [1]
+                logger.warning('Товары: %s', ids)
+                # сообщение собирается при вызове, а не при записи
+                ids.append(2)
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(filename, encoding='utf-8') as file:
+                self.assertEqual(file.read(), 'products.tests.queue WARNING Товары: [1]\n')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'нужен fork')
+    def test_queue_handler_survives_fork(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.log')
+            handler = QueueFileHandler(filename, flush_interval=60)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger = logging.getLogger('products.tests.fork')
+            logger.propagate = False
+            logger.addHandler(handler)
+            try:
+                logger.warning('до fork')
+                pid = os.fork()
+                if not pid:
+                    # как дочерний процесс celery prefork: выход через os._exit после worker_process_shutdown
+                    logger.warning('в дочернем процессе')
+                    stop_handlers()
+                    os._exit(0)
+                os.waitpid(pid, 0)
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(filename, encoding='utf-8') as file:
+                self.assertEqual(sorted(file.read().splitlines()), ['в дочернем процессе', 'до fork'])
+
+    def test_rotated_files_are_compressed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.log')
+            handler = QueueFileHandler(filename, maxBytes=100, backupCount=2)
+            logger = logging.getLogger('products.tests.rotation')
+            logger.propagate = False
+            logger.addHandler(handler)
+            try:
+                for i in range(10):
+                    logger.warning('Запись %s %s', i, 'x' * 40)
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            self.assertEqual(sorted(os.listdir(directory)), ['test.log', 'test.log.1.gz', 'test.log.2.gz'])
+            with gzip.open(os.path.join(directory, 'test.log.1.gz'), 'rt', encoding='utf-8') as file:
+                self.assertIn('Запись 8', file.read())
+
+    def test_permission_logger_is_sampled(self):
+        logger = logging.getLogger('products.permissions')
+        self.assertTrue(any(isinstance(log_filter, SamplingFilter) for log_filter in logger.filters))
+        self.assertTrue(all(isinstance(handler, QueueFileHandler) for handler in logger.handlers))
+        self.assertFalse(logger.propagate)
+
+    def test_bench_logging_command(self):
+        logger = logging.getLogger('products.permissions')
+        handlers = logger.handlers
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_logging', requests=5, output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as file:
+                results = json.load(file)['results']
+        self.assertEqual([result['mode'] for result in results], ['off', 'sync', 'queue', 'queue_sampled'])
+        self.assertEqual(results[0]['log_bytes'], 0)
+        self.assertGreater(results[1]['log_bytes'], results[3]['log_bytes'])
+        self.assertEqual(logger.handlers, handlers)
+
+
+class ImportBenchmarkTests(TestCase):
+    def test_generate_goods_spread(self):
+        categories = generate_categories(20)
+        goods = list(generate_goods(2000, categories))
+        per_category = Counter(good['category'] for good in goods)
+        self.assertGreater(per_category[categories[0]['id']], per_category[categories[-1]['id']])
+        self.assertTrue(all(3 <= len(good['parameters']) <= 10 for good in goods))
+        self.assertEqual(goods, list(generate_goods(2000, categories)))
+
+    def test_bench_import_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_import', sizes=[50], output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as file:
+                result = json.load(file)['results'][0]
+        self.assertEqual(result['rows'], 50)
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+        self.assertEqual(ProductInfo.objects.count(), 0)
+
+    def test_bench_import_csv_creates_categories(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('bench_import', sizes=[50], file_format='csv', output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as file:
+                result = json.load(file)['results'][0]
+        self.assertEqual(result['rows'], 50)
+        self.assertFalse(Category.objects.exists())
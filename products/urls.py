@@ -9,10 +9,15 @@ router.register(r'product', views.ProductViewSet)
 router.register(r'product_info', views.ProductInfoViewSet)
 router.register(r'parameter', views.ParameterViewSet)
 router.register(r'product_parameter', views.ProductParameterViewSet)
+router.register(r'product_card', views.ProductCardViewSet, basename='product-card')
+router.register(r'product_search', views.ProductSearchViewSet, basename='product-search')
+router.register(r'best_offers', views.BestOfferViewSet, basename='best-offer')
 
 
 urlpatterns = [
     path(r'api/v1/', include(router.urls)),
     path(r'upload-yaml/', views.UploadFileView.as_view(), name='upload-yaml'),
+    path('import-jobs/<int:pk>/', views.ImportJobView.as_view(), name='import-job'),
+    path('export/<int:shop_id>/', views.ShopCatalogExportView.as_view(), name='shop-export'),
     path('test-error/', views.TestErrorView.as_view(), name='test-error'),
 ]
@@ -0,0 +1,198 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from products.importer import chunked, get_pool_context
+from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+
+
+DEFAULT_SHARD_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+MAX_POSITIVE_INTEGER = 2147483647
+INTEGER_FIELDS = ('price', 'price_rrc', 'quantity')
+
+NAME_MAX_LENGTH = Product._meta.get_field('name').max_length
+MODEL_MAX_LENGTH = ProductInfo._meta.get_field('model').max_length
+PARAMETER_MAX_LENGTH = Parameter._meta.get_field('name').max_length
+VALUE_MAX_LENGTH = ProductParameter._meta.get_field('value').max_length
+
+_worker_category_ids = None
+
+
+def to_positive_int(value):
+    """Приводит значение к целому числу из диапазона PositiveIntegerField."""
+    if isinstance(value, bool):
+        raise ValueError('ожидается целое число')
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('ожидается целое число')
+        value = int(value)
+    elif isinstance(value, str):
+        value = int(value.strip())
+    elif not isinstance(value, int):
+        raise ValueError('ожидается целое число')
+    if not 0 <= value <= MAX_POSITIVE_INTEGER:
+        raise ValueError(f'значение должно быть от 0 до {MAX_POSITIVE_INTEGER}')
+    return value
+
+
+def to_text(value, max_length, required=False):
+    text = '' if value is None else str(value).strip()
+    if required and not text:
+        raise ValueError('обязательное поле')
+    if len(text) > max_length:
+        raise ValueError(f'длина больше {max_length} символов')
+    return text
+
+
+def normalise_good(product_data, category_ids):
+    """
+    Проверяет одну строку goods и приводит поля к типам моделей.
+
+    Возвращает пару (товар, ошибки), где ошибки - список словарей с полями
+    field и error.
+    """
+    if not isinstance(product_data, dict):
+        return None, [{'field': None, 'error': 'ожидается словарь с полями товара'}]
+
+    good, errors = {}, []
+
+    def convert(field, converter, *args):
+        try:
+            good[field] = converter(product_data.get(field), *args)
+        except (TypeError, ValueError) as e:
+            errors.append({'field': field, 'error': str(e) or 'некорректное значение'})
+
+    convert('id', to_positive_int)
+    convert('category', to_positive_int)
+    convert('name', to_text, NAME_MAX_LENGTH, True)
+    convert('model', to_text, MODEL_MAX_LENGTH)
+    for field in INTEGER_FIELDS:
+        convert(field, to_positive_int)
+
+    if 'category' in good and good['category'] not in category_ids:
+        errors.append({'field': 'category', 'error': f"Категория с ID {good['category']} не существует."})
+
+    parameters = product_data.get('parameters') or {}
+    if not isinstance(parameters, dict):
+        errors.append({'field': 'parameters', 'error': 'ожидается словарь параметров'})
+        parameters = {}
+    good['parameters'] = {}
+    for param_name, param_value in parameters.items():
+        try:
+            name = to_text(param_name, PARAMETER_MAX_LENGTH, True)
+            good['parameters'][name] = to_text(param_value, VALUE_MAX_LENGTH)
+        except ValueError as e:
+            errors.append({'field': f'parameters.{param_name}', 'error': str(e)})
+
+    return good, errors
+
+
+def validate_shard(shard):
+    """Проверяет часть goods; выполняется в процессе пула."""
+    first_row, goods = shard
+    errors, external_ids = [], []
+    for row, product_data in enumerate(goods, start=first_row):
+        good, good_errors = normalise_good(product_data, _worker_category_ids)
+        errors.extend(dict(error, row=row) for error in good_errors)
+        if good and 'id' in good:
+            external_ids.append((row, good['id']))
+    return errors, external_ids
+
+
+def _init_worker(category_ids):
+    global _worker_category_ids
+    _worker_category_ids = category_ids
+
+
+class ValidationReport:
+    """Итог проверки прайс-листа перед записью в базу."""
+
+    def __init__(self):
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        self._first_rows = {}
+
+    @property
+    def is_valid(self):
+        return not self.error_count
+
+    def add_errors(self, errors):
+        self.error_count += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def add_external_ids(self, external_ids):
+        duplicates = []
+        for row, external_id in external_ids:
+            first_row = self._first_rows.setdefault(external_id, row)
+            if first_row != row:
+                duplicates.append({'row': row, 'field': 'id',
+                                   'error': f'id {external_id} уже встречался в строке {first_row}'})
+        self.add_errors(duplicates)
+
+    def add_shard(self, result, rows):
+        errors, external_ids = result
+        self.rows += rows
+        self.add_errors(errors)
+        self.add_external_ids(external_ids)
+
+    def as_dict(self):
+        return {'rows': self.rows, 'is_valid': self.is_valid, 'error_count': self.error_count,
+                'errors': sorted(self.errors, key=lambda error: error['row'])}
+
+
+def validate_goods(goods, category_ids, workers=None, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Проверяет goods до записи в базу, распределяя части по пулу процессов.
+
+    goods читается лениво, в работе одновременно не больше двух частей на
+    процесс. Если строк меньше одной части или пул недоступен (например,
+    внутри воркера Celery), проверка идет в текущем процессе.
+    """
+    report = ValidationReport()
+    category_ids = frozenset(category_ids)
+    shards = ((index * shard_size + 1, shard) for index, shard in enumerate(chunked(goods, shard_size)))
+    first = next(shards, None)
+    if first is None:
+        return report
+    second = next(shards, None)
+
+    all_shards = _prepend([shard for shard in (first, second) if shard], shards)
+
+    context = get_pool_context()
+    workers = workers or os.cpu_count() or 1
+    if second is None or workers == 1 or context is None:
+        _init_worker(category_ids)
+        for shard in all_shards:
+            report.add_shard(validate_shard(shard), len(shard[1]))
+        return report
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(category_ids,)) as executor:
+        pending = deque()
+        for shard in all_shards:
+            pending.append((executor.submit(validate_shard, shard), len(shard[1])))
+            if len(pending) >= workers * 2:
+                future, rows = pending.popleft()
+                report.add_shard(future.result(), rows)
+        while pending:
+            future, rows = pending.popleft()
+            report.add_shard(future.result(), rows)
+    return report
+
+
+def _prepend(items, iterator):
+    yield from items
+    yield from iterator
+
+
+def known_category_ids(categories):
+    """ID категорий из базы и из раздела categories загружаемого файла."""
+    return set(Category.objects.values_list('id', flat=True)) | {category['id'] for category in categories}
+
+
+def normalised_goods(goods, category_ids):
+    """Приводит строки goods к типам моделей для записи импортером."""
+    for product_data in goods:
+        yield normalise_good(product_data, category_ids)[0]
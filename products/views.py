@@ -1,31 +1,71 @@
+import hashlib
 import logging
-from django.db import IntegrityError
-from django.http import Http404
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from rest_framework.response import Response
-from rest_framework import status, viewsets
-from rest_framework.exceptions import PermissionDenied, NotFound
-import yaml
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, NotFound, ValidationError
 from customers_suppliers import serializers
+from customers_suppliers.mixins import DynamicFieldsViewMixin
 from customers_suppliers.models import Supplier
-from products.models import Category, Parameter, Product, ProductInfo, ProductParameter
+from customers_suppliers.pagination import SwitchablePagination
+from products.models import CatalogEntry, Category, CategoryStats, ImportJob, Parameter, Product, ProductInfo, ProductParameter
 from products.serializers import (
+    BestOfferSerializer,
+    CatalogEntrySerializer,
     CategorySerializer, 
+    CategoryWithStatsSerializer,
+    ImportJobSerializer,
     ParameterSerializer, 
+    ProductCardSerializer,
+    ProductInfoBatchSerializer,
     ProductInfoCreateSerializer, 
     ProductInfoSerializer, 
     ProductParameterSerializer, 
     ProductSerializer
 )
+from products import facets, offers, search
+from products.caching import ResponseCacheMixin
+from products.fastpath import ValuesListMixin, compile_mapper
+from products.filters import CatalogEntryFilter, ProductInfoFilter
+from products.export import EXPORT_CONTENT_TYPES, iter_shop_goods, shop_categories
+from products.price_list import detect_format, dump_price_list, open_price_list
+from products.signals import deleting_goods
+from products.tasks import run_import_job
+from products.validation import known_category_ids, validate_goods
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
-from django.core.exceptions import ObjectDoesNotExist
 
 
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S', filename='load_data.log')
 logger = logging.getLogger(__name__)
-logger.info("Логирование инициализировано.")
+# Решения о доступе принимаются на каждый запрос; настройки LOGGING пишут их INFO выборочно
+permission_logger = logging.getLogger('products.permissions')
+
+
+def is_flag_set(request, name):
+    return str(request.data.get(name, request.query_params.get(name, ''))).lower() in ('1', 'true', 'yes')
+
+
+def to_id(value):
+    """id из URL или тела запроса; None, если это не целое положительное число."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def get_content_hash(file):
+    content_hash = hashlib.sha256()
+    for chunk in file.chunks():
+        content_hash.update(chunk)
+    file.seek(0)
+    return content_hash.hexdigest()
+
 
 class PermissionMixin:
     def allowed_actions_permission(self, allowed_actions=None):
@@ -37,70 +77,112 @@ class PermissionMixin:
     def check_admin(self):
         return self.request.user.is_staff
     
+    def resolve_owners(self, product_ids):
+        """
+        Принадлежность товаров магазину текущего пользователя: True/False
+        в порядке product_ids, для несуществующих и некорректных id - None.
+
+        Владельцы всех еще не проверенных id читаются одним запросом с JOIN
+        магазина, результат запоминается до конца запроса: get_permissions
+        вызывается и при проверке доступа, и в get_object.
+        """
+        owners = self.__dict__.setdefault('_product_info_owners', {})
+        ids = [to_id(product_id) for product_id in product_ids]
+        unknown = {pk for pk in ids if pk is not None and pk not in owners}
+        if unknown:
+            shop_users = dict(ProductInfo.objects.filter(id__in=unknown).values_list('id', 'shop__user_id'))
+            for pk in unknown:
+                owners[pk] = shop_users[pk] == self.request.user.id if pk in shop_users else None
+        return [owners.get(pk) for pk in ids]
+
     def check_creator(self, product_id):
-        logger.info('Инициализация функции проверки создателя')
+        permission_logger.info('Инициализация функции проверки создателя')
+        return self.check_creators([product_id])
+
+    def check_creators(self, product_ids):
+        """Пакетная проверка: True, если пользователь - владелец всех товаров из списка."""
         if not self.request.user.is_authenticated:
-            logger.info('False')
+            permission_logger.info('False')
             return False
-        try:
-            product_info_instance = ProductInfo.objects.get(id=product_id)
-            logger.info('Продукт найден: %s', product_info_instance)
-        except ObjectDoesNotExist:
-            logger.error("Продукт с указанным ID не найден: %s", product_id)
+        product_ids = list(product_ids)
+        owners = self.resolve_owners(product_ids)
+        missing = [product_id for product_id, is_creator in zip(product_ids, owners) if is_creator is None]
+        if missing:
+            permission_logger.error("Продукт с указанным ID не найден: %s", missing)
             raise NotFound(detail="Продукт с указанным ID не найден.")
-        supplier_user = product_info_instance.shop.user
-        is_creator = supplier_user.id == self.request.user.id
-        logger.info(f'Проверка создателя: %s', is_creator)
-        
+        is_creator = all(owners)
+        permission_logger.info('Проверка создателя: %s', is_creator)
         return is_creator
     
     def get_permissions_mixin(self):
         if self.check_admin():
-            logger.info('Доступ предоставлен: пользователь является администратором.')
+            permission_logger.info('Доступ предоставлен: пользователь является администратором.')
             return [AllowAny()]
         
         if self.check_user_type('supplier'):
-            logger.info('Доступ предоставлен: пользователь является поставщиком.')
+            permission_logger.info('Доступ предоставлен: пользователь является поставщиком.')
             return [AllowAny()]
         
         if self.check_user_type('customer') and self.action in self.allowed_actions_permission():
-            logger.info('Доступ предоставлен: покупатель использует разрешенные методы.')
+            permission_logger.info('Доступ предоставлен: покупатель использует разрешенные методы.')
             return [AllowAny()]
         
         if self.action in self.allowed_actions_permission():
-            logger.info('Доступ предоставлен: аноним использует разрешенные методы.')
+            permission_logger.info('Доступ предоставлен: аноним использует разрешенные методы.')
             return [AllowAny()]
         
-        logger.warning('Доступ отклонен: у пользователя нет прав.')
+        permission_logger.warning('Доступ отклонен: у пользователя нет прав.')
         raise PermissionDenied("Нет прав.")
     
         
-class CategoryViewSet(PermissionMixin, viewsets.ModelViewSet):
-    queryset = Category.objects.all()
-    serializer_class = CategorySerializer
+class CategoryViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, ValuesListMixin,
+                      viewsets.ModelViewSet):
+    queryset = Category.objects.select_related('stats')
+    cache_models = (Category, CategoryStats)
     filterset_fields = ['id', 'name']
+
+    def get_serializer_class(self):
+        return CategoryWithStatsSerializer if self.action in ['list', 'retrieve'] else CategorySerializer
     
     def get_permissions(self):
         return self.get_permissions_mixin()
 
-class ProductViewSet(PermissionMixin, viewsets.ModelViewSet):
+class ProductViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, ValuesListMixin,
+                     viewsets.ModelViewSet):
     queryset = Product.objects.all()
+    cache_models = (Product,)
     serializer_class = ProductSerializer
     filterset_fields = ['id', 'name', 'category']
+    pagination_class = SwitchablePagination
     
     def get_permissions(self):
-        logger.info(f'Пользователь {self.request.user} пытается получить доступ к действию: {self.action}')
+        permission_logger.info('Пользователь %s пытается получить доступ к действию: %s', self.request.user, self.action)
         return self.get_permissions_mixin()
 
-class ProductInfoViewSet(PermissionMixin, viewsets.ModelViewSet):
+    def perform_destroy(self, instance):
+        with deleting_goods(ProductInfo.objects.filter(product=instance)):
+            instance.delete()
+
+class ProductInfoViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, ValuesListMixin,
+                         viewsets.ModelViewSet):
     queryset = ProductInfo.objects.all()
-    filterset_fields = ['id', 'model', 'external_id', 'product', 'shop', 'quantity', 'price', 'price_rrc']
+    cache_models = (ProductInfo,)
+    filterset_class = ProductInfoFilter
+    pagination_class = SwitchablePagination
     
     def get_serializer_class(self):
         if self.request.user.is_staff:
             return ProductInfoSerializer 
         return ProductInfoCreateSerializer if self.action in ['create', 'update', 'partial_update', 'destroy'] else ProductInfoSerializer 
 
+    def perform_destroy(self, instance):
+        with deleting_goods(ProductInfo.objects.filter(pk=instance.pk)):
+            instance.delete()
+
+    def allowed_actions_permission(self, allowed_actions=None):
+        # пакетное чтение проверяется как retrieve - один раз на весь запрос, а не на каждый id
+        return super().allowed_actions_permission(allowed_actions or ['list', 'retrieve', 'batch'])
+
     def get_permissions(self):
         if self.check_admin():
             return [AllowAny()]
@@ -114,6 +196,25 @@ class ProductInfoViewSet(PermissionMixin, viewsets.ModelViewSet):
                 return [AllowAny()]
         raise PermissionDenied("Нет прав.")
     
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Товары по списку id одним запросом в порядке запроса; отсутствующие id - в missing."""
+        batch = ProductInfoBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        ids = batch.validated_data['ids']
+
+        queryset = self.get_queryset().filter(id__in=ids)
+        compiled = compile_mapper(self.get_serializer())
+        if compiled is None:
+            rows = {item['id']: item for item in self.get_serializer(queryset, many=True).data}
+        else:
+            paths, mapper = compiled
+            rows = {row['id']: mapper(row) for row in queryset.values(*paths)}
+        return Response({
+            'results': [rows[pk] for pk in ids if pk in rows],
+            'missing': [pk for pk in ids if pk not in rows],
+        })
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -150,21 +251,25 @@ class ProductInfoViewSet(PermissionMixin, viewsets.ModelViewSet):
             return Response({"error": "Произошла ошибка при обновлении данных."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class ParameterViewSet(PermissionMixin, viewsets.ModelViewSet):
+class ParameterViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Parameter.objects.all()
+    cache_models = (Parameter,)
     serializer_class = ParameterSerializer
     filterset_fields = ['id', 'name']
     
     def get_permissions(self):
         return self.get_permissions_mixin()
 
-class ProductParameterViewSet(PermissionMixin, viewsets.ModelViewSet):
+class ProductParameterViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, ValuesListMixin,
+                              viewsets.ModelViewSet):
     queryset = ProductParameter.objects.all()
+    cache_models = (ProductParameter,)
     serializer_class = ProductParameterSerializer
     filterset_fields = ['id', 'product_info', 'parameter', 'value']
+    pagination_class = SwitchablePagination
     
     def get_permissions(self):
-        logger.info(f"Пользователь {self.request.user} пытается получить доступ к действию: {self.action}")
+        permission_logger.info('Пользователь %s пытается получить доступ к действию: %s', self.request.user, self.action)
         
         if self.check_admin():
             return [AllowAny()]
@@ -176,109 +281,213 @@ class ProductParameterViewSet(PermissionMixin, viewsets.ModelViewSet):
             product_info_id = self.request.data.get('product_info')
             
             if product_info_id is None:
-                logger.warning("product_info не передан в запросе.")
+                permission_logger.warning("product_info не передан в запросе.")
                 raise PermissionDenied("Нет прав.")
             
-            try:
-                product_info = ProductInfo.objects.get(id=product_info_id)
-            except ProductInfo.DoesNotExist:
-                logger.error(f"ProductInfo с ID {product_info_id} не найден.")
+            is_creator, = self.resolve_owners([product_info_id])
+            if is_creator is None:
+                permission_logger.error("ProductInfo с ID %s не найден.", product_info_id)
                 raise PermissionDenied("ProductInfo не найден.")
             
-            if self.check_creator(product_info.id):
-                logger.info("Доступ предоставлен: пользователь является создателем продукта.")
+            if is_creator:
+                permission_logger.info("Доступ предоставлен: пользователь является создателем продукта.")
                 return [AllowAny()]
         
-        logger.warning(f"Доступ отклонен: у пользователя {self.request.user} нет прав для действия '{self.action}'.")
+        permission_logger.warning("Доступ отклонен: у пользователя %s нет прав для действия '%s'.", self.request.user,
+                                 self.action)
         raise PermissionDenied("Нет прав.")
     
     
+class ProductCardViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Карточки товаров для витрины.
+
+    Продукт, категория и магазин подтягиваются одним JOIN, параметры - одним
+    дополнительным запросом на страницу, поэтому число запросов не зависит
+    от размера страницы. При CATALOG_READ_MODEL = True карточки читаются из
+    CatalogEntry одним запросом без JOIN.
+    """
+    queryset = ProductInfo.objects.select_related('product__category', 'shop__user').prefetch_related(
+        Prefetch('product_parameters', queryset=ProductParameter.objects.select_related('parameter'))
+    ).order_by('id')
+    serializer_class = ProductCardSerializer
+    filterset_fields = ['id', 'external_id', 'product', 'product__category', 'shop']
+    cache_models = (ProductInfo, Product, Category, Supplier, ProductParameter, Parameter)
+
+    def get_permissions(self):
+        return self.get_permissions_mixin()
+
+    def use_read_model(self):
+        return settings.CATALOG_READ_MODEL
+
+    def get_queryset(self):
+        if self.use_read_model():
+            return CatalogEntry.objects.order_by('product_info_id')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        return CatalogEntrySerializer if self.use_read_model() else ProductCardSerializer
+
+    @property
+    def filterset_class(self):
+        return CatalogEntryFilter if self.use_read_model() else None
+
+
+class ProductSearchViewSet(PermissionMixin, ResponseCacheMixin, DynamicFieldsViewMixin, mixins.ListModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Поиск товаров по тексту и значениям параметров.
+
+    q ищет слова в названии продукта и модели с учетом опечаток, результаты
+    упорядочены по релевантности. Ограничения передаются параметрами запроса
+    param=Цвет:красный, значения одного параметра объединяются через ИЛИ,
+    разные параметры - через И. Вместе со страницей товаров возвращаются
+    количества товаров по значениям параметров из индекса ParameterValueFacet
+    (в пределах category, если она задана).
+    """
+    queryset = ProductCardViewSet.queryset
+    serializer_class = ProductCardSerializer
+    filterset_fields = ['product__category', 'shop']
+    cache_models = ProductCardViewSet.cache_models
+
+    def get_permissions(self):
+        return self.get_permissions_mixin()
+
+    def get_queryset(self):
+        try:
+            constraints = facets.parse_constraints(self.request.query_params.getlist('param'))
+        except ValueError as e:
+            raise ValidationError({'param': str(e)})
+        queryset = super().get_queryset()
+        category_id = self.get_category_id()
+        if category_id is not None:
+            queryset = queryset.filter(product__category_id=category_id)
+        queryset = facets.filter_by_parameters(queryset, constraints)
+        query = self.request.query_params.get('q', '').strip()
+        if query:
+            queryset = search.search_product_infos(queryset, query)
+        return queryset
+
+    def get_category_id(self):
+        category_id = self.request.query_params.get('category')
+        if category_id in (None, ''):
+            return None
+        if not category_id.isdigit():
+            raise ValidationError({'category': 'Ожидается id категории.'})
+        return int(category_id)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['facets'] = facets.facet_counts(self.get_category_id())
+        return response
+
+
+class BestOfferViewSet(PermissionMixin, ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Сравнение цен продукта в разных магазинах.
+
+    Для каждого продукта с предложениями в наличии (в пределах category,
+    если она задана) возвращаются число предложений, минимальная,
+    максимальная и медианная цена и самое дешевое предложение с магазином.
+    Сводка считается оконными функциями одним запросом на страницу.
+    """
+    serializer_class = BestOfferSerializer
+    filterset_fields = ['category']
+    cache_models = (ProductInfo, Product, Supplier)
+
+    def get_permissions(self):
+        return self.get_permissions_mixin()
+
+    def get_queryset(self):
+        return offers.products_with_offers()
+
+
 class UploadFileView(PermissionMixin, APIView):
     def post(self, request):
-        logger.info(not self.check_admin())
-        
         if not self.check_admin() and not self.check_user_type('supplier'):
             logger.info('Нет прав.')
-            return PermissionDenied('Нет прав.')
+            raise PermissionDenied('Нет прав.')
 
         file = request.FILES.get('file')
         if not file:
             return Response({"error": "Файл не найден"}, status=status.HTTP_400_BAD_REQUEST)
 
-        logger.info('Файл найден')
         try:
-            data = yaml.safe_load(file.read())
-            self.process_categories(data.get('categories', []))
-            shop_id = data.get('shop', [{}])[0].get('id')
-            logger.info(f'магазин из файла : {shop_id}')
-
-            if self.check_admin() or self.is_supplier_authorized(shop_id):
-                self.process_products(data.get('goods', []), shop_id)
-                return Response({"message": "Файл успешно обработан."}, status=status.HTTP_201_CREATED)
-            else:
-                logger.info('Нет прав для доступа к этому магазину.')
-                return Response({"error": "Нет прав для доступа к этому магазину."}, status=status.HTTP_403_FORBIDDEN)
-
-        except Exception as e:
+            file_format = detect_format(file.name, request.data.get('file_format'))
+            shop = self.get_upload_shop(request.data.get('shop'))
+        except ValueError as e:
             logger.error({"error": str(e)})
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    def process_categories(self, categories):
-        for category_data in categories:
-            category, created = Category.objects.get_or_create(
-                id=category_data['id'], 
-                defaults={'name': category_data['name']}
-            )
-            if created:
-                logger.info(f'Создана новая категория : {category}.')
-            else:
-                logger.info(f'Эта категория уже существует : {category}.')
+        if is_flag_set(request, 'dry_run'):
+            try:
+                price_list = open_price_list(file, file_format, shop.id if shop else None)
+                # проверка идет в процессе веб-сервера: пул процессов на каждый запрос ему не по силам
+                report = validate_goods(price_list.goods(), known_category_ids(price_list.categories), workers=1)
+            except Exception as e:
+                logger.error({"error": str(e)})
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(report.as_dict(), status=status.HTTP_200_OK)
 
-    def is_supplier_authorized(self, shop_id):
-        shop = Supplier.objects.filter(id=shop_id).first()
-        if shop and shop.id == self.request.user.supplier.id:
-            return True
-        return False
+        content_hash = get_content_hash(file)
+        if not is_flag_set(request, 'force'):
+            duplicate = ImportJob.find_duplicate(content_hash, file_format, shop, request.user)
+            if duplicate:
+                logger.info(f'Файл уже загружен в загрузке {duplicate.id}, повторная обработка пропущена')
+                return Response(dict(ImportJobSerializer(duplicate).data, duplicate=True), status=status.HTTP_200_OK)
+
+        job = ImportJob.objects.create(user=request.user, file=file, file_format=file_format, shop=shop,
+                                       differential=is_flag_set(request, 'differential'),
+                                       content_hash=content_hash)
+        logger.info(f'Файл найден, создана загрузка {job.id}')
+        transaction.on_commit(lambda: run_import_job.delay(job.id))
+        job.refresh_from_db()
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-    def process_products(self, goods, shop_id):
+    def get_upload_shop(self, shop_id):
+        """Магазин для файлов без раздела shop: из запроса или магазин поставщика."""
+        if not shop_id:
+            return getattr(self.request.user, 'supplier', None)
         shop = Supplier.objects.filter(id=shop_id).first()
         if not shop:
-            logger.info(f'Shop id {shop_id} не найден.')
             raise ValueError(f"Shop id {shop_id} не найден.")
+        return shop
 
-        for product_data in goods:
-            category = self.get_category(product_data['category'])
-            product, created = Product.objects.get_or_create(name=product_data['name'], category=category)
-
-            product_info = ProductInfo.objects.create(
-                model=product_data['model'],
-                external_id=product_data['id'],
-                product=product,
-                shop=shop,  
-                quantity=product_data['quantity'],
-                price=product_data['price'],
-                price_rrc=product_data['price_rrc']
-            )
-            logger.info(f'Создана новая информация о продукте : {product_info}')
-            self.process_product_parameters(product_info, product_data.get('parameters', {}))
-
-    def get_category(self, category_id):
-        try:
-            return Category.objects.get(id=category_id)
-        except Category.DoesNotExist:
-            logger.info(f"Категория с ID {category_id} не существует.")
-            raise ValueError(f"Категория с ID {category_id} не существует.")
-
-    def process_product_parameters(self, product_info, parameters):
-        for param_name, param_value in parameters.items():
-            parameter, created = Parameter.objects.get_or_create(name=param_name)
-            ProductParameter.objects.create(
-                product_info=product_info,
-                parameter=parameter,
-                value=param_value
-            )
+
+class ImportJobView(PermissionMixin, APIView):
+    def get(self, request, pk):
+        job = ImportJob.objects.filter(id=pk).first()
+        if not job:
+            raise NotFound(detail="Загрузка с указанным ID не найдена.")
+        if not self.check_admin() and job.user_id != request.user.id:
+            raise PermissionDenied("Нет прав.")
+
+        data = ImportJobSerializer(job).data
+        progress = cache.get(job.progress_key) if job.status == 'running' else None
+        if progress:
+            data['rows_processed'] = progress['rows']
+            data['rows_per_sec'] = progress['rows_per_sec']
+        return Response(data)
             
             
+class ShopCatalogExportView(PermissionMixin, APIView):
+    def get(self, request, shop_id):
+        shop = Supplier.objects.filter(id=shop_id).first()
+        if not shop:
+            raise NotFound(detail="Магазин с указанным ID не найден.")
+        if not self.check_admin() and shop.user_id != request.user.id:
+            raise PermissionDenied("Нет прав.")
+        try:
+            file_format = detect_format(None, request.query_params.get('file_format', 'yaml'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content = dump_price_list(file_format, shop.id, shop_categories(shop), iter_shop_goods(shop))
+        response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="shop_{shop.id}.{file_format}"'
+        return response
+
+
 class TestErrorView(APIView):
     def get(self, request):
         raise Exception("This is a test exception for Rollbar!")
\ No newline at end of file